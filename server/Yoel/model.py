@@ -2,109 +2,11 @@
 Model module for generating bilingual Hebrew-Arabic content using Gemini AI.
 """
 
+import asyncio
 import re
-import sys
-import os
-import google.generativeai as genai
-import google.auth
 
-from pathlib import Path
-from dotenv import load_dotenv
-env_path = Path('.')/'.env'
-load_dotenv(env_path)
-
-# Custom Gemini class with correct service account path
-class FixedGemini:
-    """
-    Custom Gemini class that points to the correct service account file location.
-    """
-    
-    # Available models with descriptions
-    AVAILABLE_MODELS = {
-        "gemini-1.5-flash": "Fast and versatile (recommended for beginners)",
-        "gemini-1.5-pro": "Complex reasoning tasks (more powerful)",
-        "gemini-2.0-flash": "Newest multimodal, fastest",
-        "gemini-2.0-flash-lite": "Most cost-efficient",
-        "gemini-2.5-flash-preview-05-20": "Best price-performance with thinking capabilities",
-        "gemini-2.5-pro-preview-05-06": "Most powerful thinking model (advanced reasoning)"
-    }
-
-    def __init__(self):
-        self.model = None
-        self.chat = None
-        self.model_name = None
-        self._initialized = False
-
-    def init_model(self, model_name=None):
-        """
-        Initialize Gemini model.
-        
-        Args:
-            model_name (str, optional): Model to use. Defaults to gemini-1.5-flash.
-            
-        Returns:
-            FixedGemini: Ready-to-use Gemini instance
-            
-        Raises:
-            Exception: If initialization fails
-        """
-        try:
-            if model_name is None:
-                model_name = "gemini-1.5-flash" #"gemini-1.5-flash"
-            
-            # Validate model
-            if model_name not in self.AVAILABLE_MODELS:
-                raise ValueError(f"Invalid model. Available: {list(self.AVAILABLE_MODELS.keys())}")
-
-            print(f"🚀 Initializing model: {model_name}...")
-
-            genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-
-            # Create model and chat session
-            self.model = genai.GenerativeModel(model_name)
-            self.chat = self.model.start_chat()
-            self.model_name = model_name
-            self._initialized = True
-
-            print(f"✅ Gemini {model_name} is ready!")
-            return self
-
-        except Exception as e:
-            raise Exception(f"Failed to initialize Gemini: {e}")
-
-    def ask(self, question, short_answer=True):
-        """
-        Ask Gemini a question and get a response
-        
-        Args:
-            question (str): The question to ask
-            short_answer (bool): Whether to request a concise answer
-            
-        Returns:
-            str: Gemini's response
-            
-        Raises:
-            Exception: If not initialized or API error occurs
-        """
-        if not self._initialized:
-            raise Exception("Model not initialized. Call init_model() first!")
-
-        if not question or not question.strip():
-            raise ValueError("Question cannot be empty")
-
-        try:
-            # Prepare prompt
-            if short_answer:
-                prompt = f"{question}\n\nPlease provide a short, concise answer with minimal explanation."
-            else:
-                prompt = question
-
-            # Get response
-            response = self.chat.send_message(prompt)
-            return response.text
-
-        except Exception as e:
-            raise Exception(f"Error getting response: {e}")
+from services.LLM.gemini import Gemini
+from services.LLM.scheduler import LLMOverloaded
 
 
 class BilingualContentGenerator:
@@ -112,21 +14,21 @@ class BilingualContentGenerator:
     A class to generate bilingual Hebrew-Arabic content using the Gemini AI API.
     """
     
-    def __init__(self, model_name="gemini-1.5-flash"):
+    def __init__(self, model_name="auto"):
         """
         Initialize the bilingual content generator.
         
         Args:
-            model_name (str): The Gemini model to use for content generation
+            model_name (str): The Gemini model to use for content generation ("auto" lets the router choose)
         """
-        self.gemini = FixedGemini()
+        self.gemini = Gemini()
         self.model_name = model_name
         self._initialized = False
         self.history = []
     
     def initialize(self):
         """
-        Initialize the Gemini model.
+        Initialize the Gemini model. Cheap: the model itself is built on first use.
         
         Raises:
             Exception: If initialization fails
@@ -138,13 +40,17 @@ class BilingualContentGenerator:
         except Exception as e:
             raise Exception(f"Failed to initialize BilingualContentGenerator: {e}")
     
-    def generate_bilingual_content(self, prompt, max_retries=3):
+    async def generate_bilingual_content(self, prompt, max_retries=3, use_cache=True, remember=True):
         """
         Generate content with alternating Hebrew and Arabic segments.
         
         Args:
             prompt (str): The prompt to send to Gemini AI
             max_retries (int): Maximum number of attempts to get properly formatted content
+            use_cache (bool): Reuse a cached lesson for the same prompt; pass False when
+                every call should generate new content
+            remember (bool): Keep the prompt and the answer in self.history; pass False when
+                the caller keeps the history itself (the server keeps one per session)
             
         Returns:
             str: Generated content with proper <he>...</he> and <ar>...</ar> tags
@@ -159,7 +65,8 @@ class BilingualContentGenerator:
             raise ValueError("Prompt cannot be empty")
         
         # Adding human input to history
-        self.history.append(prompt)
+        if remember:
+            self.history.append(prompt)
 
         # Enhanced prompt to ensure proper bilingual formatting
         enhanced_prompt = f"""
@@ -180,18 +87,26 @@ class BilingualContentGenerator:
         for attempt in range(max_retries):
             try:
                 # Get response from Gemini
-                response = self.gemini.ask(enhanced_prompt, short_answer=False)
+                # The prompt carries the history itself, so the call is a pure function of it (and cacheable).
+                # Retries skip the cached answer, which may be the badly formatted one.
+                response = await self.gemini.ask_async(enhanced_prompt, short_answer=False,
+                                                       task="generate_bilingual_content", remember=False,
+                                                       use_cache=use_cache, refresh_cache=attempt > 0)
                 
                 # Validate and format the response
                 formatted_response = self._validate_and_format_response(response)
                 
                 if formatted_response:
                     # Adding human output to history
-                    self.history.append(formatted_response)                    
+                    if remember:
+                        self.history.append(formatted_response)                    
                     return formatted_response
                 else:
                     print(f"⚠️ Attempt {attempt + 1} failed: Response doesn't contain proper bilingual content")
                     
+            except LLMOverloaded:
+                # Retrying would only queue again behind the same backlog
+                raise
             except Exception as e:
                 print(f"⚠️ Attempt {attempt + 1} failed with error: {e}")
                 
@@ -287,13 +202,13 @@ class BilingualContentGenerator:
         return None
 
 
-def generate_bilingual_content(prompt, model_name="gemini-1.5-flash", max_retries=3):
+def generate_bilingual_content(prompt, model_name="auto", max_retries=3):
     """
     Convenience function to generate bilingual Hebrew-Arabic content.
     
     Args:
         prompt (str): The prompt to send to Gemini AI
-        model_name (str): The Gemini model to use
+        model_name (str): The Gemini model to use ("auto" lets the router choose)
         max_retries (int): Maximum number of attempts to get properly formatted content
         
     Returns:
@@ -304,7 +219,7 @@ def generate_bilingual_content(prompt, model_name="gemini-1.5-flash", max_retrie
     """
     generator = BilingualContentGenerator(model_name)
     generator.initialize()
-    return generator.generate_bilingual_content(prompt, max_retries)
+    return asyncio.run(generator.generate_bilingual_content(prompt, max_retries))
 
 
 # Example usage and testing function
@@ -1,13 +1,18 @@
+import asyncio
 import json
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent.parent))
+from services.LLM.client import llm_client, user_turn
 from services.LLM.gemini import init_model
-
-import arabic_reshaper
-from bidi.algorithm import get_display
+from services.NLP.lexicon import lexicon
+from services.NLP.morphology import morphology
 
 def convert_arabic(text):
+		# Only needed for console output, so not imported at server start-up
+		import arabic_reshaper
+		from bidi.algorithm import get_display
+
 		reshaped = arabic_reshaper.reshape(text)       # Connect letters
 		bidi_text = get_display(reshaped)              # Apply RTL direction
 		return bidi_text
@@ -15,6 +20,30 @@ def convert_arabic(text):
 def print_rtl(word: str):
 	print(convert_arabic(word))
 
+def conversation_text(sentence_ar: list[str]) -> str:
+	result = ""
+	for i, line in enumerate(sentence_ar):
+		prefix = f"אדם {1 + i % 2}: "  # Alternates between User 1 and User 2
+		result += prefix + line + "\n"
+	return result
+
+def explain_conversation_prompt(sentence_ar: list[str]) -> str:
+	result = conversation_text(sentence_ar)
+	prompt = f"מלפניך שיחה בין שני אנשים, בבקשה תסביר את השיחה בעברית, בלי לכתוב את ההסבר כשיחה. השיחה: {result}"
+	# prompt = f"הסבר את השיחה בערבית בעברית, שים לב לא להוסיף את המילה משתמש או את המספר, זאת אומרת רק תסביר את השיחה ללא שום דיון נוסף, השיחה עד עכשיו: {result}"
+	return prompt
+
+def translate_conversation_prompt(sentence_ar: list[str]) -> str:
+	result = conversation_text(sentence_ar)
+	prompt = f"""
+		לפניך שיחה בין שני אנשים, 
+		בבקשה תתרגם את השיחה בעברית, 
+		בלי לכתוב את התרגום כשיחה, 
+		זאת אומרת בלי האינדיקטור אדם ונקודותיים, השיחה:\n\n
+		{result}
+		"""
+	return prompt
+
 """
 function.py
 
@@ -23,16 +52,16 @@ Implements:
 2. explain_word: Word to abstract JSON (root, binyan, singular, plural)
 """
 class Dialog:
-	def __init__(self, model_name='gemini-1.5-flash'):
+	def __init__(self, model_name='auto'):
 		"""
 		Initialize the dialog with a specific model.
-		Default is "gemini-1.5-flash".
+		Default is "auto": the model router picks a model per task.
 		"""
 		self.model_name = model_name
 		self.gemini = init_model(model_name=model_name)
 		self.conversation = []  # Placeholder for dialog object if needed later
 
-	def answer_to_conversation(self):
+	async def answer_to_conversation(self):
 		# Turning the conversation up untill now into a single string
 		conversation_text = ""
 		for question in self.conversation:
@@ -43,9 +72,9 @@ class Dialog:
 		{conversation_text}
 		"""
 
-		return self.gemini.ask(prompt, short_answer=True)
+		return await self.gemini.ask_async(prompt, short_answer=True, task="answer_to_conversation")
 
-	def explain_sentence(self, sentence_ar: str, question_ar: str,  model_name='gemini-1.5-flash') -> str:
+	async def explain_sentence(self, sentence_ar: str, question_ar: str,  model_name='auto') -> str:
 		"""
 		Receives an Arabic sentence and a question in Arabic.
 		Returns a Hebrew sentence with an explanation about the question in Hebrew.
@@ -58,50 +87,88 @@ class Dialog:
 		# """
 		self.conversation.append(question)  # Add question to dialog history if needed
 
-		answer = self.gemini.ask(question, short_answer=True)
+		answer = await self.gemini.ask_async(question, short_answer=True, task="explain_sentence")
 
 		# answer = self.convert_arabic(answer)  # Convert answer to Hebrew
 		self.conversation.append(answer)  # Add answer to dialog history if needed
 		return f"{answer}"
 	
-	def explain_conversation(self, sentence_ar: list[str], model_name='gemini-1.5-flash') -> str:
+	async def explain_conversation(self, sentence_ar: list[str], model_name='auto') -> str:
 		"""
 		Receives an Arabic conversation.
 		Returns an explanation of the conversation in Hebrew.
 		"""
-		result = ""
-		for i, line in enumerate(sentence_ar):
-			prefix = f"אדם {1 + i % 2}: "  # Alternates between User 1 and User 2
-			result += prefix + line + "\n"
-		
-		prompt = f"מלפניך שיחה בין שני אנשים, בבקשה תסביר את השיחה בעברית, בלי לכתוב את ההסבר כשיחה. השיחה: {result}"
-		# prompt = f"הסבר את השיחה בערבית בעברית, שים לב לא להוסיף את המילה משתמש או את המספר, זאת אומרת רק תסביר את השיחה ללא שום דיון נוסף, השיחה עד עכשיו: {result}"
-		answer = self.gemini.chat.send_message(prompt)
-
-		return answer.text
+		# Depends only on the given conversation, so it is cacheable
+		return await self.gemini.ask_async(explain_conversation_prompt(sentence_ar), short_answer=False, task="explain_conversation", remember=False)
 
-	def translate_conversation(self, sentence_ar: list[str], model_name='gemini-1.5-flash') -> str:
+	async def translate_conversation(self, sentence_ar: list[str], model_name='auto') -> str:
 		"""
 		Receives an Arabic conversation.
 		Returns an explanation of the conversation in Hebrew.
 		"""
-		result = ""
-		for i, line in enumerate(sentence_ar):
-			prefix = f"אדם {1 + i % 2}: "  # Alternates between User 1 and User 2
-			result += prefix + line + "\n"
-		
-		prompt = f"""
-		לפניך שיחה בין שני אנשים, 
-		בבקשה תתרגם את השיחה בעברית, 
-		בלי לכתוב את התרגום כשיחה, 
-		זאת אומרת בלי האינדיקטור אדם ונקודותיים, השיחה:\n\n
-		{result}
+		# Depends only on the given conversation, so it is cacheable
+		return await self.gemini.ask_async(translate_conversation_prompt(sentence_ar), short_answer=False, task="translate_conversation", remember=False)
+
+	async def explain_conversations(self, conversations: list, model_name='auto') -> list:
+		"""
+		Receives a list of Arabic conversations.
+		Returns the explain_conversation answer of each (None where none was obtained).
+		"""
+		return await self._conversations_batch(conversations, "explain_conversation", explain_conversation_prompt, "תסביר בעברית", model_name)
+
+	async def translate_conversations(self, conversations: list, model_name='auto') -> list:
+		"""
+		Receives a list of Arabic conversations.
+		Returns the translate_conversation answer of each (None where none was obtained).
+		"""
+		return await self._conversations_batch(conversations, "translate_conversation", translate_conversation_prompt, "תתרגם לעברית", model_name)
+
+	async def _conversations_batch(self, conversations: list, task: str, build_prompt, instruction: str, model_name='auto') -> list:
+		"""
+		Answers of the single-conversation task for many conversations: cached answers
+		are reused, the others are asked in one combined question and cached one by one.
+		"""
+		prompts = [build_prompt(conversation) for conversation in conversations]
+		# The cache is SQLite: read it in a worker thread, not on the event loop
+		results = await asyncio.to_thread(lambda: [llm_client.cached(task, [user_turn(prompt)]) for prompt in prompts])
+		missing = [i for i, result in enumerate(results) if result is None]
+		if not missing:
+			return results
+
+		numbered = ""
+		for n, i in enumerate(missing, 1):
+			numbered += f"שיחה {n}:\n{conversation_text(conversations[i])}\n"
+
+		question = f"""
+		לפניך כמה שיחות ממוספרות, כל אחת בין שני אנשים.
+		לכל שיחה בנפרד, {instruction} את השיחה, 
+		בלי לכתוב את התשובה כשיחה, 
+		זאת אומרת בלי האינדיקטור אדם ונקודותיים.\n
+		התוצאה צריכה להיות אובייקט JSON אחד, שהמפתחות שלו הם מספרי השיחות ("1", "2", ...)\n
+		והערך של כל מספר הוא הטקסט בעברית. השיחות:\n\n
+		{numbered}
 		"""
-		answer = self.gemini.chat.send_message(prompt)
 
-		return answer.text
+		gemini = init_model(model_name=model_name)
+		partsStr: str = await gemini.ask_async(question, short_answer=False, task=task + "s", json_output=True, remember=False)
+		data = json.loads(partsStr)
 
-	def continue_conversation(self, sentence_ar: list[str], model_name='gemini-1.5-flash') -> str:
+		answered = []
+		for n, i in enumerate(missing, 1):
+			answer = data.get(str(n))
+			if isinstance(answer, str) and answer.strip():
+				results[i] = answer
+				answered.append(i)
+
+		# Also answers the single-conversation endpoint for the same conversations
+		def store():
+			for i in answered:
+				llm_client.store(task, [user_turn(prompts[i])], results[i])
+		await asyncio.to_thread(store)
+
+		return results
+
+	async def continue_conversation(self, sentence_ar: list[str], model_name='auto') -> str:
 		"""
 		Receives an Arabic conversation.
 		Returns an Arabic sentence that continues the conversation.
@@ -118,17 +185,25 @@ class Dialog:
 		זאת אומרת רק את המשפט עצמו ללא שום דיון נוסף, השיחה עד עכשיו:\n\n
 		{result}
 		"""
-		answer = self.gemini.chat.send_message(prompt)
-
-		return answer.text
+		return await self.gemini.ask_async(prompt, short_answer=False, task="continue_conversation")
 
 
-	def explain_word(self, word: str, model_name='gemini-1.5-flash'):
+	async def explain_word(self, word: str, model_name='auto'):
 		"""
 		Receives a word.
 		Returns an abstract JSON explaining root, binyan, singular, and plural.
 		"""
 
+		# Words analysed before are in the shared lexicon
+		entry = lexicon.get(word)
+		if entry and entry.get("analysis"):
+			return entry["analysis"]
+
+		# Most words can be analysed locally; only unresolved ones go to Gemini
+		analysis = morphology.explain(word)
+		if analysis is not None:
+			return analysis
+
 		question = f"""
 		המילה בערבית: {word}\n\n
 		ענה:\n\n
@@ -149,13 +224,11 @@ class Dialog:
 		"""
 		# self.conversation.append(question)
 
+		# Sending the request (a one-off question, outside the conversation)
 		gemini = init_model(model_name=model_name)
+		partsStr: str = await gemini.ask_async(question, short_answer=False, task="explain_word", json_output=True, remember=False)
+		self.conversation.append(partsStr)
 
-		# Sending the request
-		answer = gemini.json_chat.send_message(question)
-		self.conversation.append(answer)
-
-		partsStr: str = answer.candidates[0].content.parts[0].text		
 		data = json.loads(partsStr)
 
 		result: dict = {
@@ -165,9 +238,60 @@ class Dialog:
 			"singular": data.get("יחיד"),
 			"plural": data.get("רבים")
 		}
+		# Kept for the next lexicon build (python -m services.NLP.lexicon build)
+		await asyncio.to_thread(lexicon.record, {word: result})
 
 		return result
 
+	async def explain_words(self, words: list, model_name='auto') -> dict:
+		"""
+		Receives a list of words.
+		Returns {word: explain_word result} for all of them, from a single Gemini question.
+		Words Gemini leaves out are missing from the result.
+		"""
+		words_text = "\n".join(words)
+		question = f"""
+		המילים בערבית, מילה בכל שורה:\n{words_text}\n\n
+		לכל מילה ענה:\n\n
+		מה המשמעות שלה בעברית(בעברית), 
+		מה השורש שלה(השורש כולו בערבית, לא להוסיף את אם אין שורש), 
+		מה הבניין שלה(הבניין כולו בערבית, לא להוסיף את אם אין בניין), 
+		מה צורת היחיד שלה(עם ניקוד, לא להוסיף את אם אין צורת יחיד), 
+		מה צורת הרבים שלה(עם ניקוד, לא להוסיף את אם אין צורת רבים), 
+		יש לשים לב שאם שדה כלשהו אינו אמור להיכתב, אין להוסיפו לתוצאה הסופית.\n
+		התוצאה צריכה להיות אובייקט JSON אחד, שהמפתחות שלו הם המילים בדיוק כפי שנכתבו למעלה,\n
+		והערך של כל מילה בפורמט הבא:\n\n
+		משמעות:\n
+		שורש:\n
+		בניין:\n
+		יחיד:\n
+		רבים:\n
+		?
+		"""
+
+		# One question for all the words, outside the conversation
+		gemini = init_model(model_name=model_name)
+		partsStr: str = await gemini.ask_async(question, short_answer=False, task="explain_words", json_output=True, remember=False)
+
+		data = json.loads(partsStr)
+
+		results: dict = {}
+		for word in words:
+			parts = data.get(word)
+			if not isinstance(parts, dict):
+				continue
+			results[word] = {
+				"meaning": parts.get("משמעות"),
+				"root": parts.get("שורש"),
+				"stem": parts.get("בניין"),
+				"singular": parts.get("יחיד"),
+				"plural": parts.get("רבים")
+			}
+
+		# Kept for the next lexicon build, in one batch off the event loop
+		await asyncio.to_thread(lexicon.record, results)
+		return results
+
 
 # dialog = Dialog()
 # print(dialog.explain_word("جميلة", "gemini-1.5-flash"))
@@ -8,19 +8,38 @@
 # For starting the backend server:
 # uvicorn server.server:app --reload
 
+import asyncio
+import hmac
+import importlib
+import json
+import os
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
-from io import BytesIO
 from typing import Any, Optional
-from fastapi import HTTPException, FastAPI, Form
+from fastapi import Depends, HTTPException, FastAPI, File, Form, Request, UploadFile, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from gtts import gTTS
 
-from services.TTS.text_to_speak import TextToSpeechConverter
+from services.TTS.edge_tts_service import synthesize_to_cache, VOICE_ARABIC_FEMALE
+from services.TTS.cache import audio_cache
+from services.TTS.lesson_audio import synthesize_lesson_audio
+from services.TTS.pipeline import stream_pipelined_speech, edge_synthesizer, offline_synthesizer, with_fallback
 from Yoel.parser import extract_tagged_text
-from services.TTS.audio import conversation_with_user
+from services.STT.recognizer import RecognizerError, score_pronunciation_async
+from services.STT.streaming import StreamingSession
+from services.metrics import metrics
+from services.LLM.client import llm_client
+from services.LLM.cache import llm_cache
+from services.LLM.scheduler import LLMOverloaded, set_deadline, set_session
+from services.annotations import annotations
+from services.admission import CAP_RETRY_AFTER_S, admission
+from services.disconnect import ClientDisconnected, cancel_on_disconnect
+from services.jobs import jobs
+from services.lesson_packs import lesson_store
+from services.sessions import sessions
+from services.state import purge_periodically
 
 # Get absolute path to project root
 project_root = Path(__file__).parent.parent
@@ -43,6 +62,65 @@ origins = [
     # Add your deployed frontend URL here when needed
 ]
 
+def session_id(request: Request) -> str:
+    # One learner: the X-Session-Id header the frontend sends, else the client address
+    return request.headers.get("x-session-id") or (request.client.host if request.client else "anonymous")
+
+
+# Token of the /admin endpoints (X-Admin-Token header). Without one they only answer
+# requests from this machine; set it when the server runs behind a proxy on the same host.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+
+def require_admin(request: Request) -> None:
+    if ADMIN_TOKEN:
+        if hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), ADMIN_TOKEN.encode()):
+            return
+    elif request.client and request.client.host in ("127.0.0.1", "::1"):
+        return
+    raise HTTPException(status_code=403, detail="Admin only")
+
+
+def overloaded_response(retry_after_s: int, details: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(retry_after_s)},
+        content={"success": False, "error": {"error": "Server busy", "details": details}},
+    )
+
+
+@app.middleware("http")
+async def llm_admission(request: Request, call_next):
+    # LLM calls of one learner share a fair share of the Gemini quota (see services.LLM.scheduler)
+    set_session(session_id(request))
+
+    path = request.url.path
+    if not admission.controls(path):
+        return await call_next(request)
+
+    # Shed early rather than let requests pile up while Gemini is slow (see services.admission)
+    if not admission.try_enter(path):
+        return overloaded_response(CAP_RETRY_AFTER_S, "Too many requests in progress")
+    set_deadline(admission.deadline_s(path, request.headers.get("x-deadline-ms")))
+    try:
+        return await call_next(request)
+    finally:
+        admission.leave(path)
+
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected(request: Request, exc: ClientDisconnected):
+    # Nobody is listening; 499 is what the access log should show
+    return Response(status_code=499)
+
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded(request: Request, exc: LLMOverloaded):
+    metrics.increment(f"shed.{request.url.path}")
+    return overloaded_response(exc.retry_after_s, str(exc))
+
+
+# Added after the other middleware so it wraps them, and shed responses carry CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Can also use ["*"] for all origins (dev only)
@@ -67,6 +145,10 @@ class WordExplanation(BaseModel):
     explanation: str
     language: str = "en"
 
+class JobRequest(BaseModel):
+    kind: str
+    items: list[list[str]]
+
 class ResponseWrapper(BaseModel):
     success: bool
     data: Optional[Any] = None
@@ -75,29 +157,105 @@ class ResponseWrapper(BaseModel):
 # # Use explain_sentence
 # hebrew_explanation = dialog.explain_sentence(arabic_sentence, arabic_question)
 
-ttsConv = TextToSpeechConverter()
-
-# Create dialog instance
-dialog = Dialog()
+# Handlers keep no state: per-learner history lives in the session store (services.sessions),
+# so any worker can serve any request. Gemini is set up lazily, see warm_up below.
 teacher = BilingualContentGenerator()
 teacher.initialize()
 
 
+@asynccontextmanager
+async def session_dialog(request: Request):
+    # A Dialog holding the session's conversation; the turns it adds are saved if the block succeeds
+    session = session_id(request)
+    dialog = Dialog()
+    # Store calls may wait on SQLite locks: run them off the event loop
+    dialog.conversation = await asyncio.to_thread(sessions.history, session, "dialog.conversation")
+    dialog.gemini.history = await asyncio.to_thread(sessions.history, session, "dialog.history")
+    known_conversation, known_history = len(dialog.conversation), len(dialog.gemini.history)
+
+    yield dialog
+
+    await asyncio.to_thread(sessions.extend, session, "dialog.conversation", dialog.conversation[known_conversation:])
+    await asyncio.to_thread(sessions.extend, session, "dialog.history", dialog.gemini.history[known_history:])
+
+
+# Bulk jobs (POST /jobs): each item is a conversation, each batch one combined Gemini call after the LLM cache
+jobs.register("translate", lambda items: Dialog().translate_conversations(items))
+jobs.register("explain", lambda items: Dialog().explain_conversations(items))
+
+
+# SDKs imported on first use; warm-up imports them in the background instead
+WARM_UP_MODULES = ["edge_tts", "gtts"]
+
+
+@app.on_event("startup")
+async def warm_up():
+    # Serve immediately; /ready reports when the slow parts are loaded
+    async def import_modules():
+        for name in WARM_UP_MODULES:
+            try:
+                await asyncio.to_thread(importlib.import_module, name)
+            except ImportError as e:
+                print(f"⚠️ Warm-up could not import {name}: {e}")
+
+    app.state.warm_up = asyncio.gather(llm_client.warm_up(), import_modules())
+    # Picks up queued jobs, including the ones a previous run did not finish
+    jobs.start()
+    # Expired sessions and annotations would otherwise stay in the state database
+    app.state.purge = asyncio.create_task(purge_periodically())
+
+
+@app.get("/ready")
+async def ready():
+    status = llm_client.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content={"success": False, "data": status})
+    return {"success": True, "data": status}
+
+
 @app.post("/api", response_model=ResponseWrapper)
-async def api(data: RequestData):
+async def api(data: RequestData, request: Request, annotate: bool = False, level: Optional[str] = None):
     print("Received data:", data.input)
     
-    connected_history: str = '\n'.join(teacher.history)
-    output = teacher.generate_bilingual_content(connected_history + "\n\n Current input:\n" + data.input)
+    session = session_id(request)
+    # Curriculum topics are generated ahead of time (python -m services.lesson_packs)
+    pack = await asyncio.to_thread(lesson_store.find, data.input, level)
+    if pack is not None:
+        output = pack["output"]
+    else:
+        connected_history: str = '\n'.join(await asyncio.to_thread(sessions.history, session, "lesson"))
+        output = await cancel_on_disconnect(
+            request, teacher.generate_bilingual_content(connected_history + "\n\n Current input:\n" + data.input,
+                                                        remember=False))
+    await asyncio.to_thread(sessions.extend, session, "lesson", [data.input, output])
+    segments = extract_tagged_text(output)
+
+    if annotate:
+        # Word explanations for the whole lesson up front; Gemini-only words follow via /annotations/<id>
+        return {
+            "success": True,
+            "data": {
+                "segments": segments,
+                "annotations": await annotations.annotate(segments, Dialog().explain_words)
+            }
+        }
 
     return {
         "success":"true",
-        "data":extract_tagged_text(output)
+        "data":segments
     }
 
 
+@app.get("/annotations/{annotation_id}", response_model=ResponseWrapper)
+async def get_annotations(annotation_id: str):
+    index = await asyncio.to_thread(annotations.get, annotation_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired annotation id")
+    return {"success": True, "data": index}
+
+
 @app.post("/explain-word", response_model=ResponseWrapper)
-async def explain_word_route(data: RequestData):
+async def explain_word_route(data: RequestData, request: Request):
     print("Received data:", data.input)
 
     if len(data.input.split()) != 1:
@@ -109,7 +267,8 @@ async def explain_word_route(data: RequestData):
             }
         }
     
-    explanation = dialog.explain_word(data.input)
+    async with session_dialog(request) as dialog:
+        explanation = await cancel_on_disconnect(request, dialog.explain_word(data.input))
     return {
         "success": True,
         "data": {
@@ -120,10 +279,11 @@ async def explain_word_route(data: RequestData):
 
 
 @app.post("/arabic-speech-continue-conversation", response_model=ResponseWrapper)
-async def arabic_speech_continue_conversation(data: StringRequest):
+async def arabic_speech_continue_conversation(data: StringRequest, request: Request):
     print("Received data:", data.input)
 
-    final_description = dialog.continue_conversation(data.input);
+    async with session_dialog(request) as dialog:
+        final_description = await cancel_on_disconnect(request, dialog.continue_conversation(data.input))
 
     return {
         "success": True,
@@ -132,10 +292,11 @@ async def arabic_speech_continue_conversation(data: StringRequest):
 
 
 @app.post("/arabic-speech-explanation", response_model=ResponseWrapper)
-async def arabic_speech_explanation(data: StringRequest):
+async def arabic_speech_explanation(data: StringRequest, request: Request):
     print("Received data:", data.input)
     
-    final_description = dialog.explain_conversation(data.input);
+    async with session_dialog(request) as dialog:
+        final_description = await cancel_on_disconnect(request, dialog.explain_conversation(data.input))
 
     return {
         "success": True,
@@ -143,10 +304,11 @@ async def arabic_speech_explanation(data: StringRequest):
     }
 
 @app.post("/translate", response_model=ResponseWrapper)
-async def translate_from_arabic(data: StringRequest):
+async def translate_from_arabic(data: StringRequest, request: Request):
     print("Received data:", data.input)
     
-    final_description = dialog.translate_conversation(data.input);
+    async with session_dialog(request) as dialog:
+        final_description = await cancel_on_disconnect(request, dialog.translate_conversation(data.input))
 
     return {
         "success": True,
@@ -154,19 +316,259 @@ async def translate_from_arabic(data: StringRequest):
     }
 
 
+@app.post("/jobs", response_model=ResponseWrapper)
+async def submit_job(data: JobRequest):
+    try:
+        job = await asyncio.to_thread(jobs.submit, data.kind, data.items)
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": {
+                "error": "Invalid input",
+                "details": str(e)
+            }
+        }
+    return {"success": True, "data": job}
+
+
+@app.get("/jobs/{job_id}", response_model=ResponseWrapper)
+async def job_progress(job_id: str):
+    progress = await asyncio.to_thread(jobs.progress, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return {"success": True, "data": progress}
+
+
+# Seconds between progress checks of a job event stream
+JOB_EVENTS_POLL_S = 0.5
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    # Server-sent events: the progress record whenever it changes, until the job is done
+    if await asyncio.to_thread(jobs.progress, job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+
+    async def events():
+        last = None
+        while True:
+            progress = await asyncio.to_thread(jobs.progress, job_id)
+            if progress is None:
+                return
+            if progress != last:
+                yield f"data: {json.dumps(progress, ensure_ascii=False)}\n\n"
+                last = progress
+            if progress["status"] == "done":
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_S)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/jobs/{job_id}/results", response_model=ResponseWrapper)
+async def job_results(job_id: str):
+    # Available while the job runs too; unfinished items are null
+    job = await asyncio.to_thread(jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return {
+        "success": True,
+        "data": {
+            "id": job["id"],
+            "status": job["status"],
+            "completed": job["completed"],
+            "failed": job["failed"],
+            "results": job["results"]
+        }
+    }
+
+
 @app.post("/tts", response_model=ResponseWrapper)
-async def tts(text: str = Form(...)):
-    ttsConv.exelarate(text)
+async def tts(request: Request, text: str = Form(...), voice: str = Form(VOICE_ARABIC_FEMALE)):
+    audio_hash = await cancel_on_disconnect(request, synthesize_to_cache(text, voice))
 
-    # audio_bytes = BytesIO()
-    # ttsConv.write_to_fp(audio_bytes)
-    # audio_bytes.seek(0)
-    # return StreamingResponse(audio_bytes, media_type="audio/mpeg")
+    return {
+        "success": True,
+        "data": {
+            "url": f"/audio/{audio_hash}.mp3",
+            "hash": audio_hash
+        }
+    }
+
+
+# Audio files never change once written, so browsers may cache them forever
+AUDIO_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+
+@app.get("/audio/{audio_hash}.mp3")
+async def get_audio(audio_hash: str, request: Request):
+    if len(audio_hash) != 64 or any(c not in "0123456789abcdef" for c in audio_hash):
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    path = audio_cache.path(audio_hash)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    etag = f'"{audio_hash}"'
+    headers = {**AUDIO_CACHE_HEADERS, "ETag": etag}
+    if_none_match = [tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in if_none_match or "*" in if_none_match:
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse handles Range/If-Range and uses zero-copy sendfile where the server supports it
+    return FileResponse(path, media_type="audio/mpeg", headers=headers)
+
+
+@app.post("/lesson-audio", response_model=ResponseWrapper)
+async def lesson_audio(data: StringRequest, request: Request):
+    # One audio file for all Arabic segments plus word timings, so word clicks need no requests
+    index = await cancel_on_disconnect(request, synthesize_lesson_audio(data.input))
+
+    return {
+        "success": True,
+        "data": index
+    }
+
+
+@app.post("/tts/stream")
+async def tts_stream(text: str = Form(...), voice: str = Form(VOICE_ARABIC_FEMALE)):
+    language = voice.split("-")[0]
+    synthesizer = with_fallback(edge_synthesizer(voice), offline_synthesizer(language))
+    return StreamingResponse(stream_pipelined_speech(text, synthesizer), media_type="audio/mpeg")
 
 
 @app.post("/stt", response_model=ResponseWrapper)
-async def stt(text: str = Form(...)):
-    return {"message": conversation_with_user(text)}
+async def stt(text: str = Form(...), audio: UploadFile = File(...)):
+    audio_data = await audio.read()
+
+    try:
+        result = await score_pronunciation_async(text, audio_data)
+    except ValueError as e:
+        return {
+            "success": False,
+            "error": {
+                "error": "Invalid audio",
+                "details": str(e)
+            }
+        }
+    except RecognizerError as e:
+        # Not the learner's fault: the recognizer is missing or its service failed
+        metrics.increment("stt_recognizer_errors")
+        return JSONResponse(
+            status_code=502,
+            content={"success": False, "error": {"error": "Speech recognition unavailable", "details": str(e)}},
+        )
+
+    return {
+        "success": True,
+        "data": result
+    }
+
+
+# Sample rates a /stt/stream client may announce
+STREAM_SAMPLE_RATES = range(8000, 48001)
+
+
+def stream_setup(message: Optional[str]) -> tuple:
+    # (expected text, sample rate) from the first /stt/stream message; ValueError if malformed
+    setup = json.loads(message) if message else None
+    if not isinstance(setup, dict):
+        raise ValueError("The first message must be a JSON object")
+    text = setup.get("text", "")
+    if not isinstance(text, str):
+        raise ValueError('"text" must be a string')
+    try:
+        sample_rate = int(setup.get("sample_rate", 16000))
+    except (TypeError, ValueError):
+        raise ValueError('"sample_rate" must be a number')
+    if sample_rate not in STREAM_SAMPLE_RATES:
+        raise ValueError(f'"sample_rate" must be between {STREAM_SAMPLE_RATES.start} and {STREAM_SAMPLE_RATES.stop - 1}')
+    return text, sample_rate
+
+
+async def stream_error(websocket: WebSocket, error: str, details: str, code: int) -> None:
+    # Tell the client why before closing; it may already be gone
+    try:
+        await websocket.send_json({"type": "error", "error": error, "details": details})
+        await websocket.close(code=code)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+@app.websocket("/stt/stream")
+async def stt_stream(websocket: WebSocket):
+    await websocket.accept()
+
+    # First message describes the passage being read
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        return
+    try:
+        text, sample_rate = stream_setup(message.get("text"))
+    except ValueError as e:
+        await stream_error(websocket, "Invalid setup", str(e), status.WS_1003_UNSUPPORTED_DATA)
+        return
+
+    async def recognizer_failed(error: RecognizerError) -> None:
+        # Called by the session as soon as recognition fails, not only at the end of the stream
+        metrics.increment("stt_recognizer_errors")
+        await stream_error(websocket, "Speech recognition unavailable", str(error), status.WS_1011_INTERNAL_ERROR)
+
+    session = StreamingSession(text, websocket.send_json, sample_rate=sample_rate, on_error=recognizer_failed)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                session.cancel()
+                return
+            if message.get("bytes"):
+                await session.feed_audio(message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except json.JSONDecodeError:
+                    control = None
+                if not isinstance(control, dict):
+                    session.cancel()
+                    await stream_error(websocket, "Invalid message", "Text messages must be JSON objects",
+                                       status.WS_1003_UNSUPPORTED_DATA)
+                    return
+                if control.get("type") == "end":
+                    await session.finish()
+                    break
+    except WebSocketDisconnect:
+        session.cancel()
+        return
+    except RecognizerError:
+        # Already sent by recognizer_failed, which closed the socket
+        return
+
+    await websocket.close()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
+
+@app.get("/admin/llm-cache", response_model=ResponseWrapper, dependencies=[Depends(require_admin)])
+async def llm_cache_stats():
+    return {
+        "success": True,
+        "data": await asyncio.to_thread(llm_cache.stats)
+    }
+
+
+@app.delete("/admin/llm-cache", response_model=ResponseWrapper, dependencies=[Depends(require_admin)])
+async def llm_cache_invalidate(task: Optional[str] = None, key: Optional[str] = None, expired: bool = False):
+    # ?expired=true drops expired entries only; otherwise one key, one task, or everything
+    removed = await asyncio.to_thread(llm_cache.purge_expired) if expired \
+        else await asyncio.to_thread(llm_cache.invalidate, task=task, key=key)
+
+    return {
+        "success": True,
+        "data": {"removed": removed}
+    }
 
 
 # @app.post("/student", response_model=ResponseWrapper)
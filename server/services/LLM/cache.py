@@ -0,0 +1,236 @@
+"""
+LLM Response Cache - Persistent, TTL-Bounded Storage for Gemini Answers
+
+Translating a fixed conversation or explaining a fixed word gives the same
+answer for every student, so the answer is stored and reused instead of
+asking Gemini again. Entries are keyed by the SHA-256 hash of
+(task, model, normalized prompt or conversation, generation config) and kept
+in a local SQLite database, so they survive restarts. Word-level tasks
+(WRITTEN_FORM_TASKS) keep harakat and letter forms in the key: عِلْم and
+عَلَّمَ, or على and علي, are different words with different answers.
+
+Each task has its own time to live (TASK_TTL_S). Tasks with a TTL of 0 are
+never cached. The database is bounded to LLM_CACHE_MAX_ENTRIES entries, and
+the least recently used entries are evicted first. Expired entries are not
+returned, but they stay in the database until they are evicted or purged:
+when Gemini is overloaded, a stale answer is better than none.
+
+Example usage:
+    from services.LLM.cache import llm_cache
+
+    key = llm_cache.key("translate_conversation", "auto", prompt)
+    answer = llm_cache.get(key)
+    if answer is None:
+        answer = await ask(...)
+        llm_cache.put(key, "translate_conversation", "gemini-2.0-flash", answer)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from services.metrics import metrics
+from services.NLP.normalize import normalize_arabic, normalize_speech_key
+
+DEFAULT_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", str(Path(__file__).parent / "llm_cache" / "responses.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+DAY = 24 * 60 * 60
+
+# Task -> seconds an answer stays valid (0: never cached)
+TASK_TTL_S = {
+    "explain_word": 90 * DAY,
+    "explain_words": 90 * DAY,
+    "translate_conversation": 30 * DAY,
+    "explain_conversation": 30 * DAY,
+    "translate_conversations": 30 * DAY,
+    "explain_conversations": 30 * DAY,
+    "explain_sentence": 7 * DAY,
+    "generate_bilingual_content": 7 * DAY,
+    # Conversation replies should vary
+    "continue_conversation": 0,
+    "answer_to_conversation": 0,
+}
+DEFAULT_TTL_S = 0
+
+# Tasks about single words, whose answer depends on the word's harakat and letter forms
+WRITTEN_FORM_TASKS = {"explain_word", "explain_words"}
+
+# Check the size bound after this many writes
+_EVICT_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_task ON responses (task);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+"""
+
+
+def _normalize_contents(contents, normalize=normalize_arabic):
+    if isinstance(contents, str):
+        return normalize(contents)
+    return [{"role": turn.get("role"),
+             "parts": [normalize(part) if isinstance(part, str) else part for part in turn.get("parts", ())]}
+            for turn in contents]
+
+
+class ResponseCache:
+    """
+    SQLite-backed response cache. Thread safe; share one instance per process.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def ttl(task: str) -> float:
+        """Seconds an answer of this task stays valid (0: not cacheable)"""
+        return TASK_TTL_S.get(task, DEFAULT_TTL_S)
+
+    @staticmethod
+    def key(task: str, model_name: str, contents, generation_config: Optional[dict] = None) -> str:
+        """
+        Build the cache key of a call.
+
+        Args:
+            task (str): Task name, e.g. "explain_word"
+            model_name (str): Requested model ("auto" for routed calls)
+            contents: Prompt string or list of {"role", "parts"} turns
+            generation_config (dict, optional): Generation settings of the model
+
+        Returns:
+            str: Hex SHA-256 digest
+        """
+        normalize = normalize_speech_key if task in WRITTEN_FORM_TASKS else normalize_arabic
+        payload = json.dumps(
+            {"task": task, "model": model_name, "contents": _normalize_contents(contents, normalize),
+             "config": generation_config or {}},
+            ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, task: str = "", allow_stale: bool = False) -> Optional[str]:
+        """
+        Cached answer for a key.
+
+        Args:
+            key (str): Cache key
+            task (str): Task name, used in the hit/miss metrics
+            allow_stale (bool): Also return an expired answer (when upstream is overloaded)
+
+        Returns:
+            str: The answer, or None if missing (or expired, unless allow_stale)
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            usable = row is not None and (allow_stale or row[1] >= now)
+            if usable:
+                self._db.execute("UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        if not usable:
+            metrics.increment(f"llm_cache_misses.{task}")
+            return None
+        metrics.increment(f"llm_cache_{'stale_hits' if row[1] < now else 'hits'}.{task}")
+        return row[0]
+
+    def put(self, key: str, task: str, model_name: str, response: str, ttl_s: Optional[float] = None) -> None:
+        """
+        Store an answer.
+
+        Args:
+            key (str): Cache key
+            task (str): Task name
+            model_name (str): Model that produced the answer
+            response (str): The answer
+            ttl_s (float, optional): Time to live (default: the task's)
+        """
+        ttl_s = self.ttl(task) if ttl_s is None else ttl_s
+        if ttl_s <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, task, model, response, created, expires, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, task, model_name, response, now, now + ttl_s, now),
+            )
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute("DELETE FROM responses WHERE key IN "
+                             "(SELECT key FROM responses ORDER BY last_access LIMIT ?)", (excess,))
+            metrics.increment("llm_cache_evictions", excess)
+
+    def invalidate(self, task: Optional[str] = None, key: Optional[str] = None) -> int:
+        """
+        Delete entries: one key, every entry of a task, or everything.
+
+        Returns:
+            int: Number of deleted entries
+        """
+        with self._lock:
+            if key is not None:
+                cursor = self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            elif task is not None:
+                cursor = self._db.execute("DELETE FROM responses WHERE task = ?", (task,))
+            else:
+                cursor = self._db.execute("DELETE FROM responses")
+        return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        """Delete expired entries; returns how many were deleted"""
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        """
+        Entry counts, sizes and hits per task.
+
+        Returns:
+            dict: {"entries", "max_entries", "tasks": {task: {"entries", "expired", "bytes", "hits"}}}
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT task, COUNT(*), SUM(expires < ?), SUM(LENGTH(CAST(response AS BLOB))), SUM(hits) "
+                "FROM responses GROUP BY task", (now,)
+            ).fetchall()
+        tasks = {task: {"entries": entries, "expired": expired or 0, "bytes": size or 0, "hits": hits or 0}
+                 for task, entries, expired, size, hits in rows}
+        return {
+            "entries": sum(task["entries"] for task in tasks.values()),
+            "max_entries": self.max_entries,
+            "tasks": tasks,
+        }
+
+
+# Shared cache instance
+llm_cache = ResponseCache()
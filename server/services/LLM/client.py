@@ -0,0 +1,373 @@
+"""
+Gemini Client - One Shared, Lazily Initialized Client for All LLM Calls
+
+Importing google.generativeai (grpc, protobuf, google.auth) is slow, and the
+server used to do it at import time in two copies of the same class (Gemini
+in services.LLM.gemini and FixedGemini in Yoel.model), configuring the SDK
+again for every Dialog and BilingualContentGenerator instance. This client
+imports and configures the SDK once, on first use, builds each model once per
+process, and can be warmed up in the background while the server already
+accepts requests. is_ready() / status() back the /ready probe.
+
+Calls are stateless: a conversation is passed in full as a list of turns
+({"role": "user" | "model", "parts": [text]}), so the caller owns its history.
+
+Example usage:
+    from services.LLM.client import llm_client
+
+    text = await llm_client.generate("explain_word", prompt, json_output=True)
+    text = await llm_client.generate("continue_conversation", history + [turn], "gemini-2.0-flash")
+
+Without a model name the call is routed (see services.LLM.router). Answers
+of deterministic tasks are served from the response cache (services.LLM.cache).
+Upstream calls are rate limited and prioritized by services.LLM.scheduler.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from services.LLM.cache import llm_cache
+from services.LLM.router import AUTO_MODEL, model_router
+from services.LLM.scheduler import LLMOverloaded, llm_scheduler
+from services.cassette import cassette
+from services.metrics import metrics
+
+# Available models with descriptions
+AVAILABLE_MODELS = {
+    "gemini-1.5-flash": "Fast and versatile (recommended for beginners)",
+    "gemini-1.5-pro": "Complex reasoning tasks (more powerful)",
+    "gemini-2.0-flash": "Newest multimodal, fastest",
+    "gemini-2.0-flash-lite": "Most cost-efficient",
+    "gemini-2.5-flash-preview-05-20": "Best price-performance with thinking capabilities",
+    "gemini-2.5-pro-preview-05-06": "Most powerful thinking model (advanced reasoning)"
+}
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# Generation settings for models that must answer in JSON
+JSON_GENERATION_CONFIG = {
+    "temperature": 0.9,
+    "top_p": 1,
+    "top_k": 1,
+    "max_output_tokens": 2048,
+    "response_mime_type": "application/json"
+}
+
+# A single prompt, or a conversation as a list of {"role", "parts"} turns
+Contents = Union[str, List[dict]]
+
+ENV_PATH = Path('.') / '.env'
+
+
+def user_turn(text: str) -> dict:
+    """Conversation turn sent by the user"""
+    return {"role": "user", "parts": [text]}
+
+
+def model_turn(text: str) -> dict:
+    """Conversation turn answered by the model"""
+    return {"role": "model", "parts": [text]}
+
+
+def prompt_chars(contents: Contents) -> int:
+    """Size of a prompt or conversation in characters"""
+    if isinstance(contents, str):
+        return len(contents)
+    return sum(len(part) for turn in contents for part in turn.get("parts", ()) if isinstance(part, str))
+
+
+def _cassette_request(task: str, contents: Contents, json_output: bool) -> dict:
+    # The routed model is left out: replayed latencies may route differently than when recording
+    return {"task": task, "contents": contents, "json": json_output}
+
+
+class GeminiClient:
+    """
+    Process-wide Gemini client. The SDK is imported on first use and every
+    (model, json_output) pair is built once. Thread safe.
+    """
+
+    def __init__(self, api_key: Optional[str] = None):
+        self._api_key = api_key
+        self._lock = threading.Lock()
+        self._genai = None
+        self._models: Dict[Tuple[str, bool], object] = {}
+        self._ready = False
+        self._error: Optional[str] = None
+        self.import_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+
+    def _sdk(self):
+        """Import and configure google.generativeai (once)"""
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    start = time.perf_counter()
+                    import google.generativeai as genai
+                    from dotenv import load_dotenv
+
+                    load_dotenv(ENV_PATH)
+                    genai.configure(api_key=self._api_key or os.environ["GEMINI_API_KEY"])
+                    self.import_seconds = time.perf_counter() - start
+                    metrics.observe("llm_sdk_import_ms", self.import_seconds * 1000)
+                    self._genai = genai
+        return self._genai
+
+    def model(self, model_name: str = DEFAULT_MODEL, json_output: bool = False):
+        """
+        The shared GenerativeModel for a model name, built on first use.
+
+        Args:
+            model_name (str): One of AVAILABLE_MODELS
+            json_output (bool): Use the JSON generation settings
+
+        Returns:
+            genai.GenerativeModel: The model
+
+        Raises:
+            ValueError: If the model name is unknown
+        """
+        if model_name not in AVAILABLE_MODELS:
+            raise ValueError(f"Invalid model. Available: {list(AVAILABLE_MODELS.keys())}")
+
+        key = (model_name, json_output)
+        model = self._models.get(key)
+        if model is None:
+            genai = self._sdk()
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    config = JSON_GENERATION_CONFIG if json_output else None
+                    model = self._models[key] = genai.GenerativeModel(model_name=model_name,
+                                                                      generation_config=config)
+        return model
+
+    def _route(self, task: str, contents: Contents, model_name: Optional[str], slo_ms: Optional[float]) -> str:
+        if model_name and model_name != AUTO_MODEL:
+            return model_name
+        return model_router.choose(task, prompt_chars(contents), slo_ms)
+
+    def _record(self, task: str, model_name: str, start: float, failed: bool) -> None:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics.observe(f"llm_latency_ms.{model_name}", elapsed_ms)
+        model_router.record(task, model_name, elapsed_ms, failed=failed)
+        metrics.increment(f"llm_errors.{task}" if failed else f"llm_calls.{task}")
+
+    def _cached(self, task: str, contents: Contents, model_name: Optional[str], json_output: bool,
+                use_cache: bool, refresh_cache: bool) -> Tuple[Optional[str], Optional[str]]:
+        """(cache key or None if not cacheable, cached answer or None)"""
+        if not use_cache or not llm_cache.ttl(task):
+            return None, None
+        key = llm_cache.key(task, model_name or AUTO_MODEL, contents, JSON_GENERATION_CONFIG if json_output else None)
+        return key, None if refresh_cache else llm_cache.get(key, task)
+
+    async def generate(self, task: str, contents: Contents, model_name: Optional[str] = AUTO_MODEL,
+                       json_output: bool = False, slo_ms: Optional[float] = None,
+                       use_cache: bool = True, refresh_cache: bool = False) -> str:
+        """
+        Generate a response without blocking the event loop.
+
+        Args:
+            task (str): Name of the calling task, used for routing, caching and metrics (e.g. "explain_word")
+            contents (Contents): Prompt or full conversation ending with a user turn
+            model_name (str, optional): One of AVAILABLE_MODELS, or "auto"/None to let the router choose
+            json_output (bool): Ask for a JSON response
+            slo_ms (float, optional): Latency budget used by the router (default: the task's)
+            use_cache (bool): Use the response cache for tasks that have a TTL
+            refresh_cache (bool): Skip the cached answer but store the new one (e.g. when retrying
+                because the cached answer was unusable)
+
+        Returns:
+            str: The response text
+
+        Raises:
+            LLMOverloaded: If the call cannot be served before the request's deadline
+                and no stale cached answer exists
+        """
+        # Cache reads and writes may wait on SQLite locks: off the event loop
+        cache_key, cached = await asyncio.to_thread(self._cached, task, contents, model_name, json_output,
+                                                    use_cache, refresh_cache)
+        if cached is not None:
+            return cached
+
+        model_name = self._route(task, contents, model_name, slo_ms)
+
+        async def upstream() -> str:
+            if (model_name, json_output) in self._models:
+                model = self._models[(model_name, json_output)]
+            else:
+                # First use imports the SDK, keep that off the event loop
+                model = await asyncio.to_thread(self.model, model_name, json_output)
+            response = await model.generate_content_async(contents)
+            return response.text
+
+        # Wait for a rate-limited slot in the call's priority class
+        try:
+            async with llm_scheduler.slot(task):
+                start = time.perf_counter()
+                try:
+                    text = await cassette.call("llm", _cassette_request(task, contents, json_output), upstream)
+                except asyncio.CancelledError:
+                    metrics.increment(f"llm_cancelled_in_flight.{task}")
+                    raise
+                except Exception:
+                    self._record(task, model_name, start, failed=True)
+                    raise
+                self._record(task, model_name, start, failed=False)
+        except LLMOverloaded:
+            # Shed: an expired answer beats a 503
+            stale = await asyncio.to_thread(llm_cache.get, cache_key, task, allow_stale=True) if cache_key else None
+            if stale is None:
+                raise
+            metrics.increment(f"llm_stale_served.{task}")
+            return stale
+        if cache_key:
+            await asyncio.to_thread(llm_cache.put, cache_key, task, model_name, text)
+        return text
+
+    def generate_sync(self, task: str, contents: Contents, model_name: Optional[str] = AUTO_MODEL,
+                      json_output: bool = False, slo_ms: Optional[float] = None,
+                      use_cache: bool = True, refresh_cache: bool = False) -> str:
+        """
+        Blocking generate for scripts and demos; see generate for the arguments.
+        Not rate limited by the scheduler, which serves the server's event loop.
+        """
+        cache_key, cached = self._cached(task, contents, model_name, json_output, use_cache, refresh_cache)
+        if cached is not None:
+            return cached
+
+        model_name = self._route(task, contents, model_name, slo_ms)
+        start = time.perf_counter()
+        try:
+            text = cassette.call_sync("llm", _cassette_request(task, contents, json_output),
+                                      lambda: self.model(model_name, json_output).generate_content(contents).text)
+        except Exception:
+            self._record(task, model_name, start, failed=True)
+            raise
+        self._record(task, model_name, start, failed=False)
+        if cache_key:
+            llm_cache.put(cache_key, task, model_name, text)
+        return text
+
+    def cached(self, task: str, contents: Contents, model_name: Optional[str] = AUTO_MODEL,
+               json_output: bool = False) -> Optional[str]:
+        """
+        The cached answer generate() would return for these arguments, without calling upstream.
+        Blocking (SQLite); call it through asyncio.to_thread from coroutines.
+
+        Returns:
+            str: The answer, or None if not cached (or the task is not cacheable)
+        """
+        return self._cached(task, contents, model_name, json_output, True, False)[1]
+
+    def store(self, task: str, contents: Contents, text: str, model_name: Optional[str] = AUTO_MODEL,
+              json_output: bool = False) -> None:
+        """
+        Cache an answer obtained another way (e.g. as part of a combined call),
+        so generate() with these arguments returns it. No-op for tasks that are not cached.
+        Blocking (SQLite); call it through asyncio.to_thread from coroutines.
+        """
+        cache_key, _ = self._cached(task, contents, model_name, json_output, True, True)
+        if cache_key:
+            llm_cache.put(cache_key, task, model_name or AUTO_MODEL, text)
+
+    async def warm_up(self, model_names: Optional[Iterable[str]] = None) -> bool:
+        """
+        Import the SDK and build the given models in worker threads, in parallel.
+        Meant to run as a background task at server start-up.
+
+        Args:
+            model_names (Iterable[str], optional): Models to build, plain and JSON variants
+                (default: every model the router may choose)
+
+        Returns:
+            bool: True if the client is ready
+        """
+        model_names = model_names or model_router.models()
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._sdk)
+            await asyncio.gather(*(asyncio.to_thread(self.model, name, json_output)
+                                   for name in model_names for json_output in (False, True)))
+        except Exception as e:
+            self._error = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Gemini warm-up failed: {self._error}")
+            return False
+
+        self.ready_seconds = time.perf_counter() - start
+        self._ready = True
+        self._error = None
+        metrics.observe("llm_warm_up_ms", self.ready_seconds * 1000)
+        print(f"✅ Gemini client ready in {self.ready_seconds:.2f}s")
+        return True
+
+    def is_ready(self) -> bool:
+        """True once the SDK is imported and the warm-up models are built"""
+        return self._ready
+
+    def status(self) -> dict:
+        """Readiness details for the /ready probe"""
+        return {
+            "ready": self._ready,
+            "error": self._error,
+            "models": sorted({name for name, _ in self._models}),
+            "import_seconds": self.import_seconds,
+            "ready_seconds": self.ready_seconds,
+        }
+
+
+# Shared client instance
+llm_client = GeminiClient()
+
+
+_STARTUP_SCRIPT = """
+import asyncio, json, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter() - start
+from services.LLM.client import llm_client
+ready = asyncio.run(llm_client.warm_up())
+print(json.dumps({"import_s": imported, "ready": ready,
+                  "ready_s": imported + (llm_client.ready_seconds or 0)}))
+"""
+
+
+def benchmark_startup(runs: int = 3) -> dict:
+    """
+    Measure server cold start in fresh interpreters: time to import the app
+    (when uvicorn can start serving) and time until the Gemini client is ready.
+    Run from the server folder.
+
+    Args:
+        runs (int): Number of cold starts to average
+
+    Returns:
+        dict: {"import_s", "ready_s", "ready"} averaged over the runs
+    """
+    samples = []
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], capture_output=True, text=True,
+                                 cwd=Path(__file__).resolve().parents[2])
+        if process.returncode != 0:
+            raise RuntimeError(f"Start-up run failed: {process.stderr.strip()[-500:]}")
+        samples.append(json.loads(process.stdout.strip().splitlines()[-1]))
+
+    results = {
+        "import_s": sum(sample["import_s"] for sample in samples) / runs,
+        "ready_s": sum(sample["ready_s"] for sample in samples) / runs,
+        "ready": all(sample["ready"] for sample in samples),
+    }
+    print(f"⏱️ Start-up: app imported in {results['import_s']:.2f}s, "
+          f"Gemini {'ready' if results['ready'] else 'NOT ready'} after {results['ready_s']:.2f}s")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_startup()
@@ -1,47 +1,39 @@
-import os
-import google.generativeai as genai
-import google.auth
+from services.LLM.client import AVAILABLE_MODELS, DEFAULT_MODEL, llm_client, model_turn, user_turn
+from services.LLM.router import AUTO_MODEL
+from services.LLM.scheduler import LLMOverloaded
 
-from pathlib import Path
-from dotenv import load_dotenv
-env_path = Path('.')/'.env'
-load_dotenv(env_path)
 
 class Gemini:
     """
     Simple Gemini API client - use as a black box
     Just call init_model() with your preferred model and use ask()
+
+    Each instance is one conversation. The SDK and the models are shared by
+    all instances (services.LLM.client) and created on first use.
     """
 
     # Available models with descriptions
-    AVAILABLE_MODELS = {
-        "gemini-1.5-flash": "Fast and versatile (recommended for beginners)",
-        "gemini-1.5-pro": "Complex reasoning tasks (more powerful)",
-        "gemini-2.0-flash": "Newest multimodal, fastest",
-        "gemini-2.0-flash-lite": "Most cost-efficient",
-        "gemini-2.5-flash-preview-05-20": "Best price-performance with thinking capabilities",
-        "gemini-2.5-pro-preview-05-06": "Most powerful thinking model (advanced reasoning)"
-    }
-
-    def _init_(self):
-        self.model = None
-        self.json_model = None
-        self.chat = None
+    AVAILABLE_MODELS = AVAILABLE_MODELS
+
+    def __init__(self):
         self.model_name = None
+        self.history = []
         self._initialized = False
 
     def init_model(self, model_name=None):
         """
-        Initialize Gemini model - call this once before using ask()
-        
+        Choose the model for this conversation - call this once before using ask()
+        Nothing is loaded here; the model is built on the first question.
+
         Args:
-            model_name (str, optional): Model to use. If None, shows selection menu.
-            
+            model_name (str, optional): Model to use, or "auto" to let the router choose
+                per question. If None, shows selection menu.
+
         Returns:
             Gemini: Ready-to-use Gemini instance
-            
+
         Raises:
-            Exception: If initialization fails
+            Exception: If the model is invalid
         """
         try:
             # If no model specified, let user choose
@@ -49,74 +41,74 @@ class Gemini:
                 model_name = self._select_model()
 
             # Validate model
-            if model_name not in self.AVAILABLE_MODELS:
+            if model_name not in self.AVAILABLE_MODELS and model_name != AUTO_MODEL:
                 raise ValueError(f"Invalid model. Available: {list(self.AVAILABLE_MODELS.keys())}")
 
-            print(f"🚀 Initializing model: {model_name}...")
-            genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-
-            # Create model and chat session
-            self.model = genai.GenerativeModel(model_name)
-            self.chat = self.model.start_chat()
             self.model_name = model_name
-
-            # 2. Define generation settings with explicit JSON MIME type
-            generation_config = {
-                "temperature": 0.9,
-                "top_p": 1,
-                "top_k": 1,
-                "max_output_tokens": 2048,
-                "response_mime_type": "application/json"  # Tell Gemini to return JSON
-            }
-            
-            # 3. Load the Gemini model
-            self.json_model = genai.GenerativeModel(
-                model_name=self.model_name,
-                generation_config=generation_config
-            )
-            self.json_chat = self.json_model.start_chat()
-            
             self._initialized = True
-
-            print(f"✅ Gemini {model_name} is ready!")
             return self
 
         except Exception as e:
             raise Exception(f"Failed to initialize Gemini: {e}")
 
-    def ask(self, question, short_answer=True):
+    def _prepare(self, question, short_answer):
+        if not self._initialized:
+            raise Exception("Model not initialized. Call init_model() first!")
+
+        if not question or not question.strip():
+            raise ValueError("Question cannot be empty")
+
+        if short_answer:
+            return f"{question}\n\nPlease provide a short, concise answer with minimal explanation."
+        return question
+
+    def ask(self, question, short_answer=True, task="ask", json_output=False, remember=True, slo_ms=None,
+            use_cache=True, refresh_cache=False):
         """
         Ask Gemini a question and get a response
-        
+
         Args:
             question (str): The question to ask
             short_answer (bool): Whether to request a concise answer
-            
+            task (str): Task name reported in metrics
+            json_output (bool): Ask for a JSON response
+            remember (bool): Keep the question and answer in this conversation's history
+            slo_ms (float, optional): Latency budget when the model is routed
+            use_cache (bool): Allow a cached answer (only tasks with a cache TTL are cached)
+            refresh_cache (bool): Ask again even if cached, and replace the cached answer
+
         Returns:
             str: Gemini's response
-            
+
         Raises:
             Exception: If not initialized or API error occurs
         """
-        if not self._initialized:
-            raise Exception("Model not initialized. Call init_model() first!")
-
-        if not question or not question.strip():
-            raise ValueError("Question cannot be empty")
-
+        prompt = self._prepare(question, short_answer)
         try:
-            # Prepare prompt
-            if short_answer:
-                prompt = f"{question}\n\nPlease provide a short, concise answer with minimal explanation."
-            else:
-                prompt = question
-
-            # Get response
-            response = self.chat.send_message(prompt)
-            return response.text
+            answer = llm_client.generate_sync(task, self.history + [user_turn(prompt)], self.model_name,
+                                             json_output, slo_ms, use_cache, refresh_cache)
+        except Exception as e:
+            raise Exception(f"Error getting response: {e}")
+        if remember:
+            self.history += [user_turn(prompt), model_turn(answer)]
+        return answer
 
+    async def ask_async(self, question, short_answer=True, task="ask", json_output=False, remember=True,
+                        slo_ms=None, use_cache=True, refresh_cache=False):
+        """
+        Non-blocking ask() for request handlers; see ask() for the arguments
+        """
+        prompt = self._prepare(question, short_answer)
+        try:
+            answer = await llm_client.generate(task, self.history + [user_turn(prompt)], self.model_name,
+                                               json_output, slo_ms, use_cache, refresh_cache)
+        except LLMOverloaded:
+            raise
         except Exception as e:
             raise Exception(f"Error getting response: {e}")
+        if remember:
+            self.history += [user_turn(prompt), model_turn(answer)]
+        return answer
 
     def get_model_name(self):
         """Get the current model name"""
@@ -144,7 +136,7 @@ class Gemini:
                 choice = input(f"🔢 Select model (1-{len(models)}) or press Enter for default [1]: ").strip()
 
                 if not choice:  # Default to gemini-1.5-flash (beginner-friendly)
-                    selected = models[0]  # gemini-1.5-flash
+                    selected = DEFAULT_MODEL
                     print(f"✅ Using default model: {selected}")
                     return selected
 
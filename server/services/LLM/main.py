@@ -1,4 +1,4 @@
-from gemini import init_model
+from services.LLM.gemini import init_model
 
 
 def main():
@@ -0,0 +1,166 @@
+"""
+Model Router - Pick a Gemini Model per Task, Prompt Size and Latency Budget
+
+Every call used to go to gemini-1.5-flash, whether it was a one-word
+explain_word lookup or a full lesson. The router keeps an ordered model
+preference per task (cheapest model that does the task well first) and a
+latency budget (SLO) per task. For each call it takes the first preferred
+model whose recent tail latency fits the budget. When every preferred model
+is over budget it downgrades to the lite model. Lite models are moved to the
+end of the list for very long prompts.
+
+Latency is tracked per task and model: a batch call that takes 20 s on a
+model says nothing about a one-word lookup on the same model, so it must not
+push that model over explain_word's budget. Samples expire after
+LATENCY_WINDOW_S, so a model that was avoided because it was slow becomes
+eligible again once its old samples age out. A failed call is recorded as
+over budget however fast it failed: a model answering quota errors in 50 ms
+is not a fast model.
+
+Decisions are counted in metrics as llm_route.<task>.<model> and
+llm_route_downgrades.<task>; tail latency is the gauge
+llm_model_p95_ms.<task>.<model>.
+
+Example usage:
+    from services.LLM.router import model_router
+
+    model_name = model_router.choose("explain_word", prompt_chars=180)
+    model_router.record("explain_word", model_name, 840.0)
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from services.metrics import metrics
+
+# Model name that asks the client to route the call
+AUTO_MODEL = "auto"
+
+LITE_MODEL = "gemini-2.0-flash-lite"
+
+# Task -> models in order of preference
+TASK_MODELS: Dict[str, List[str]] = {
+    "explain_word": ["gemini-2.0-flash", "gemini-1.5-flash", LITE_MODEL],
+    "continue_conversation": [LITE_MODEL, "gemini-2.0-flash"],
+    "answer_to_conversation": [LITE_MODEL, "gemini-2.0-flash"],
+    "explain_sentence": ["gemini-2.0-flash", "gemini-1.5-flash", LITE_MODEL],
+    "explain_conversation": ["gemini-2.0-flash", "gemini-1.5-flash", LITE_MODEL],
+    "explain_words": ["gemini-2.0-flash", "gemini-1.5-flash", LITE_MODEL],
+    "translate_conversations": ["gemini-2.0-flash", "gemini-1.5-flash"],
+    "explain_conversations": ["gemini-2.0-flash", "gemini-1.5-flash"],
+    "translate_conversation": ["gemini-2.0-flash", "gemini-1.5-flash", LITE_MODEL],
+    "generate_bilingual_content": ["gemini-2.5-flash-preview-05-20", "gemini-2.0-flash", "gemini-1.5-flash"],
+}
+DEFAULT_TASK_MODELS = ["gemini-1.5-flash", "gemini-2.0-flash", LITE_MODEL]
+
+# Task -> latency budget in milliseconds
+TASK_SLO_MS: Dict[str, float] = {
+    "explain_word": 2500,
+    "continue_conversation": 3000,
+    "answer_to_conversation": 3000,
+    "explain_sentence": 4000,
+    "explain_conversation": 6000,
+    "explain_words": 15000,
+    "translate_conversations": 30000,
+    "explain_conversations": 30000,
+    "translate_conversation": 6000,
+    "generate_bilingual_content": 12000,
+}
+DEFAULT_SLO_MS = 8000
+
+# Prompts longer than this are not sent to lite models unless everything else is too slow
+LONG_PROMPT_CHARS = 4000
+
+# Tail latency is taken over samples from the last LATENCY_WINDOW_S seconds
+LATENCY_WINDOW_S = 300
+LATENCY_SAMPLES = 100
+TAIL_PERCENTILE = 95
+# Fewer recent samples than this is not enough to judge a model
+MIN_SAMPLES = 5
+# A failed call counts as this many times the task's budget
+FAILED_CALL_SLO_FACTOR = 2
+
+
+class ModelRouter:
+    """
+    Chooses a model per call from task preferences and recent latency. Thread safe.
+    """
+
+    def __init__(self, task_models: Optional[Dict[str, List[str]]] = None,
+                 task_slo_ms: Optional[Dict[str, float]] = None):
+        self.task_models = task_models or TASK_MODELS
+        self.task_slo_ms = task_slo_ms or TASK_SLO_MS
+        self._lock = threading.Lock()
+        # (task, model) -> (monotonic time, latency in ms)
+        self._samples: Dict[Tuple[str, str], Deque[Tuple[float, float]]] = {}
+
+    def models(self) -> List[str]:
+        """Every model the router may choose"""
+        names = [name for preferences in self.task_models.values() for name in preferences]
+        return list(dict.fromkeys(names + DEFAULT_TASK_MODELS))
+
+    def record(self, task: str, model_name: str, latency_ms: float, failed: bool = False) -> None:
+        """Record the latency of a finished call of a task; failed calls count as over budget"""
+        if failed:
+            latency_ms = max(latency_ms, FAILED_CALL_SLO_FACTOR * self.task_slo_ms.get(task, DEFAULT_SLO_MS))
+        key = (task, model_name)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=LATENCY_SAMPLES)
+            samples.append((time.monotonic(), latency_ms))
+        tail = self.tail_latency(task, model_name)
+        if tail is not None:
+            metrics.set_gauge(f"llm_model_p95_ms.{task}.{model_name}", round(tail, 1))
+
+    def tail_latency(self, task: str, model_name: str) -> Optional[float]:
+        """
+        Recent tail latency of a model on a task.
+
+        Returns:
+            float: The TAIL_PERCENTILE latency in milliseconds, or None with too few recent samples
+        """
+        cutoff = time.monotonic() - LATENCY_WINDOW_S
+        with self._lock:
+            recent = sorted(ms for at, ms in self._samples.get((task, model_name), ()) if at >= cutoff)
+        if len(recent) < MIN_SAMPLES:
+            return None
+        return recent[min(len(recent) - 1, int(round(TAIL_PERCENTILE / 100 * (len(recent) - 1))))]
+
+    def choose(self, task: str, prompt_chars: int = 0, slo_ms: Optional[float] = None) -> str:
+        """
+        Pick the model for one call.
+
+        Args:
+            task (str): Task name (e.g. "explain_word")
+            prompt_chars (int): Size of the prompt including history
+            slo_ms (float, optional): Latency budget for this request (default: the task's)
+
+        Returns:
+            str: The chosen model name
+        """
+        preferences = list(self.task_models.get(task, DEFAULT_TASK_MODELS))
+        if prompt_chars > LONG_PROMPT_CHARS and len(preferences) > 1:
+            preferences.sort(key=lambda name: name == LITE_MODEL)
+        budget = slo_ms or self.task_slo_ms.get(task, DEFAULT_SLO_MS)
+
+        chosen = None
+        for name in preferences:
+            tail = self.tail_latency(task, name)
+            if tail is None or tail <= budget:
+                chosen = name
+                break
+        if chosen is None:
+            # Everything preferred is over budget: fall back to the lite model
+            chosen = LITE_MODEL
+
+        metrics.increment(f"llm_route.{task}.{chosen}")
+        if chosen != preferences[0]:
+            metrics.increment(f"llm_route_downgrades.{task}")
+        return chosen
+
+
+# Shared router instance
+model_router = ModelRouter()
@@ -0,0 +1,365 @@
+"""
+LLM Scheduler - Priorities, Rate Limiting and Fairness for Upstream Gemini Calls
+
+Every Gemini call waits here for a slot before going upstream. A slot needs
+a token from a token bucket sized to the API quota (LLM_REQUESTS_PER_MINUTE,
+bursts of LLM_BURST) and a free place among LLM_MAX_IN_FLIGHT concurrent
+calls. With several server workers (WEB_CONCURRENCY), each worker gets an
+equal part of the quota.
+
+Waiting calls are served by priority class:
+    - interactive: a learner is waiting on a click (explain_word, conversation replies)
+    - normal: regular requests (translations, lesson generation)
+    - background: prefetch and batch work, which must not starve interactive calls
+
+Within a class, sessions take turns (round robin), so one user's burst of
+requests does not hold up everyone else. A call that has waited AGING_S
+seconds is served as if it were one class higher, so background work still
+finishes under sustained interactive load.
+
+The priority comes from the task (TASK_PRIORITY) unless the caller sets one.
+The session comes from the request (set_session, done by the server
+middleware). scheduling() overrides either for a block of code.
+
+Admission control: when the request has a deadline (set_deadline) and the
+estimated wait (queue ahead, token bucket and recent call duration) would
+overrun it, the call is rejected immediately with LLMOverloaded instead of
+joining the queue. A queued call whose deadline passes leaves the queue the
+same way. The server answers LLMOverloaded with 503 and Retry-After.
+
+Metrics: gauges llm_queue_depth.<class> and llm_in_flight, series
+llm_queue_wait_ms.<class>, counters llm_scheduled.<class>, llm_shed.<class> and
+llm_cancelled_queued.<class>.
+
+Example usage:
+    from services.LLM.scheduler import BACKGROUND, llm_scheduler, scheduling
+
+    async with llm_scheduler.slot("explain_word"):
+        ...  # upstream call
+
+    with scheduling(priority=BACKGROUND, session="lesson-packs"):
+        await generator.generate_bilingual_content(prompt)
+"""
+
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, List, Optional
+
+from services.metrics import metrics
+
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+PRIORITY_NAMES = ["interactive", "normal", "background"]
+
+# Task -> default priority class
+TASK_PRIORITY = {
+    "explain_word": INTERACTIVE,
+    "explain_sentence": INTERACTIVE,
+    "continue_conversation": INTERACTIVE,
+    "answer_to_conversation": INTERACTIVE,
+    "translate_conversation": NORMAL,
+    "explain_conversation": NORMAL,
+    "generate_bilingual_content": NORMAL,
+    "explain_words": BACKGROUND,
+    "translate_conversations": BACKGROUND,
+    "explain_conversations": BACKGROUND,
+}
+
+# The quota is shared by all server workers; each takes an equal part (WEB_CONCURRENCY is uvicorn's worker count)
+WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "300")) / WORKERS
+LLM_BURST = float(os.environ.get("LLM_BURST", "20")) / WORKERS
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", "16"))
+
+# A call waiting this long is served as if it were one class higher
+AGING_S = 20.0
+
+DEFAULT_SESSION = "anonymous"
+
+# Assumed duration of one upstream call until calls have been measured
+INITIAL_SERVICE_MS = 1500.0
+# Weight of the newest call in the running average of call durations
+SERVICE_EWMA_ALPHA = 0.2
+
+_priority_var: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("llm_priority", default=None)
+_session_var: contextvars.ContextVar[str] = contextvars.ContextVar("llm_session", default=DEFAULT_SESSION)
+_deadline_var: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class LLMOverloaded(Exception):
+    """The LLM queue cannot serve the call before the request's deadline"""
+
+    def __init__(self, retry_after_s: int, estimated_wait_ms: float):
+        super().__init__(f"LLM queue saturated, estimated wait {estimated_wait_ms:.0f} ms")
+        self.retry_after_s = retry_after_s
+        self.estimated_wait_ms = estimated_wait_ms
+
+
+def set_session(session: Optional[str]) -> None:
+    """Attribute the LLM calls of the current request (task) to a session"""
+    _session_var.set(session or DEFAULT_SESSION)
+
+
+def set_deadline(seconds: Optional[float]) -> None:
+    """Give the LLM calls of the current request (task) a deadline, seconds from now (None: no deadline)"""
+    _deadline_var.set(time.monotonic() + seconds if seconds is not None else None)
+
+
+@contextmanager
+def scheduling(priority: Optional[int] = None, session: Optional[str] = None):
+    """Override the priority class and/or session of the LLM calls made inside the block"""
+    priority_token = _priority_var.set(priority) if priority is not None else None
+    session_token = _session_var.set(session) if session is not None else None
+    try:
+        yield
+    finally:
+        if priority_token is not None:
+            _priority_var.reset(priority_token)
+        if session_token is not None:
+            _session_var.reset(session_token)
+
+
+def task_priority(task: str) -> int:
+    """Priority class of a call: the scheduling() override, else the task's default"""
+    priority = _priority_var.get()
+    return priority if priority is not None else TASK_PRIORITY.get(task, NORMAL)
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "session", "enqueued")
+
+    def __init__(self, future: asyncio.Future, priority: int, session: str):
+        self.future = future
+        self.priority = priority
+        self.session = session
+        self.enqueued = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Priority queue with per-session round robin in front of a token bucket
+    and a concurrency limit. Use from one event loop.
+    """
+
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE, burst: float = LLM_BURST,
+                 max_in_flight: int = LLM_MAX_IN_FLIGHT):
+        self.rate = requests_per_minute / 60
+        self.capacity = max(1.0, burst)
+        self.max_in_flight = max_in_flight
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        # One ordered {session: waiters} per class; the first session is served next
+        self._queues: List["OrderedDict[str, Deque[_Waiter]]"] = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._depth = [0] * len(PRIORITY_NAMES)
+        self._in_flight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._service_ms = INITIAL_SERVICE_MS
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        """Waiting calls in one class, or in all classes"""
+        return sum(self._depth) if priority is None else self._depth[priority]
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def estimate_wait_ms(self, priority: int = NORMAL) -> float:
+        """
+        Estimated queueing time of a new call in a priority class (aging ignored).
+
+        Args:
+            priority (int): INTERACTIVE, NORMAL or BACKGROUND
+
+        Returns:
+            float: Milliseconds until the call would get its slot
+        """
+        self._refill()
+        ahead = sum(self._depth[:priority + 1])
+        # Calls that must finish before a place frees up, served max_in_flight at a time
+        waiting_for_place = max(0, self._in_flight + ahead + 1 - self.max_in_flight)
+        place_wait = math.ceil(waiting_for_place / self.max_in_flight) * self._service_ms
+        token_wait = max(0.0, (ahead + 1 - self._tokens) / self.rate * 1000) if self.rate > 0 else 0.0
+        return max(place_wait, token_wait)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _pick(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        best = None
+        best_rank = None
+        for priority, sessions in enumerate(self._queues):
+            if not sessions:
+                continue
+            waiter = next(iter(sessions.values()))[0]
+            rank = priority - int((now - waiter.enqueued) / AGING_S)
+            if best is None or rank < best_rank:
+                best, best_rank = waiter, rank
+        if best is None:
+            return None
+
+        sessions = self._queues[best.priority]
+        waiters = sessions.pop(best.session)
+        waiters.popleft()
+        if waiters:
+            # Back of the line for this session's next call
+            sessions[best.session] = waiters
+        self._depth[best.priority] -= 1
+        return best
+
+    def _dispatch(self) -> None:
+        self._refill()
+        while self._in_flight < self.max_in_flight and self._tokens >= 1:
+            waiter = self._pick()
+            if waiter is None:
+                break
+            if waiter.future.done():
+                continue  # cancelled while queued
+            self._tokens -= 1
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+        if self.queue_depth() and self._in_flight < self.max_in_flight and self._timer is None:
+            # Out of tokens: come back when the next one is due
+            delay = (1 - self._tokens) / self.rate if self.rate > 0 else 1.0
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.001), self._on_timer)
+        self._update_gauges()
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        waiters = self._queues[waiter.priority].get(waiter.session)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._depth[waiter.priority] -= 1
+            if not waiters:
+                del self._queues[waiter.priority][waiter.session]
+        self._update_gauges()
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _update_gauges(self) -> None:
+        for priority, name in enumerate(PRIORITY_NAMES):
+            metrics.set_gauge(f"llm_queue_depth.{name}", self._depth[priority])
+        metrics.set_gauge("llm_in_flight", self._in_flight)
+
+    @asynccontextmanager
+    async def slot(self, task: str, priority: Optional[int] = None, session: Optional[str] = None):
+        """
+        Wait for permission to make one upstream call and hold it for the block.
+
+        Args:
+            task (str): Task name, used for the default priority
+            priority (int, optional): INTERACTIVE, NORMAL or BACKGROUND (default: see task_priority)
+            session (str, optional): Session to account the call to (default: the current request's)
+        """
+        priority = task_priority(task) if priority is None else priority
+        name = PRIORITY_NAMES[priority]
+
+        deadline = _deadline_var.get()
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            estimate = self.estimate_wait_ms(priority)
+            if (estimate + self._service_ms) / 1000 > timeout:
+                metrics.increment(f"llm_shed.{name}")
+                raise LLMOverloaded(max(1, math.ceil(estimate / 1000)), estimate)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, session or _session_var.get())
+        self._queues[priority].setdefault(waiter.session, deque()).append(waiter)
+        self._depth[priority] += 1
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller gave up: hand the slot on
+                self._release()
+            else:
+                self._remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.increment(f"llm_shed.{name}")
+                raise LLMOverloaded(max(1, math.ceil(self.estimate_wait_ms(priority) / 1000)),
+                                    (time.monotonic() - waiter.enqueued) * 1000)
+            # The request was abandoned while queued: no quota spent
+            metrics.increment(f"llm_cancelled_queued.{name}")
+            raise
+
+        metrics.observe(f"llm_queue_wait_ms.{name}", (time.monotonic() - waiter.enqueued) * 1000)
+        metrics.increment(f"llm_scheduled.{name}")
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.monotonic() - start) * 1000
+            self._service_ms += SERVICE_EWMA_ALPHA * (elapsed_ms - self._service_ms)
+            self._release()
+
+
+# Shared scheduler instance
+llm_scheduler = LLMScheduler()
+
+
+async def benchmark_priorities(background_calls: int = 60, interactive_calls: int = 20,
+                               call_ms: float = 200, requests_per_minute: float = 600) -> dict:
+    """
+    Simulate a background burst with interactive clicks arriving during it and
+    compare the interactive wait with and without priorities.
+
+    Args:
+        background_calls (int): Calls queued at once by background work
+        interactive_calls (int): Interactive calls, one every 100 ms
+        call_ms (float): Simulated upstream latency
+        requests_per_minute (float): Token bucket rate
+
+    Returns:
+        dict: {"with_priorities_p95_ms", "without_priorities_p95_ms"}
+    """
+    results = {}
+    for label, interactive_priority in (("with_priorities", INTERACTIVE), ("without_priorities", BACKGROUND)):
+        scheduler = LLMScheduler(requests_per_minute, burst=5, max_in_flight=4)
+        waits = []
+
+        async def call(priority: int, session: str, record: bool) -> None:
+            start = time.monotonic()
+            async with scheduler.slot("benchmark", priority, session):
+                if record:
+                    waits.append((time.monotonic() - start) * 1000)
+                await asyncio.sleep(call_ms / 1000)
+
+        async def clicks() -> None:
+            tasks = []
+            for i in range(interactive_calls):
+                tasks.append(asyncio.create_task(call(interactive_priority, f"learner-{i}", True)))
+                await asyncio.sleep(0.1)
+            await asyncio.gather(*tasks)
+
+        background = [asyncio.create_task(call(BACKGROUND, "lesson-packs", False)) for _ in range(background_calls)]
+        await clicks()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+
+        waits.sort()
+        results[f"{label}_p95_ms"] = waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+
+    print(f"⏱️ Interactive wait p95 during a background burst: {results['with_priorities_p95_ms']:.0f} ms "
+          f"with priorities, {results['without_priorities_p95_ms']:.0f} ms without")
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmark_priorities())
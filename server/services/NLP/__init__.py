@@ -0,0 +1 @@
+# Arabic text processing helpers (pronunciation alignment, normalization)
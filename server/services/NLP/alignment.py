@@ -0,0 +1,277 @@
+"""
+Pronunciation alignment between an expected Arabic passage and the words
+recognized from the learner's speech.
+
+The two word sequences are aligned globally (edit distance / Needleman-Wunsch)
+so that inserted, repeated and skipped words are reported in the right place.
+Substitution cost between two words is based on their character-level
+similarity, so a slightly mispronounced word is aligned with the word it was
+meant to be instead of being reported as missing.
+
+Example usage:
+    from services.NLP.alignment import align_words
+
+    result = align_words("مرحبا اسمي محمد", "مرحبا محمد")
+    result["missing"]   # [{'op': 'missing', 'expected': 'اسمي', 'recognized': None, ...}]
+    result["score"]     # 0.667
+"""
+
+import random
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from services.NLP.normalize import normalize_word
+
+# Alignment operations
+OP_MATCH = "match"
+OP_SUBSTITUTION = "substitution"
+OP_MISSING = "missing"
+OP_EXTRA = "extra"
+
+# Cost of skipping a word on either side
+GAP_COST = 1.0
+
+# Words at least this similar are considered correctly pronounced
+MATCH_THRESHOLD = 0.75
+
+# Below this similarity two words are treated as unrelated (flat cost of 1)
+SIMILARITY_FLOOR = 0.4
+
+# Traceback directions stored in the DP table
+_DIAGONAL = 0
+_UP = 1      # expected word consumed alone -> missing
+_LEFT = 2    # recognized word consumed alone -> extra
+
+
+def char_similarity(a: str, b: str) -> float:
+    """
+    Character-level similarity of two words, 1 - levenshtein(a, b) / max(len(a), len(b)).
+
+    Args:
+        a (str): First word
+        b (str): Second word
+
+    Returns:
+        float: Similarity between 0.0 (nothing in common) and 1.0 (identical)
+    """
+    if a == b:
+        return 1.0
+    len_a, len_b = len(a), len(b)
+    if not len_a or not len_b:
+        return 0.0
+    if len_a < len_b:
+        a, b, len_a, len_b = b, a, len_b, len_a
+
+    previous = list(range(len_b + 1))
+    for i in range(1, len_a + 1):
+        current = [i] + [0] * len_b
+        char_a = a[i - 1]
+        for j in range(1, len_b + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+        previous = current
+
+    return 1.0 - previous[len_b] / len_a
+
+
+def _align_tokens(expected: List[str], recognized: List[str]) -> List[Tuple[str, Optional[int], Optional[int], float]]:
+    """
+    Run the global alignment and return the traceback as a list of
+    (operation, expected_index, recognized_index, score) tuples in reading order.
+    """
+    n, m = len(expected), len(recognized)
+
+    # Intern tokens so the inner loop compares ints and caches by int key
+    ids: Dict[str, int] = {}
+    expected_ids = [ids.setdefault(token, len(ids)) for token in expected]
+    recognized_ids = [ids.setdefault(token, len(ids)) for token in recognized]
+    vocabulary = list(ids)
+    vocab_size = len(vocabulary)
+    similarity_cache: Dict[int, float] = {}
+
+    def similarity(id_a: int, id_b: int) -> float:
+        key = id_a * vocab_size + id_b
+        cached = similarity_cache.get(key)
+        if cached is None:
+            a, b = vocabulary[id_a], vocabulary[id_b]
+            shorter, longer = sorted((len(a), len(b)))
+            # Upper bound on similarity is the length ratio, skip hopeless pairs
+            if shorter < SIMILARITY_FLOOR * longer:
+                cached = 0.0
+            else:
+                cached = char_similarity(a, b)
+            similarity_cache[key] = cached
+        return cached
+
+    # Only the direction table is kept in full; scores use two rolling rows
+    width = m + 1
+    directions = array('b', bytes((n + 1) * width))
+    previous = array('d', [j * GAP_COST for j in range(width)])
+    for j in range(1, width):
+        directions[j] = _LEFT
+
+    for i in range(1, n + 1):
+        current = array('d', [i * GAP_COST]) * width
+        directions[i * width] = _UP
+        expected_id = expected_ids[i - 1]
+        row = i * width
+        for j in range(1, width):
+            recognized_id = recognized_ids[j - 1]
+            if expected_id == recognized_id:
+                substitution = 0.0
+            else:
+                sim = similarity(expected_id, recognized_id)
+                substitution = 1.0 - sim if sim >= SIMILARITY_FLOOR else 1.0
+
+            best = previous[j - 1] + substitution
+            direction = _DIAGONAL
+            up = previous[j] + GAP_COST
+            if up < best:
+                best, direction = up, _UP
+            left = current[j - 1] + GAP_COST
+            if left < best:
+                best, direction = left, _LEFT
+
+            current[j] = best
+            directions[row + j] = direction
+        previous = current
+
+    # Traceback from the bottom-right corner
+    steps = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        direction = directions[i * width + j]
+        if i > 0 and j > 0 and direction == _DIAGONAL:
+            expected_id, recognized_id = expected_ids[i - 1], recognized_ids[j - 1]
+            score = 1.0 if expected_id == recognized_id else similarity(expected_id, recognized_id)
+            operation = OP_MATCH if score >= MATCH_THRESHOLD else OP_SUBSTITUTION
+            steps.append((operation, i - 1, j - 1, score))
+            i, j = i - 1, j - 1
+        elif i > 0 and (j == 0 or direction == _UP):
+            steps.append((OP_MISSING, i - 1, None, 0.0))
+            i -= 1
+        else:
+            steps.append((OP_EXTRA, None, j - 1, 0.0))
+            j -= 1
+
+    steps.reverse()
+    return steps
+
+
+def align_words(expected_text: str, recognized_text: str) -> dict:
+    """
+    Align the expected passage with the recognized speech and classify every word.
+
+    Args:
+        expected_text (str): The passage the learner was asked to read
+        recognized_text (str): The text recognized from the learner's speech
+
+    Returns:
+        dict: Alignment result with the keys:
+              - "words": every aligned pair in reading order, each a dict with
+                "op", "expected", "recognized", "expected_index",
+                "recognized_index" and "score"
+              - "matched", "substituted", "missing", "extra": the same entries
+                grouped by operation
+              - "score": mean per-word score over the expected words (0.0 - 1.0)
+    """
+    expected_words = [word for word in expected_text.split() if normalize_word(word)]
+    recognized_words = [word for word in recognized_text.split() if normalize_word(word)]
+
+    steps = _align_tokens([normalize_word(w) for w in expected_words],
+                          [normalize_word(w) for w in recognized_words])
+
+    result = {
+        "words": [],
+        "matched": [],
+        "substituted": [],
+        "missing": [],
+        "extra": [],
+        "score": 0.0,
+    }
+    groups = {
+        OP_MATCH: result["matched"],
+        OP_SUBSTITUTION: result["substituted"],
+        OP_MISSING: result["missing"],
+        OP_EXTRA: result["extra"],
+    }
+
+    total_score = 0.0
+    for operation, expected_index, recognized_index, score in steps:
+        entry = {
+            "op": operation,
+            "expected": expected_words[expected_index] if expected_index is not None else None,
+            "recognized": recognized_words[recognized_index] if recognized_index is not None else None,
+            "expected_index": expected_index,
+            "recognized_index": recognized_index,
+            "score": round(score, 3),
+        }
+        result["words"].append(entry)
+        groups[operation].append(entry)
+        if expected_index is not None:
+            total_score += score
+
+    if expected_words:
+        result["score"] = round(total_score / len(expected_words), 3)
+    return result
+
+
+def missed_words(result: dict) -> List[str]:
+    """
+    Expected words that were skipped or mispronounced, in reading order.
+
+    Args:
+        result (dict): Result of align_words
+
+    Returns:
+        List[str]: The expected words marked as missing or substituted
+    """
+    return [entry["expected"] for entry in result["words"]
+            if entry["op"] in (OP_MISSING, OP_SUBSTITUTION)]
+
+
+def benchmark_alignment(word_count: int = 400, repeats: int = 5, seed: int = 7) -> float:
+    """
+    Benchmark align_words on a long synthetic passage with dropped, inserted
+    and misspelled words.
+
+    Args:
+        word_count (int): Number of words in the expected passage
+        repeats (int): How many alignments to time
+        seed (int): Random seed for the generated passage
+
+    Returns:
+        float: Mean seconds per alignment
+    """
+    vocabulary = ["مرحبا", "اسمي", "محمد", "ذهبت", "إلى", "المقهى", "القريب", "من", "منزلي",
+                  "في", "الصباح", "الباكر", "وشربت", "القهوة", "مع", "صديقي", "الجديد"]
+    rng = random.Random(seed)
+    expected = [rng.choice(vocabulary) for _ in range(word_count)]
+
+    recognized = []
+    for word in expected:
+        roll = rng.random()
+        if roll < 0.05:
+            continue                                  # dropped word
+        if roll < 0.10:
+            recognized.append(word[:-1] or word)      # mispronounced word
+        else:
+            recognized.append(word)
+        if rng.random() < 0.03:
+            recognized.append(rng.choice(vocabulary)) # inserted word
+
+    expected_text, recognized_text = " ".join(expected), " ".join(recognized)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        align_words(expected_text, recognized_text)
+    elapsed = (time.perf_counter() - start) / repeats
+
+    print(f"⏱️ align_words: {word_count} words x {len(recognized)} recognized -> {elapsed * 1000:.1f} ms per alignment")
+    return elapsed
+
+
+if __name__ == "__main__":
+    for count in (50, 200, 800):
+        benchmark_alignment(word_count=count)
@@ -0,0 +1,453 @@
+"""
+Shared Lexicon - Memory-Mapped Word Index Shared by All Worker Processes
+
+Word analyses (meaning, root, stem, singular, plural) and the audio cache
+hashes of each word live in one read-only index file. Every worker maps the
+file instead of loading its own copy: the pages sit once in the OS page
+cache, workers start with it warm, and a worker's own memory does not grow
+with the lexicon.
+
+The file is written by one writer only (the build command below) and
+replaced atomically (write a temporary file, then rename). Readers notice the
+new file within RELOAD_CHECK_S and map it; lookups in flight keep the old
+mapping until they finish.
+
+File layout (little endian):
+    header   magic, version, slot count, entry count
+    slots    open-addressing hash table (linear probing), one fixed-size slot
+             per entry: 64-bit key hash, key offset and length, value offset and length
+    data     UTF-8 keys (normalize_word form) and JSON values
+
+Each hash slot holds every spelling that normalizes alike (normalize_word),
+so any spelling of a word is found with one probe. Analyses are only served
+for the exact spelling they were recorded under, letters and harakat
+included: على ("on") and علي (Ali), or عِلْم and عَلَّمَ, are different
+words, and one must never answer for the other.
+
+lookup() returns a memoryview into the mapping, so nothing is copied until the
+caller decodes the value.
+
+The server records analyses it had to ask Gemini for (record(), kept in the
+shared state backend); the build command merges them into the next file.
+
+Usage (from the server folder):
+    python -m services.NLP.lexicon build                      # merge recorded analyses and audio hashes
+    python -m services.NLP.lexicon build --jsonl words.jsonl  # also import {"word", "analysis"} lines
+    python -m services.NLP.lexicon benchmark                  # memory and latency by lexicon size
+
+Example usage:
+    from services.NLP.lexicon import lexicon
+
+    entry = lexicon.get("المدرسةُ")    # {"word", "analysis": {...}, "audio": {voice: hash}} or None
+    lexicon.forms("علم")               # every recorded spelling: عِلْم, عَلَّمَ, علم...
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.metrics import metrics
+from services.NLP.normalize import normalize_speech_key, normalize_word, strip_diacritics
+
+DEFAULT_LEXICON_PATH = os.environ.get("LEXICON_PATH", str(Path(__file__).parent / "lexicon_data" / "lexicon.idx"))
+
+# Seconds between checks for a rebuilt file
+RELOAD_CHECK_S = 2.0
+
+# State backend namespace of the analyses recorded by the server
+LEXICON_NAMESPACE = "lexicon"
+
+_MAGIC = b"ALEX"
+_VERSION = 2
+_HEADER = struct.Struct("<4sIII")        # magic, version, slot count, entry count
+_SLOT = struct.Struct("<QIIII")          # key hash, key offset, key length, value offset, value length
+
+
+# Harakat (tanwin to sukun, hamza marks) and superscript alef
+_MARKS = frozenset([chr(c) for c in range(0x064B, 0x0660)] + ["ٰ"])
+
+
+def spelling(word: str) -> str:
+    """
+    The exact written form a lexicon entry belongs to: letters as written
+    (hamza seats, ta marbuta, alef maqsura kept) with their harakat, in a
+    fixed order per letter. Tatweel, invisible marks and attached punctuation
+    are dropped.
+
+    Args:
+        word (str): The word in any form
+
+    Returns:
+        str: Its spelling (empty if the word has no letters)
+    """
+    letters: List[str] = []
+    for c in normalize_speech_key(word.strip()):
+        if c in _MARKS:
+            if letters:
+                letters[-1] += c
+        elif c.isalpha() and strip_diacritics(c):
+            letters.append(c)
+    return "".join(letter[0] + "".join(sorted(letter[1:])) for letter in letters)
+
+
+def _hash(key: bytes) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def build_lexicon(entries: Dict[str, dict], path: str = DEFAULT_LEXICON_PATH) -> int:
+    """
+    Write a lexicon file and atomically replace the current one.
+
+    Args:
+        entries (dict): Word -> JSON-serializable entry ({"word", "analysis", "audio"}).
+            Words with the same spelling are one entry (the last wins); words that
+            only normalize alike share a slot but keep their own entries.
+        path (str): Lexicon file
+
+    Returns:
+        int: Number of entries (spellings) written
+    """
+    forms: Dict[str, Dict[str, dict]] = {}
+    for word, entry in entries.items():
+        key, written = normalize_word(word), spelling(word)
+        if key and written:
+            forms.setdefault(key, {})[written] = {**entry, "word": written}
+    records: Dict[bytes, bytes] = {
+        key.encode("utf-8"): json.dumps({"forms": list(spellings.values())}, ensure_ascii=False,
+                                        separators=(",", ":")).encode("utf-8")
+        for key, spellings in forms.items()
+    }
+    count = sum(len(spellings) for spellings in forms.values())
+
+    # Load factor at most 1/2 keeps probe sequences short
+    slot_count = 1
+    while slot_count < 2 * len(records):
+        slot_count *= 2
+    data_offset = _HEADER.size + slot_count * _SLOT.size
+
+    slots = bytearray(slot_count * _SLOT.size)
+    data = bytearray()
+    for key, value in records.items():
+        key_hash = _hash(key)
+        index = key_hash & (slot_count - 1)
+        while struct.unpack_from("<I", slots, index * _SLOT.size + 12)[0]:   # taken: key length > 0
+            index = (index + 1) & (slot_count - 1)
+        key_offset = data_offset + len(data)
+        data += key
+        value_offset = data_offset + len(data)
+        data += value
+        _SLOT.pack_into(slots, index * _SLOT.size, key_hash, key_offset, len(key), value_offset, len(value))
+
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, slot_count, count))
+            f.write(slots)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return count
+
+
+class _Mapping:
+    """One mapped version of the lexicon file"""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self.identity = os.fstat(f.fileno())
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        magic, version, self.slot_count, self.entries = _HEADER.unpack_from(self.map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a lexicon file (version {_VERSION})")
+
+    def lookup(self, key: bytes) -> Optional[memoryview]:
+        if not self.slot_count:
+            return None
+        key_hash = _hash(key)
+        mask = self.slot_count - 1
+        index = key_hash & mask
+        while True:
+            slot_hash, key_offset, key_length, value_offset, value_length = _SLOT.unpack_from(
+                self.map, _HEADER.size + index * _SLOT.size)
+            if not key_length:
+                return None
+            if slot_hash == key_hash and self.view[key_offset:key_offset + key_length] == key:
+                return self.view[value_offset:value_offset + value_length]
+            index = (index + 1) & mask
+
+    def keys(self) -> Iterable[str]:
+        for index in range(self.slot_count):
+            _, key_offset, key_length, _, _ = _SLOT.unpack_from(self.map, _HEADER.size + index * _SLOT.size)
+            if key_length:
+                yield bytes(self.view[key_offset:key_offset + key_length]).decode("utf-8")
+
+
+class SharedLexicon:
+    """
+    Read-only view of the lexicon file. Thread safe; a missing file is an empty lexicon.
+    """
+
+    def __init__(self, path: str = DEFAULT_LEXICON_PATH, reload_check_s: float = RELOAD_CHECK_S):
+        self.path = Path(path)
+        self.reload_check_s = reload_check_s
+        self._lock = threading.Lock()
+        self._mapping: Optional[_Mapping] = None
+        self._checked = float("-inf")
+
+    def _current(self) -> Optional[_Mapping]:
+        now = time.monotonic()
+        if now - self._checked < self.reload_check_s:
+            return self._mapping
+        with self._lock:
+            if now - self._checked < self.reload_check_s:
+                return self._mapping
+            self._checked = now
+            try:
+                identity = os.stat(self.path)
+            except FileNotFoundError:
+                self._mapping = None
+                return None
+            mapping = self._mapping
+            if mapping is None or (identity.st_ino, identity.st_mtime_ns) != \
+                    (mapping.identity.st_ino, mapping.identity.st_mtime_ns):
+                # The old mapping is released once no lookup holds a view into it
+                try:
+                    self._mapping = _Mapping(self.path)
+                except ValueError as e:
+                    # E.g. a file of an older format: served as empty until the next build
+                    print(f"⚠️ Lexicon not loaded: {e}")
+                    self._mapping = None
+                    return None
+                metrics.increment("lexicon_reloads")
+                metrics.set_gauge("lexicon_entries", self._mapping.entries)
+            return self._mapping
+
+    def lookup(self, word: str) -> Optional[memoryview]:
+        """
+        Zero-copy lookup.
+
+        Args:
+            word (str): Word in any spelling (normalized here)
+
+        Returns:
+            memoryview: UTF-8 JSON of every spelling normalizing like the word
+                ({"forms": [entry, ...]}) inside the mapping, or None if unknown
+        """
+        mapping = self._current()
+        key = normalize_word(word)
+        value = mapping.lookup(key.encode("utf-8")) if mapping is not None and key else None
+        metrics.increment("lexicon_hits" if value is not None else "lexicon_misses")
+        return value
+
+    def forms(self, word: str) -> List[dict]:
+        """
+        Entries of every spelling that normalizes like the word.
+
+        Returns:
+            list: [{"word", "analysis", "audio"}] (fields other than "word" may be missing)
+        """
+        value = self.lookup(word)
+        return json.loads(bytes(value))["forms"] if value is not None else []
+
+    def get(self, word: str) -> Optional[dict]:
+        """
+        Entry of exactly this spelling (see spelling()).
+
+        Returns:
+            dict: {"word", "analysis", "audio"} (fields other than "word" may be missing), or None if unknown
+        """
+        written = spelling(word)
+        return next((entry for entry in self.forms(word) if entry["word"] == written), None)
+
+    def __len__(self) -> int:
+        mapping = self._current()
+        return mapping.entries if mapping is not None else 0
+
+    def items(self) -> Iterable[Tuple[str, dict]]:
+        """All (spelling, entry) pairs of the current file"""
+        mapping = self._current()
+        if mapping is None:
+            return
+        for key in mapping.keys():
+            for entry in json.loads(bytes(mapping.lookup(key.encode("utf-8"))))["forms"]:
+                yield entry["word"], entry
+
+    def record(self, analyses: Dict[str, dict]) -> None:
+        """
+        Keep analyses obtained elsewhere (e.g. from Gemini) for the next build.
+        Stored in the shared state backend, so any worker can record. Blocking
+        (SQLite); call it through asyncio.to_thread from coroutines.
+
+        Args:
+            analyses (dict): Word as asked -> explain_word result
+        """
+        from services.state import state
+
+        entries = {}
+        for word, analysis in analyses.items():
+            written = spelling(word)
+            if written:
+                entries[written] = {"word": written, "analysis": analysis}
+        if entries:
+            state.set_many(LEXICON_NAMESPACE, entries)
+
+
+# Shared lexicon
+lexicon = SharedLexicon()
+
+
+def _audio_index(words: Iterable[str]) -> Dict[str, Dict[str, str]]:
+    # Hashes of the single-word clips already in the audio cache, per voice
+    from services.TTS.cache import audio_cache
+    from services.TTS.edge_tts_service import DEFAULT_RATE, VOICE_ARABIC_FEMALE, VOICE_ARABIC_MALE
+
+    index: Dict[str, Dict[str, str]] = {}
+    for word in words:
+        for voice in (VOICE_ARABIC_FEMALE, VOICE_ARABIC_MALE):
+            key = audio_cache.key("edge", word, voice=voice, rate=DEFAULT_RATE)
+            if audio_cache.contains(key):
+                index.setdefault(word, {})[voice] = key
+    return index
+
+
+def rebuild(jsonl_paths: List[str] = (), path: str = DEFAULT_LEXICON_PATH) -> int:
+    """
+    Merge the current file, imported JSON lines and the analyses recorded by
+    the server, add audio hashes, and atomically replace the lexicon file.
+
+    Args:
+        jsonl_paths (list): Files of {"word", "analysis"} lines
+        path (str): Lexicon file
+
+    Returns:
+        int: Number of entries written
+    """
+    from services.state import state
+
+    entries: Dict[str, dict] = dict(SharedLexicon(path).items())
+    for jsonl_path in jsonl_paths:
+        with open(jsonl_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries[spelling(entry["word"])] = entry
+    for key, entry in state.items(LEXICON_NAMESPACE):
+        written = spelling(entry.get("word", key))
+        entries[written] = {**entries.get(written, {}), **entry}
+
+    for word, audio in _audio_index(entries).items():
+        entries[word]["audio"] = audio
+    return build_lexicon(entries, path)
+
+
+_MEMORY_SCRIPT = """
+import json, random, sys, time
+def anonymous_kb():
+    with open("/proc/self/smaps_rollup") as f:
+        return sum(int(line.split()[1]) for line in f if line.startswith("Anonymous:"))
+path, mode = sys.argv[1], sys.argv[3]
+with open(sys.argv[2], encoding="utf-8") as f:
+    words = json.load(f)
+from services.NLP.lexicon import SharedLexicon
+before = anonymous_kb()
+if mode == "mmap":
+    table = SharedLexicon(path)
+    lookup = table.lookup
+else:
+    from services.NLP.lexicon import _Mapping
+    from pathlib import Path
+    mapping = _Mapping(Path(path))
+    table = {key: bytes(mapping.lookup(key.encode("utf-8"))) for key in mapping.keys()}
+    from services.NLP.normalize import normalize_word
+    lookup = lambda word: table.get(normalize_word(word))
+start = time.perf_counter()
+for word in words:
+    lookup(word)
+elapsed = time.perf_counter() - start
+print(json.dumps({"rss_kb": anonymous_kb() - before, "lookup_us": elapsed / len(words) * 1e6}))
+"""
+
+
+def benchmark_memory(sizes=(10_000, 100_000, 400_000), lookups: int = 20_000) -> dict:
+    """
+    Build synthetic lexicons of growing size and measure, in a fresh worker
+    process, the private (anonymous) memory added and the lookup latency:
+    mapped file versus a per-worker dict. Linux only. Run from the server folder.
+
+    Args:
+        sizes (tuple): Lexicon sizes
+        lookups (int): Random lookups per measurement
+
+    Returns:
+        dict: {size: {"mmap": {"rss_kb", "lookup_us"}, "dict": {...}}}
+    """
+    import random
+
+    letters = "ابتثجحخدذرزسشصضطظعغفقكلمنهوي"
+    rng = random.Random(7)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            words = set()
+            while len(words) < size:
+                words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 7))))
+            words = sorted(words)
+            path = os.path.join(directory, f"lexicon-{size}.idx")
+            build_lexicon({word: {"word": word, "analysis": {"meaning": "מילה", "root": word[:3]}}
+                           for word in words}, path)
+            sample = os.path.join(directory, "sample.json")
+            with open(sample, "w", encoding="utf-8") as f:
+                json.dump([rng.choice(words) for _ in range(lookups)], f, ensure_ascii=False)
+
+            results[size] = {}
+            for mode in ("mmap", "dict"):
+                process = subprocess.run([sys.executable, "-c", _MEMORY_SCRIPT, path, sample, mode],
+                                         capture_output=True, text=True, cwd=Path(__file__).resolve().parents[2])
+                if process.returncode != 0:
+                    raise RuntimeError(f"Measurement failed: {process.stderr.strip()[-500:]}")
+                results[size][mode] = json.loads(process.stdout.strip().splitlines()[-1])
+            print(f"⏱️ {size:>7} words, {os.path.getsize(path) / 1024 / 1024:.1f} MB file: "
+                  f"mmap +{results[size]['mmap']['rss_kb'] / 1024:.1f} MB private, "
+                  f"{results[size]['mmap']['lookup_us']:.2f} µs/lookup | "
+                  f"dict +{results[size]['dict']['rss_kb'] / 1024:.1f} MB private, "
+                  f"{results[size]['dict']['lookup_us']:.2f} µs/lookup")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build or benchmark the shared word lexicon")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Rebuild the lexicon file and swap it in")
+    build.add_argument("--jsonl", nargs="*", default=[], help="Files of {\"word\", \"analysis\"} lines to import")
+    build.add_argument("--path", default=DEFAULT_LEXICON_PATH)
+    commands.add_parser("benchmark", help="Per-worker memory and lookup latency by lexicon size")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = rebuild(args.jsonl, args.path)
+        print(f"✅ Lexicon of {count} words written to {args.path}")
+    else:
+        benchmark_memory()
+
+
+if __name__ == "__main__":
+    main()
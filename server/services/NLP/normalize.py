@@ -0,0 +1,219 @@
+"""
+Arabic text normalization.
+
+A single canonical form for Arabic text, shared by every cache key,
+pronunciation comparison and lexicon lookup in the server. All character
+mappings are compiled once into str.translate tables, so normalizing a
+sentence costs a few microseconds.
+
+Canonical form:
+    - harakat, superscript alef, Quranic marks and tatweel are removed
+    - alef variants (أ إ آ ٱ) become ا, ؤ becomes و and ئ becomes ي
+    - alef maqsura (ى) becomes ي and ta marbuta (ة) becomes ه
+    - Arabic punctuation becomes its ASCII equivalent, Arabic-Indic digits become ASCII digits
+    - runs of whitespace become a single space
+
+Example usage:
+    from services.NLP.normalize import normalize_arabic, normalize_key, normalize_word
+
+    normalize_arabic("مَرْحَبًا، اسمي مُحَمَّد")   # "مرحبا, اسمي محمد"
+    normalize_key("مَرْحَبًا، اسمي مُحَمَّد")      # "مرحبا اسمي محمد"
+    normalize_word("المدرسةُ")                   # "المدرسه"
+
+Text-to-speech cache keys use normalize_speech_key instead, which keeps
+harakat and letter forms since they change the pronunciation.
+"""
+
+import re
+from functools import lru_cache
+from typing import List
+
+# Diacritics and decorations that carry no lexical information
+_HARAKAT = [chr(c) for c in range(0x064B, 0x0660)]   # fathatan .. wavy hamza below
+_QURANIC_MARKS = [chr(c) for c in range(0x0610, 0x061B)] + [chr(c) for c in range(0x06D6, 0x06EE)]
+_SUPERSCRIPT_ALEF = "ٰ"
+_TATWEEL = "ـ"
+
+_LETTER_MAP = {
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ؤ": "و", "ئ": "ي",
+    "ى": "ي",
+    "ة": "ه",
+}
+
+_PUNCTUATION_MAP = {
+    "،": ",", "؛": ";", "؟": "?", "٪": "%", "۔": ".",
+    "«": '"', "»": '"', "“": '"', "”": '"', "‘": "'", "’": "'",
+}
+
+_DIGIT_MAP = {chr(0x0660 + d): str(d) for d in range(10)}
+_DIGIT_MAP.update({chr(0x06F0 + d): str(d) for d in range(10)})
+
+# Invisible direction marks and joiners that sneak in from copy/paste and LLM output
+_INVISIBLE = ["‌", "‍", "‎", "‏", "؜", "﻿"]
+
+_REMOVED = _HARAKAT + _QURANIC_MARKS + [_SUPERSCRIPT_ALEF, _TATWEEL] + _INVISIBLE
+
+# Canonical text: keep punctuation, map it to ASCII
+_ARABIC_TABLE = str.maketrans({
+    **{c: None for c in _REMOVED},
+    **_LETTER_MAP,
+    **_PUNCTUATION_MAP,
+    **_DIGIT_MAP,
+})
+
+# Comparison / cache keys: punctuation is dropped entirely
+_KEY_PUNCTUATION = ",.;:?!%\"'()[]{}<>-_/\\|*&^$#@~`+=" + "".join(_PUNCTUATION_MAP)
+_KEY_TABLE = str.maketrans({
+    **{c: None for c in _REMOVED},
+    **_LETTER_MAP,
+    **_DIGIT_MAP,
+    **{c: " " for c in _KEY_PUNCTUATION},
+})
+
+# Speech cache keys: harakat change pronunciation, so only invisible marks,
+# tatweel, digits and punctuation style are unified
+_SPEECH_TABLE = str.maketrans({
+    **{c: None for c in [_TATWEEL] + _INVISIBLE},
+    **_PUNCTUATION_MAP,
+    **_DIGIT_MAP,
+})
+
+# Display forms: harakat and decorations go, letters stay as written
+_STRIP_TABLE = str.maketrans({c: None for c in _REMOVED})
+
+# Any character the tables would touch; used for the already-normalized fast path
+_ARABIC_DIRTY = re.compile("[" + re.escape("".join(chr(c) for c in _ARABIC_TABLE)) + r"]|\s\s|[^\S ]")
+_KEY_DIRTY = re.compile("[" + re.escape("".join(chr(c) for c in _KEY_TABLE)) + r"]|\s\s|[^\S ]")
+
+
+def _collapse_whitespace(text: str) -> str:
+    return " ".join(text.split())
+
+
+def normalize_arabic(text: str) -> str:
+    """
+    Convert Arabic text to its canonical form, keeping (ASCII) punctuation.
+
+    Args:
+        text (str): The text to normalize
+
+    Returns:
+        str: The canonical text
+    """
+    if not text:
+        return ""
+    # Fast path: nothing to translate and whitespace already single spaces
+    if not _ARABIC_DIRTY.search(text) and text[0] != " " and text[-1] != " ":
+        return text
+    return _collapse_whitespace(text.translate(_ARABIC_TABLE))
+
+
+@lru_cache(maxsize=65536)
+def normalize_key(text: str) -> str:
+    """
+    Convert text to the punctuation-free canonical form used for cache keys
+    and comparisons. Results are memoized since the same keys repeat constantly.
+
+    Args:
+        text (str): The text to normalize
+
+    Returns:
+        str: The normalized key
+    """
+    if not text:
+        return ""
+    if not _KEY_DIRTY.search(text) and text[0] != " " and text[-1] != " ":
+        return text
+    return _collapse_whitespace(text.translate(_KEY_TABLE))
+
+
+@lru_cache(maxsize=65536)
+def normalize_speech_key(text: str) -> str:
+    """
+    Canonical form for text-to-speech cache keys. Unlike normalize_key it
+    keeps letters and harakat untouched, since they change what is spoken.
+
+    Args:
+        text (str): The text to normalize
+
+    Returns:
+        str: The normalized key
+    """
+    if not text:
+        return ""
+    return _collapse_whitespace(text.translate(_SPEECH_TABLE))
+
+
+def strip_diacritics(text: str) -> str:
+    """
+    Remove harakat, Quranic marks, tatweel and invisible marks, keeping the
+    letters as written (unlike normalize_arabic, hamza seats and ta marbuta stay).
+    Arabic words keep a one-to-one character mapping with normalize_word.
+
+    Args:
+        text (str): The text to strip
+
+    Returns:
+        str: The text without diacritics
+    """
+    return text.translate(_STRIP_TABLE) if text else ""
+
+
+def normalize_word(word: str) -> str:
+    """
+    Normalize a single word for comparison or lexicon lookup.
+    Punctuation attached to the word is removed.
+
+    Args:
+        word (str): The word to normalize
+
+    Returns:
+        str: The normalized word (empty if the word was only punctuation)
+    """
+    return normalize_key(word).replace(" ", "")
+
+
+def tokenize_normalized(text: str) -> List[str]:
+    """
+    Split text into normalized words.
+
+    Args:
+        text (str): The text to tokenize
+
+    Returns:
+        List[str]: Normalized, non-empty words in reading order
+    """
+    key = normalize_key(text)
+    return key.split() if key else []
+
+
+def benchmark_normalization(repeats: int = 100000) -> float:
+    """
+    Measure the per-call cost of normalize_arabic on a typical sentence,
+    with and without the already-normalized fast path.
+
+    Args:
+        repeats (int): Number of calls to time
+
+    Returns:
+        float: Mean microseconds per call on the non-normalized sentence
+    """
+    import time
+
+    sentence = "وَذَهَبْتُ إِلَى المَقْهَى القَرِيبِ مِنْ مَنْزِلِي، وَشَرِبْتُ القَهْوَةَ."
+    normalized = normalize_arabic(sentence)
+
+    for label, text in (("raw", sentence), ("normalized", normalized)):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            normalize_arabic(text)
+        elapsed = (time.perf_counter() - start) / repeats * 1e6
+        print(f"⏱️ normalize_arabic ({label}): {elapsed:.2f} µs per call")
+        if label == "raw":
+            result = elapsed
+    return result
+
+
+if __name__ == "__main__":
+    benchmark_normalization()
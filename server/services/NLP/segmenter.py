@@ -0,0 +1,71 @@
+"""
+Sentence segmentation for mixed Arabic / Hebrew / English text.
+
+Splits on sentence-final punctuation of all three scripts (. ! ? ؟ ۔ …) and
+on line breaks, without breaking decimal numbers or closing quotes apart. Very long
+sentences are further split on commas (, ،) so no piece gets too long for
+a single synthesis job; tiny fragments are merged into their neighbour.
+
+Example usage:
+    from services.NLP.segmenter import split_sentences
+
+    split_sentences("مرحبا! كيف حالك؟ שלום, מה שלומך?")
+    # ['مرحبا!', 'كيف حالك؟', 'שלום, מה שלומך?']
+"""
+
+import re
+from typing import List
+
+# Sentence ends: terminal punctuation (optionally inside closing quotes) followed by whitespace, or a line break.
+# Decimal numbers are safe since their dot is not followed by whitespace.
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?؟۔…])|(?<=[.!?؟۔…][\"'»”)\]]))\s+|\n+")
+_CLAUSE_END = re.compile(r"(?<=[,،;؛:])\s+")
+
+# Pieces longer than this are split on commas
+MAX_SENTENCE_CHARS = 220
+
+# Pieces shorter than this are merged into the previous one
+MIN_SENTENCE_CHARS = 3
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    if len(sentence) <= max_chars:
+        return [sentence]
+
+    pieces, current = [], ""
+    for clause in _CLAUSE_END.split(sentence):
+        if current and len(current) + 1 + len(clause) > max_chars:
+            pieces.append(current)
+            current = clause
+        else:
+            current = f"{current} {clause}" if current else clause
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sentences(text: str, max_chars: int = MAX_SENTENCE_CHARS) -> List[str]:
+    """
+    Split text into sentences for pipelined processing.
+
+    Args:
+        text (str): Text in Arabic, Hebrew, English or a mix
+        max_chars (int): Sentences longer than this are split on commas
+
+    Returns:
+        List[str]: Non-empty sentences in order, with their punctuation
+    """
+    if not text or not text.strip():
+        return []
+
+    sentences: List[str] = []
+    for raw in _SENTENCE_END.split(text.strip()):
+        raw = " ".join(raw.split())
+        if not raw:
+            continue
+        for piece in _split_long(raw, max_chars):
+            if sentences and len(piece) < MIN_SENTENCE_CHARS:
+                sentences[-1] = f"{sentences[-1]} {piece}"
+            else:
+                sentences.append(piece)
+    return sentences
@@ -0,0 +1 @@
+# Speech-to-text: uploaded audio decoding and recognition
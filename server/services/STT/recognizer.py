@@ -0,0 +1,321 @@
+"""
+Speech recognition for uploaded audio.
+
+Audio uploaded by the browser (WAV, WebM or MP3) is decoded in memory to
+16-bit mono PCM and handed to a pluggable recognizer running in a worker
+pool, so the event loop is never blocked and the server's own audio
+hardware is never touched.
+
+Recognizers are registered by name:
+    - "google": Google Web Speech API through the SpeechRecognition package (default)
+    - "whisper": local Whisper models (services/TTS/speech_to_text.py)
+    - "stub": local stand-in that returns a fixed transcript, for tests and benchmarks
+
+The recognizer used by default can be chosen with the STT_RECOGNIZER
+environment variable.
+
+Bad uploads raise ValueError; an unknown or unavailable recognizer, or a
+failing recognition service, raises RecognizerError, so callers can tell the
+learner's problem from the server's.
+
+Example usage:
+    from services.STT.recognizer import score_pronunciation_async
+
+    result = await score_pronunciation_async("مرحبا اسمي محمد", audio_bytes)
+    result["transcript"]      # "مرحبا اسمي محمد"
+    result["missing_words"]   # []
+"""
+
+import asyncio
+import io
+import os
+import subprocess
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from services.NLP.alignment import align_words, missed_words
+
+# Format every clip is decoded to before recognition
+TARGET_SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+DEFAULT_LANGUAGE = "ar"
+DEFAULT_RECOGNIZER = os.environ.get("STT_RECOGNIZER", "google")
+
+# Recognition is network/CPU bound work; keep it off the event loop
+STT_WORKERS = int(os.environ.get("STT_WORKERS", "8"))
+_executor = ThreadPoolExecutor(max_workers=STT_WORKERS, thread_name_prefix="stt")
+
+
+class RecognizerError(RuntimeError):
+    """The recognizer is unknown, cannot be started, or failed on a clip"""
+
+
+class AudioClip:
+    """
+    Decoded mono 16-bit PCM audio.
+    """
+
+    def __init__(self, pcm: bytes, sample_rate: int = TARGET_SAMPLE_RATE):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.sample_width = SAMPLE_WIDTH
+
+    @property
+    def duration(self) -> float:
+        """Length of the clip in seconds"""
+        return len(self.pcm) / (self.sample_rate * self.sample_width)
+
+
+def _decode_wav(data: bytes) -> Optional[AudioClip]:
+    """Decode 16-bit PCM WAV with the standard library, None if not a plain PCM WAV"""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            if wav.getsampwidth() != SAMPLE_WIDTH or wav.getcomptype() != "NONE":
+                return None
+            channels = wav.getnchannels()
+            sample_rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+    if channels > 1:
+        # Keep the first channel only
+        frame_size = SAMPLE_WIDTH * channels
+        frames = b"".join(frames[i:i + SAMPLE_WIDTH] for i in range(0, len(frames), frame_size))
+    return AudioClip(frames, sample_rate)
+
+
+def _decode_with_ffmpeg(data: bytes) -> AudioClip:
+    """Decode any container ffmpeg understands (WebM/Opus, MP3, OGG...) through pipes"""
+    try:
+        process = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "s16le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "pipe:1"],
+            input=data, capture_output=True, check=True, timeout=60,
+        )
+    except FileNotFoundError:
+        raise ValueError("ffmpeg is required to decode compressed audio uploads")
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"Could not decode audio: {e.stderr.decode(errors='ignore').strip()}")
+    return AudioClip(process.stdout, TARGET_SAMPLE_RATE)
+
+
+def decode_audio(data: bytes) -> AudioClip:
+    """
+    Decode uploaded audio in memory.
+
+    Args:
+        data (bytes): Raw file contents (WAV, WebM, MP3...)
+
+    Returns:
+        AudioClip: Mono 16-bit PCM audio
+
+    Raises:
+        ValueError: If the upload is empty or cannot be decoded
+    """
+    if not data:
+        raise ValueError("Audio upload is empty")
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        clip = _decode_wav(data)
+        if clip is not None:
+            return clip
+    return _decode_with_ffmpeg(data)
+
+
+class Recognizer:
+    """
+    Base class for speech recognizers. Implementations must be thread safe,
+    since a single instance is shared by the whole worker pool.
+    """
+
+    name = "base"
+
+    def recognize(self, clip: AudioClip, language: str = DEFAULT_LANGUAGE) -> str:
+        """
+        Recognize the speech in a clip.
+
+        Args:
+            clip (AudioClip): Decoded audio
+            language (str): Language code of the speech
+
+        Returns:
+            str: The recognized text (empty if nothing was understood)
+        """
+        raise NotImplementedError
+
+
+class GoogleRecognizer(Recognizer):
+    """
+    Google Web Speech API via the SpeechRecognition package, fed from memory.
+    """
+
+    name = "google"
+
+    def __init__(self):
+        import speech_recognition as sr
+        self._sr = sr
+
+    def recognize(self, clip: AudioClip, language: str = DEFAULT_LANGUAGE) -> str:
+        sr = self._sr
+        audio = sr.AudioData(clip.pcm, clip.sample_rate, clip.sample_width)
+        try:
+            return sr.Recognizer().recognize_google(audio, language=language)
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise RecognizerError(f"Speech recognition service error: {e}")
+
+
+class StubRecognizer(Recognizer):
+    """
+    Local stand-in recognizer that always returns the same transcript.
+    Used by tests and benchmarks so they don't need audio models or network.
+    """
+
+    name = "stub"
+
+    def __init__(self, transcript: Optional[str] = None):
+        if transcript is None:
+            transcript = os.environ.get("STT_STUB_TRANSCRIPT", "")
+        self.transcript = transcript
+
+    def recognize(self, clip: AudioClip, language: str = DEFAULT_LANGUAGE) -> str:
+        return self.transcript
+
+
+def _whisper_recognizer() -> Recognizer:
+    # Imported lazily: the engine pulls in transformers and imports this module
+    from services.TTS.speech_to_text import WhisperRecognizer
+    return WhisperRecognizer()
+
+
+_RECOGNIZER_FACTORIES: Dict[str, Callable[[], Recognizer]] = {
+    GoogleRecognizer.name: GoogleRecognizer,
+    StubRecognizer.name: StubRecognizer,
+    "whisper": _whisper_recognizer,
+}
+_recognizers: Dict[str, Recognizer] = {}
+
+
+def register_recognizer(name: str, factory: Callable[[], Recognizer]) -> None:
+    """
+    Register (or replace) a recognizer factory under a name.
+
+    Args:
+        name (str): Name used to select the recognizer
+        factory (Callable[[], Recognizer]): Builds the recognizer on first use
+    """
+    _RECOGNIZER_FACTORIES[name] = factory
+    _recognizers.pop(name, None)
+
+
+def get_recognizer(name: Optional[str] = None) -> Recognizer:
+    """
+    Get a recognizer instance by name, creating it on first use.
+
+    Args:
+        name (str, optional): Registered recognizer name. Defaults to STT_RECOGNIZER.
+
+    Returns:
+        Recognizer: The shared recognizer instance
+
+    Raises:
+        RecognizerError: If no recognizer is registered under that name or it cannot be started
+    """
+    name = name or DEFAULT_RECOGNIZER
+    recognizer = _recognizers.get(name)
+    if recognizer is None:
+        if name not in _RECOGNIZER_FACTORIES:
+            raise RecognizerError(f"Unknown recognizer. Available: {list(_RECOGNIZER_FACTORIES.keys())}")
+        try:
+            recognizer = _recognizers.setdefault(name, _RECOGNIZER_FACTORIES[name]())
+        except Exception as e:
+            raise RecognizerError(f"Recognizer {name!r} unavailable: {type(e).__name__}: {e}") from e
+    return recognizer
+
+
+def _recognize(recognizer: Recognizer, clip: AudioClip, language: str) -> str:
+    try:
+        return recognizer.recognize(clip, language)
+    except RecognizerError:
+        raise
+    except Exception as e:
+        raise RecognizerError(f"Recognizer {recognizer.name!r} failed: {type(e).__name__}: {e}") from e
+
+
+def pronunciation_feedback(expected_text: str, transcript: str) -> dict:
+    """
+    Align a transcript against the expected text.
+
+    Args:
+        expected_text (str): The passage the learner was asked to read
+        transcript (str): The recognized speech
+
+    Returns:
+        dict: {"transcript", "missing_words", "score", "alignment"}
+    """
+    alignment = align_words(expected_text, transcript)
+    return {
+        "transcript": transcript,
+        "missing_words": missed_words(alignment),
+        "score": alignment["score"],
+        "alignment": alignment["words"],
+    }
+
+
+async def recognize_clip_async(clip: AudioClip, recognizer_name: Optional[str] = None,
+                               language: str = DEFAULT_LANGUAGE) -> str:
+    """
+    Recognize an already decoded clip in the STT worker pool.
+
+    Args:
+        clip (AudioClip): Decoded audio
+        recognizer_name (str, optional): Registered recognizer to use
+        language (str): Language code of the speech
+
+    Returns:
+        str: The recognized text
+
+    Raises:
+        RecognizerError: If the recognizer is unavailable or fails
+    """
+    recognizer = get_recognizer(recognizer_name)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _recognize, recognizer, clip, language)
+
+
+def score_pronunciation(expected_text: str, audio_data: bytes, recognizer_name: Optional[str] = None,
+                        language: str = DEFAULT_LANGUAGE) -> dict:
+    """
+    Decode an upload, recognize it and align it against the expected text.
+    Blocking; use score_pronunciation_async from request handlers.
+
+    Args:
+        expected_text (str): The passage the learner was asked to read
+        audio_data (bytes): Uploaded audio file contents
+        recognizer_name (str, optional): Registered recognizer to use
+        language (str): Language code of the speech
+
+    Returns:
+        dict: {"transcript", "missing_words", "score", "alignment"}
+
+    Raises:
+        ValueError: If the audio is empty or cannot be decoded
+        RecognizerError: If the recognizer is unavailable or fails
+    """
+    clip = decode_audio(audio_data)
+    transcript = _recognize(get_recognizer(recognizer_name), clip, language)
+    return pronunciation_feedback(expected_text, transcript)
+
+
+async def score_pronunciation_async(expected_text: str, audio_data: bytes, recognizer_name: Optional[str] = None,
+                                    language: str = DEFAULT_LANGUAGE) -> dict:
+    """
+    Same as score_pronunciation, but runs in the STT worker pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, score_pronunciation, expected_text, audio_data,
+                                      recognizer_name, language)
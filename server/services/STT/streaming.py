@@ -0,0 +1,254 @@
+"""
+Streaming speech recognition with partial feedback.
+
+Audio frames arrive while the learner is still speaking. A lightweight
+energy-based voice activity detector (VAD) cuts them into utterances; every
+completed utterance is recognized in the STT worker pool and the cumulative
+transcript is aligned against the expected text, so feedback is pushed back
+while the learner continues reading.
+
+Wire protocol (WebSocket, see /stt/stream in server.py):
+    client -> {"text": "<expected passage>", "sample_rate": 16000}   (first message)
+    client -> binary frames of 16-bit little-endian mono PCM
+    client -> {"type": "end"}                                        (flushes and closes)
+
+    server -> {"type": "speech_start"}
+    server -> {"type": "partial", "transcript", "missing_words", "score", "alignment", "latency_ms"}
+    server -> {"type": "final", ...same fields...}
+    server -> {"type": "error", "error", "details"}   (malformed message or recognizer failure; then closes)
+
+A recognizer failure is reported as soon as it happens, through the
+session's on_error callback, not when the client ends the stream.
+
+End-of-speech to feedback latency is recorded in the
+"stt_stream_feedback_latency_ms" metric.
+"""
+
+import asyncio
+import math
+import time
+from array import array
+from typing import Awaitable, Callable, List, Optional
+
+from services.metrics import metrics
+from services.STT.recognizer import (AudioClip, DEFAULT_LANGUAGE, SAMPLE_WIDTH, TARGET_SAMPLE_RATE, RecognizerError,
+                                     pronunciation_feedback, recognize_clip_async)
+
+# VAD defaults
+FRAME_MS = 30
+MIN_SPEECH_RMS = 300.0        # absolute floor, 16-bit sample units
+NOISE_RATIO = 3.0             # speech must be this many times louder than the noise floor
+START_FRAMES = 3              # consecutive voiced frames needed to start an utterance
+HANGOVER_MS = 600             # silence needed to end an utterance
+MAX_UTTERANCE_MS = 15000      # force a cut so very long readings still get feedback
+PRE_ROLL_FRAMES = 5           # frames kept from before speech start so onsets aren't clipped
+
+
+class Utterance:
+    """
+    A completed stretch of speech.
+    """
+
+    def __init__(self, pcm: bytes, sample_rate: int, speech_end: float):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        # perf_counter timestamp of the last voiced frame
+        self.speech_end = speech_end
+
+
+class EnergyVAD:
+    """
+    Frame-energy voice activity detector with an adaptive noise floor.
+
+    Feed it arbitrary-sized PCM chunks; it returns the utterances completed
+    by each chunk.
+    """
+
+    def __init__(self, sample_rate: int = TARGET_SAMPLE_RATE, frame_ms: int = FRAME_MS,
+                 hangover_ms: int = HANGOVER_MS, max_utterance_ms: int = MAX_UTTERANCE_MS):
+        self.sample_rate = sample_rate
+        self.frame_bytes = sample_rate * frame_ms // 1000 * SAMPLE_WIDTH
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.max_frames = max(1, max_utterance_ms // frame_ms)
+        self.noise_floor = MIN_SPEECH_RMS / NOISE_RATIO
+
+        self._pending = b""
+        self._pre_roll: List[bytes] = []
+        self._frames: List[bytes] = []
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        self._last_voiced = 0.0
+        self.speech_started = False
+
+    @staticmethod
+    def frame_rms(frame: bytes) -> float:
+        """Root mean square energy of a 16-bit PCM frame"""
+        samples = array('h', frame)
+        if not samples:
+            return 0.0
+        return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+    def _is_voiced(self, rms: float) -> bool:
+        threshold = max(MIN_SPEECH_RMS, self.noise_floor * NOISE_RATIO)
+        voiced = rms >= threshold
+        if not voiced and not self._in_speech:
+            # Track the background level only while nobody is speaking
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return voiced
+
+    def _cut(self) -> Utterance:
+        utterance = Utterance(b"".join(self._frames), self.sample_rate, self._last_voiced)
+        self._frames = []
+        self._in_speech = False
+        self._voiced_run = 0
+        self._silent_run = 0
+        return utterance
+
+    def feed(self, pcm: bytes) -> List[Utterance]:
+        """
+        Process a chunk of PCM audio.
+
+        Args:
+            pcm (bytes): 16-bit little-endian mono PCM, any length
+
+        Returns:
+            List[Utterance]: Utterances that ended inside this chunk
+        """
+        completed = []
+        data = self._pending + pcm
+        offset = 0
+        self.speech_started = False
+
+        while len(data) - offset >= self.frame_bytes:
+            frame = data[offset:offset + self.frame_bytes]
+            offset += self.frame_bytes
+            voiced = self._is_voiced(self.frame_rms(frame))
+            now = time.perf_counter()
+
+            if not self._in_speech:
+                self._pre_roll.append(frame)
+                if len(self._pre_roll) > PRE_ROLL_FRAMES:
+                    self._pre_roll.pop(0)
+                self._voiced_run = self._voiced_run + 1 if voiced else 0
+                if self._voiced_run >= START_FRAMES:
+                    self._in_speech = True
+                    self.speech_started = True
+                    self._frames = self._pre_roll
+                    self._pre_roll = []
+                    self._last_voiced = now
+                continue
+
+            self._frames.append(frame)
+            if voiced:
+                self._silent_run = 0
+                self._last_voiced = now
+            else:
+                self._silent_run += 1
+
+            if self._silent_run >= self.hangover_frames or len(self._frames) >= self.max_frames:
+                completed.append(self._cut())
+
+        self._pending = data[offset:]
+        return completed
+
+    def flush(self) -> Optional[Utterance]:
+        """
+        End of stream: return the utterance in progress, if any.
+        """
+        if self._in_speech and self._frames:
+            if self._pending:
+                self._frames.append(self._pending)
+            self._pending = b""
+            return self._cut()
+        self._pending = b""
+        return None
+
+
+class StreamingSession:
+    """
+    One learner's streaming recognition session.
+
+    Utterances are recognized in order by a background consumer, so receiving
+    audio never waits for recognition. If recognition fails, on_error is
+    called right away (e.g. to send the error and close the socket) and
+    further audio is ignored.
+    """
+
+    def __init__(self, expected_text: str, send: Callable[[dict], Awaitable[None]],
+                 sample_rate: int = TARGET_SAMPLE_RATE, recognizer_name: Optional[str] = None,
+                 language: str = DEFAULT_LANGUAGE,
+                 on_error: Optional[Callable[[RecognizerError], Awaitable[None]]] = None):
+        self.expected_text = expected_text
+        self.send = send
+        self.recognizer_name = recognizer_name
+        self.language = language
+        self.on_error = on_error
+        self.vad = EnergyVAD(sample_rate=sample_rate)
+        self.transcripts: List[str] = []
+        self.error: Optional[RecognizerError] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._consumer = asyncio.create_task(self._consume())
+        self._consumer.add_done_callback(self._consumer_done)
+        self._error_report: Optional[asyncio.Task] = None
+
+    def _consumer_done(self, consumer: asyncio.Task) -> None:
+        if consumer.cancelled() or not isinstance(consumer.exception(), RecognizerError):
+            return
+        self.error = consumer.exception()
+        if self.on_error is not None:
+            self._error_report = asyncio.create_task(self.on_error(self.error))
+
+    async def feed_audio(self, pcm: bytes) -> None:
+        """Process a binary frame received from the client"""
+        if self.error is not None:
+            return
+        utterances = self.vad.feed(pcm)
+        if self.vad.speech_started:
+            await self.send({"type": "speech_start"})
+        for utterance in utterances:
+            self._queue.put_nowait(utterance)
+
+    async def finish(self) -> None:
+        """
+        Flush the last utterance, wait for all feedback and send the final result.
+
+        Raises:
+            RecognizerError: If recognition failed (already passed to on_error)
+        """
+        utterance = self.vad.flush()
+        if utterance is not None:
+            self._queue.put_nowait(utterance)
+        self._queue.put_nowait(None)
+        try:
+            await self._consumer
+        except RecognizerError:
+            if self._error_report is not None:
+                await self._error_report
+            raise
+
+        feedback = pronunciation_feedback(self.expected_text, self._transcript())
+        await self.send({"type": "final", **feedback})
+
+    def cancel(self) -> None:
+        """Stop recognizing (the client went away)"""
+        self._consumer.cancel()
+
+    def _transcript(self) -> str:
+        return " ".join(t for t in self.transcripts if t)
+
+    async def _consume(self) -> None:
+        while True:
+            utterance = await self._queue.get()
+            if utterance is None:
+                return
+
+            clip = AudioClip(utterance.pcm, utterance.sample_rate)
+            transcript = await recognize_clip_async(clip, self.recognizer_name, self.language)
+            self.transcripts.append(transcript)
+
+            feedback = pronunciation_feedback(self.expected_text, self._transcript())
+            latency_ms = (time.perf_counter() - utterance.speech_end) * 1000
+            metrics.observe("stt_stream_feedback_latency_ms", latency_ms)
+            metrics.increment("stt_stream_utterances")
+            await self.send({"type": "partial", "latency_ms": round(latency_ms, 1), **feedback})
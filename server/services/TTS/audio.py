@@ -3,6 +3,8 @@ import speech_recognition as sr
 import arabic_reshaper
 from bidi.algorithm import get_display
 
+from services.NLP.alignment import align_words, missed_words
+
 
 # pip install pyttsx3
 # pip install SpeechRecognition
@@ -17,12 +19,23 @@ def convert_arabic(text):
 	return bidi_text
 
 
+_engine = None
+
+
+def _get_engine():
+    # pyttsx3.init() is slow; keep one engine for the whole process
+    global _engine
+    if _engine is None:
+        _engine = pyttsx3.init()
+    return _engine
+
+
 def say_message(message):
     """
     מקריא בקול את ההודעה שניתנת כפרמטר
     """
     print("say massage:", message)
-    engine = pyttsx3.init()
+    engine = _get_engine()
     engine.say(message)
     engine.runAndWait()
 
@@ -48,54 +61,15 @@ def listen_and_recognize_arabic(text):
 
 def conversation_with_user(text):
     """
-	מנהל שיחה עם המשתמש, מקשיב לדיבור ומחזיר את הטקסט המוכר
+	מנהל שיחה עם המשתמש, מקשיב לדיבור ומחזיר את המילים שלא נאמרו נכון
 	"""
-    # say_message(convert_arabic(text))
-    list_text = convert_arabic(text.replace(',', '').replace('.', '').replace('،','')).split()
-    list_text.reverse()
-    print(f"list_text: {list_text}")
-    recognized_text = convert_arabic(listen_and_recognize_arabic(text))
-    print(recognized_text)
-    miss_words = []
-    words_list = recognized_text.split()
-    print(f"word list: {words_list}")
-    len_text_list = len(list_text)
-    index1 = 0
-    index2=0
-    print(f"text_list: {list_text}, words_list: {words_list}")
-    words_list.reverse()
-    while index2 < len_text_list:
-        print(f" tour {list_text[index2]}")
-        if words_list[index1] != list_text[index2]:
-             print(f"missed word: {list_text[index2]} the word said was: {words_list[index1]}")
-             miss_words.append(list_text[index2])
-             index2 += 1
-             if index2 > len_text_list:
-                  break
-             if words_list[index1] in list_text:
-                    while words_list[index1] != list_text[index2]:
-                          if index2 > len_text_list:
-                                break
-                          miss_words.append(list_text[index2])
-                          print(f"word in list: missed word: {list_text[index2]} the word said was: {words_list[index1]}")
-                          index2 += 1
-                          
-					
-        index1 += 1
-        index2 += 1
-        if index1 >= len(words_list):
-             i = index2
-             while i < len_text_list:
-                 miss_words.append(list_text[i])
-                 i += 1
-             break
-    
-    if miss_words:
-        final_words = []
-        for w in miss_words:
-             final_words.append(convert_arabic(w))
-        return final_words
-    return []
+    recognized_text = listen_and_recognize_arabic(text)
+    print(convert_arabic(recognized_text))
+
+    alignment = align_words(text, recognized_text)
+    print(f"pronunciation score: {alignment['score']}")
+
+    return missed_words(alignment)
 
 def main():
     """
@@ -0,0 +1,191 @@
+"""
+Audio Cache - Content-Addressed Storage for Synthesized Speech
+
+Every synthesized clip is stored on disk under the SHA-256 hash of the
+request that produced it (backend, voice, options and normalized text), so
+the same sentence is only synthesized once across all users and lessons.
+
+Writes are atomic: audio is streamed into a temporary file and moved into
+place only once it is complete, so a cancelled or failed synthesis never
+leaves a truncated clip behind.
+
+Example usage:
+    from services.TTS.cache import audio_cache
+
+    key = audio_cache.key("edge", "مرحبا", voice="ar-SA-ZariyahNeural")
+    data = audio_cache.get(key)
+    if data is None:
+        data = synthesize(...)
+        audio_cache.put(key, data)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+from services.metrics import metrics
+from services.NLP.normalize import normalize_speech_key
+
+DEFAULT_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", str(Path(__file__).parent / "audio_cache"))
+AUDIO_EXTENSION = ".mp3"
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class CacheWriter:
+    """
+    Incremental writer for one cache entry. Use as a context manager: the
+    entry is committed on a clean exit and discarded if an exception
+    (including cancellation) escapes the block.
+    """
+
+    def __init__(self, cache: "AudioCache", key: str):
+        self.cache = cache
+        self.key = key
+        self.size = 0
+        fd, self._tmp_path = tempfile.mkstemp(dir=cache.directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._done = False
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> Path:
+        """Move the finished audio into place"""
+        self._file.close()
+        self._done = True
+        path = self.cache.path(self.key)
+        if self.size == 0:
+            os.unlink(self._tmp_path)
+            return path
+        os.replace(self._tmp_path, path)
+        self.cache._record_write(self.size)
+        return path
+
+    def abort(self) -> None:
+        """Throw away a partial entry"""
+        if self._done:
+            return
+        self._done = True
+        self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+class AudioCache:
+    """
+    Disk cache of synthesized audio keyed by request hash.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(backend: str, text: str, **options) -> str:
+        """
+        Cache key for a synthesis request.
+
+        Args:
+            backend (str): TTS backend name ("edge", "gtts", "offline"...)
+            text (str): Text to synthesize (normalized with normalize_speech_key)
+            **options: Anything else that changes the audio (voice, language, rate...)
+
+        Returns:
+            str: Hex SHA-256 digest
+        """
+        payload = json.dumps([backend, normalize_speech_key(text), options],
+                             ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> Path:
+        """Location of an entry on disk (whether or not it exists)"""
+        return self.directory / f"{key}{AUDIO_EXTENSION}"
+
+    def contains(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read a whole entry.
+
+        Returns:
+            bytes: The audio, or None on a miss
+        """
+        try:
+            data = self.path(key).read_bytes()
+        except FileNotFoundError:
+            metrics.increment("tts_cache_misses")
+            return None
+        metrics.increment("tts_cache_hits")
+        return data
+
+    def iter_chunks(self, key: str, chunk_size: int = READ_CHUNK_SIZE) -> Optional[Iterator[bytes]]:
+        """
+        Stream an entry in chunks.
+
+        Returns:
+            Iterator[bytes]: Chunk iterator, or None on a miss
+        """
+        try:
+            f = open(self.path(key), "rb")
+        except FileNotFoundError:
+            metrics.increment("tts_cache_misses")
+            return None
+        metrics.increment("tts_cache_hits")
+
+        def chunks():
+            with f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+        return chunks()
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Store a whole entry atomically"""
+        with self.writer(key) as writer:
+            writer.write(data)
+        return self.path(key)
+
+    def put_metadata(self, key: str, metadata: dict) -> None:
+        """Store a JSON sidecar (e.g. a timing index) next to an entry"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.directory / f"{key}.json")
+
+    def get_metadata(self, key: str) -> Optional[dict]:
+        """Read the JSON sidecar of an entry, None if there is none"""
+        try:
+            return json.loads((self.directory / f"{key}.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+
+    def writer(self, key: str) -> CacheWriter:
+        """Start an incremental (tee) write of an entry"""
+        return CacheWriter(self, key)
+
+    def _record_write(self, size: int) -> None:
+        metrics.increment("tts_cache_writes")
+        metrics.increment("tts_cache_bytes_written", size)
+
+
+# Shared cache used by every TTS backend
+audio_cache = AudioCache()
@@ -4,10 +4,26 @@ Microsoft Edge TTS Service - Online Text-to-Speech Conversion
 This module provides functions to convert text to speech using Microsoft's Edge TTS online service.
 It requires an internet connection but offers high-quality voices.
 
+The service is async-native: stream_text_to_speech_online yields MP3 chunks
+as they arrive from the Edge WebSocket, so they can be forwarded straight to
+a StreamingResponse. All requests share a bounded concurrency pool
+(EDGE_TTS_CONCURRENCY) and the bytes are teed into the shared audio cache,
+so repeated texts are served from disk.
+
+Synthesis with word boundaries (lesson sprites) is cached too, the
+boundaries in a JSON sidecar next to the audio.
+
+For tests and offline benchmarks, set EDGE_TTS_WSS_URL to point the
+client at a local stand-in WebSocket server (see tests/edge_standin.py).
+
 Available voices can be found at: https://speech.microsoft.com/portal/voicegallery
 
 Example usage:
-    from edge_tts_service import edge_tts_convert
+    from edge_tts_service import edge_tts_convert, stream_text_to_speech_online
+
+    # Inside FastAPI / any running event loop
+    return StreamingResponse(stream_text_to_speech_online("مرحبا", VOICE_ARABIC_FEMALE),
+                             media_type="audio/mpeg")
     
     # Basic usage with default parameters
     audio_path = edge_tts_convert("Hello, this is a test")
@@ -21,9 +37,14 @@ Example usage:
 """
 
 import asyncio
-from typing import Optional
+import os
+import time
+import weakref
+from typing import AsyncIterator, List, Optional, Tuple
 
-import edge_tts
+from services.cassette import cassette
+from services.metrics import metrics
+from services.TTS.cache import audio_cache
 
 # Configure minimal logging
 import logging
@@ -45,6 +66,184 @@ VOICE_SPANISH_MALE = "es-ES-AlvaroNeural"
 # Default values
 DEFAULT_OUTPUT_PATH = 'output.mp3'
 DEFAULT_VOICE = VOICE_FEMALE_US
+DEFAULT_RATE = "-10%"
+
+# Maximum simultaneous Edge TTS connections per event loop (the server runs one loop per process)
+EDGE_TTS_CONCURRENCY = int(os.environ.get("EDGE_TTS_CONCURRENCY", "8"))
+
+# Optional endpoint override (local stand-in server for tests and benchmarks)
+EDGE_TTS_WSS_URL = os.environ.get("EDGE_TTS_WSS_URL")
+
+
+def _edge_tts():
+    """Import edge_tts on first use, keeping it out of server start-up"""
+    import edge_tts
+
+    if EDGE_TTS_WSS_URL:
+        edge_tts.communicate.WSS_URL = EDGE_TTS_WSS_URL
+    return edge_tts
+
+
+# A semaphore only works on the loop it was first used on: one per loop
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(EDGE_TTS_CONCURRENCY)
+    return semaphore
+
+
+def _stream_messages(text: str, voice: str, rate: str, word_boundaries: bool = False) -> AsyncIterator[dict]:
+    """Audio (and optionally WordBoundary) messages of one Edge TTS synthesis, through the cassette"""
+    async def upstream() -> AsyncIterator[dict]:
+        if word_boundaries:
+            try:
+                communicate = _edge_tts().Communicate(text=text, voice=voice, rate=rate, boundary="WordBoundary")
+            except TypeError:
+                # edge-tts < 7 always emits word boundaries and has no boundary option
+                communicate = _edge_tts().Communicate(text=text, voice=voice, rate=rate)
+        else:
+            communicate = _edge_tts().Communicate(text=text, voice=voice, rate=rate)
+        async for message in communicate.stream():
+            if message["type"] == "audio" or (word_boundaries and message["type"] == "WordBoundary"):
+                yield message
+
+    request = {"text": text, "voice": voice, "rate": rate, "word_boundaries": word_boundaries}
+    return cassette.stream("edge", request, upstream)
+
+
+async def stream_text_to_speech_online(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE,
+                                       use_cache: bool = True) -> AsyncIterator[bytes]:
+    """
+    Stream speech audio from Microsoft Edge TTS as it is synthesized.
+
+    Cached audio is served from disk, read in a worker thread. Otherwise the Communicate stream is
+    iterated and every audio chunk is yielded immediately while also being
+    written to the audio cache; the cache entry is only committed if the
+    whole stream completes.
+
+    Args:
+        text (str): Text to convert to speech
+        voice (str): Voice to use for speech synthesis
+        rate (str): Speaking rate adjustment, e.g. "-10%"
+        use_cache (bool): Whether to read from and write to the audio cache
+
+    Yields:
+        bytes: MP3 audio chunks in order
+    """
+    key = audio_cache.key("edge", text, voice=voice, rate=rate)
+    if use_cache:
+        # Disk reads go to a thread, so a slow disk does not stall the event loop
+        cached = await asyncio.to_thread(audio_cache.iter_chunks, key)
+        if cached is not None:
+            while True:
+                chunk = await asyncio.to_thread(next, cached, None)
+                if chunk is None:
+                    return
+                yield chunk
+
+    start = time.perf_counter()
+    first_chunk = True
+    async with _get_semaphore():
+        metrics.observe("tts_edge_queue_ms", (time.perf_counter() - start) * 1000)
+        writer = audio_cache.writer(key) if use_cache else None
+        try:
+            async for message in _stream_messages(text, voice, rate):
+                if message["type"] != "audio":
+                    continue
+                if first_chunk:
+                    metrics.observe("tts_edge_first_byte_ms", (time.perf_counter() - start) * 1000)
+                    first_chunk = False
+                if writer is not None:
+                    writer.write(message["data"])
+                yield message["data"]
+        except BaseException:
+            # Failure, cancellation or client disconnect: never cache a partial clip
+            if writer is not None:
+                writer.abort()
+            metrics.increment("tts_edge_aborted")
+            raise
+        if writer is not None:
+            writer.commit()
+
+    metrics.observe("tts_edge_total_ms", (time.perf_counter() - start) * 1000)
+
+
+def _cached_with_boundaries(key: str) -> Optional[Tuple[bytes, List[dict]]]:
+    metadata = audio_cache.get_metadata(key)
+    if metadata is None or "words" not in metadata:
+        return None
+    audio = audio_cache.get(key)
+    return (audio, metadata["words"]) if audio is not None else None
+
+
+def _store_with_boundaries(key: str, audio: bytes, words: List[dict]) -> None:
+    audio_cache.put(key, audio)
+    audio_cache.put_metadata(key, {"words": words})
+
+
+async def synthesize_with_boundaries(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE,
+                                     use_cache: bool = True) -> Tuple[bytes, List[dict]]:
+    """
+    Synthesize text and keep the WordBoundary events Edge TTS emits alongside the audio.
+
+    Args:
+        text (str): Text to convert to speech
+        voice (str): Voice to use for speech synthesis
+        rate (str): Speaking rate adjustment
+        use_cache (bool): Whether to read from and write to the audio cache
+
+    Returns:
+        Tuple[bytes, List[dict]]: The MP3 audio and one {"text", "offset_ms", "duration_ms"}
+        entry per spoken word, offsets relative to the start of the audio
+    """
+    # Same audio as the plain stream, so the same key; the words live in its sidecar
+    key = audio_cache.key("edge", text, voice=voice, rate=rate)
+    if use_cache:
+        cached = await asyncio.to_thread(_cached_with_boundaries, key)
+        if cached is not None:
+            return cached
+
+    audio = bytearray()
+    words = []
+    async with _get_semaphore():
+        async for message in _stream_messages(text, voice, rate, word_boundaries=True):
+            if message["type"] == "audio":
+                audio += message["data"]
+            elif message["type"] == "WordBoundary":
+                # Offsets and durations are in 100 ns ticks
+                words.append({
+                    "text": message["text"],
+                    "offset_ms": message["offset"] / 10000,
+                    "duration_ms": message["duration"] / 10000,
+                })
+    if use_cache and audio:
+        await asyncio.to_thread(_store_with_boundaries, key, bytes(audio), words)
+    return bytes(audio), words
+
+
+async def synthesize_to_cache(text: str, voice: str = DEFAULT_VOICE, rate: str = DEFAULT_RATE) -> str:
+    """
+    Make sure the audio for a text is in the audio cache and return its key.
+    The key identifies the audio for good, so it can be served from a stable,
+    immutable URL.
+
+    Args:
+        text (str): Text to convert to speech
+        voice (str): Voice to use for speech synthesis
+        rate (str): Speaking rate adjustment
+
+    Returns:
+        str: Audio cache key (hex SHA-256)
+    """
+    key = audio_cache.key("edge", text, voice=voice, rate=rate)
+    if not audio_cache.contains(key):
+        async for _ in stream_text_to_speech_online(text, voice, rate):
+            pass
+    return key
 
 
 async def convert_text_to_speech_online(text: str, voice: str, output_path: str) -> str:
@@ -59,8 +258,9 @@ async def convert_text_to_speech_online(text: str, voice: str, output_path: str)
     Returns:
         str: Path to the created audio file
     """
-    tts = edge_tts.Communicate(text=text, voice=voice, rate="-10%")
-    await tts.save(output_path)
+    with open(output_path, "wb") as f:
+        async for chunk in stream_text_to_speech_online(text, voice):
+            f.write(chunk)
     return output_path
 
 
@@ -68,7 +268,8 @@ def edge_tts_convert(text: str, voice: Optional[str] = DEFAULT_VOICE,
                      output_path: Optional[str] = DEFAULT_OUTPUT_PATH) -> str:
     """
     Convert text to speech using Microsoft Edge TTS (online service).
-    This is a synchronous wrapper for the async function.
+    This is a synchronous wrapper for the async function, for scripts only;
+    inside a running event loop await convert_text_to_speech_online instead.
     
     Args:
         text (str): Text to convert to speech
@@ -89,6 +290,14 @@ def edge_tts_convert(text: str, voice: Optional[str] = DEFAULT_VOICE,
             output_path="custom_file.mp3"
         )
     """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("edge_tts_convert cannot run inside an event loop; "
+                           "await convert_text_to_speech_online instead")
+
     print("[1/3] Starting online text-to-speech conversion (Microsoft Edge TTS)...")
     print(f"[2/3] Converting text using voice: {voice}...")
     result = asyncio.run(convert_text_to_speech_online(text, voice, output_path))
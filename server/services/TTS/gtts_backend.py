@@ -0,0 +1,259 @@
+"""
+Parallel gTTS Backend - Concurrent Chunk Fetching over Pooled Sessions
+
+gTTS splits text into pieces of at most 100 characters and fetches them one
+after another, opening connections as it goes. This backend produces the same
+audio: it tokenizes text exactly like gTTS (with gTTS's public pre-processors
+and tokenizer cases, and gTTS's splitting rules re-implemented here rather
+than called through private methods) and speaks the same upstream RPC.
+The difference is that it fetches all pieces concurrently over one shared
+keep-alive session pool and reassembles the MP3 in order. Latency for long
+texts then follows the slowest piece instead of the sum of all pieces.
+
+The upstream URL is configurable (GTTS_UPSTREAM_URL), so the backend can be
+benchmarked offline against the local stand-in server in this module.
+
+Example usage:
+    from services.TTS.gtts_backend import gtts_backend
+
+    mp3_bytes = gtts_backend.synthesize("مرحبا بك في عالم البرمجة", language="ar")
+"""
+
+import base64
+import functools
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import whitespace
+from typing import Callable, List, Optional, Tuple
+
+from services.cassette import cassette
+
+DEFAULT_UPSTREAM_URL = "https://translate.google.com/_/TranslateWebserverUi/data/batchexecute"
+GTTS_UPSTREAM_URL = os.environ.get("GTTS_UPSTREAM_URL", DEFAULT_UPSTREAM_URL)
+
+# Concurrent piece fetches and pooled keep-alive connections
+GTTS_WORKERS = int(os.environ.get("GTTS_WORKERS", "16"))
+REQUEST_TIMEOUT = 10
+
+# Longest piece the upstream accepts (gTTS.GOOGLE_TTS_MAX_CHARS)
+GTTS_MAX_CHARS = 100
+
+_RPC_ID = "jQ1olc"
+_AUDIO_PATTERN = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+_HEADERS = {
+    "Referer": "http://translate.google.com/",
+    "User-Agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/47.0.2526.106 Safari/537.36"),
+    "Content-Type": "application/x-www-form-urlencoded;charset=utf-8",
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _gtts_text_tools() -> Tuple[List[Callable[[str], str]], Callable[[str], List[str]], "re.Pattern"]:
+    """gTTS's default pre-processors, tokenizer and punctuation-only pattern, built once"""
+    from gtts.tokenizer import Tokenizer, pre_processors, tokenizer_cases
+    from gtts.tokenizer.symbols import ALL_PUNC
+
+    processors = [pre_processors.tone_marks, pre_processors.end_of_line, pre_processors.abbreviations,
+                  pre_processors.word_sub]
+    tokenizer = Tokenizer([tokenizer_cases.tone_marks, tokenizer_cases.period_comma, tokenizer_cases.colon,
+                           tokenizer_cases.other_punctuation])
+    only_punctuation = re.compile("^[{}]*$".format(re.escape(ALL_PUNC + whitespace)))
+    return processors, tokenizer.run, only_punctuation
+
+
+def _split_long(token: str, max_size: int = GTTS_MAX_CHARS) -> List[str]:
+    """Cut a token at the last space before max_size (or at max_size if there is none), like gTTS"""
+    pieces = []
+    while True:
+        if token.startswith(" "):
+            token = token[1:]
+        if len(token) <= max_size:
+            pieces.append(token)
+            return pieces
+        try:
+            cut = token.rindex(" ", 0, max_size)
+        except ValueError:
+            cut = max_size
+        pieces.append(token[:cut])
+        token = token[cut:]
+
+
+class ParallelGTTS:
+    """
+    gTTS-compatible synthesizer that fetches token pieces concurrently.
+    Thread safe; share one instance per process.
+    """
+
+    def __init__(self, upstream_url: str = GTTS_UPSTREAM_URL, workers: int = GTTS_WORKERS):
+        self.upstream_url = upstream_url
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gtts")
+        self._lock = threading.Lock()
+        self._session = None
+
+    def _get_session(self):
+        """Shared keep-alive session, created (and requests imported) on first use"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.workers)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    @staticmethod
+    def tokenize(text: str, language: str, slow: bool = False) -> List[str]:
+        """Split text into the same <=100 character pieces gTTS would request"""
+        processors, tokenizer, only_punctuation = _gtts_text_tools()
+        text = text.strip()
+        for processor in processors:
+            text = processor(text)
+
+        tokens = [text] if len(text) <= GTTS_MAX_CHARS else tokenizer(text)
+        tokens = [token.strip() for token in tokens if not only_punctuation.match(token)]
+        if len(text) <= GTTS_MAX_CHARS:
+            return tokens
+        return [piece for token in tokens for piece in _split_long(token) if piece]
+
+    @staticmethod
+    def _package_rpc(piece: str, language: str, slow: bool) -> str:
+        # Same payload as gTTS: [text, lang, speed (True = slow, None = normal), "null"]
+        parameter = json.dumps([piece, language, True if slow else None, "null"], separators=(",", ":"))
+        rpc = json.dumps([[[_RPC_ID, parameter, None, "generic"]]], separators=(",", ":"))
+        return f"f.req={urllib.parse.quote(rpc)}&"
+
+    def _fetch(self, piece: str, language: str, slow: bool) -> bytes:
+        import requests
+        from gtts import gTTSError
+
+        try:
+            response = self._get_session().post(self.upstream_url, data=self._package_rpc(piece, language, slow),
+                                          headers=_HEADERS, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise gTTSError(f"Failed to fetch speech for {piece[:20]!r}: {e}")
+
+        audio = b""
+        for line in response.text.splitlines():
+            if _RPC_ID in line:
+                match = _AUDIO_PATTERN.search(line)
+                if match:
+                    audio += base64.b64decode(match.group(1).encode("ascii"))
+        if not audio:
+            raise gTTSError(f"No audio stream in upstream response for {piece[:20]!r}")
+        return audio
+
+    def synthesize(self, text: str, language: str = "en", slow: bool = False) -> bytes:
+        """
+        Convert text to MP3 bytes.
+
+        Args:
+            text (str): The text to convert to speech
+            language (str): The language code, e.g. "ar"
+            slow (bool): If True, speaks more slowly
+
+        Returns:
+            bytes: The MP3 audio, pieces in order
+
+        Raises:
+            gTTSError: If any piece cannot be fetched
+        """
+        def upstream() -> bytes:
+            pieces = self.tokenize(text, language, slow)
+            if len(pieces) == 1:
+                return self._fetch(pieces[0], language, slow)
+            futures = [self._executor.submit(self._fetch, piece, language, slow) for piece in pieces]
+            return b"".join(future.result() for future in futures)
+
+        return cassette.call_sync("gtts", {"text": text, "language": language, "slow": slow}, upstream)
+
+
+# Shared backend instance
+gtts_backend = ParallelGTTS()
+
+
+def run_standin_server(port: int = 0, delay: float = 0.2, audio: bytes = b"\xff\xfb\x90\x00" * 64):
+    """
+    Start a local stand-in for the upstream TTS endpoint (for offline benchmarks).
+    Every request sleeps for `delay` seconds and returns `audio` in the upstream format.
+
+    Args:
+        port (int): Port to listen on (0 picks a free one)
+        delay (float): Simulated upstream latency per piece in seconds
+        audio (bytes): Audio returned for every piece
+
+    Returns:
+        ThreadingHTTPServer: The running server; its URL is
+        f"http://127.0.0.1:{server.server_port}/batchexecute". Call shutdown() to stop.
+    """
+    encoded = base64.b64encode(audio).decode("ascii")
+    body = f')]}}\'\n\n123\n[["wrb.fr","{_RPC_ID}","[\\"{encoded}\\"]",null,null,null,"generic"]]\n'.encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark_parallel_fetch(characters: int = 1000, delay: float = 0.2,
+                             language: str = "ar", workers: Optional[int] = None) -> dict:
+    """
+    Compare sequential and parallel piece fetching against the local stand-in server.
+
+    Args:
+        characters (int): Length of the generated text
+        delay (float): Simulated upstream latency per piece in seconds
+        language (str): Language code used for tokenization
+        workers (int, optional): Parallel workers (default: GTTS_WORKERS)
+
+    Returns:
+        dict: {"pieces", "sequential_s", "parallel_s"}
+    """
+    sentence = "مرحبا بك في عالم البرمجة، نتعلم اليوم اللغة العربية معا. "
+    text = (sentence * (characters // len(sentence) + 1))[:characters]
+
+    server = run_standin_server(delay=delay)
+    url = f"http://127.0.0.1:{server.server_port}/batchexecute"
+    try:
+        results = {"pieces": len(ParallelGTTS.tokenize(text, language))}
+        for label, pool in (("sequential", 1), ("parallel", workers or GTTS_WORKERS)):
+            backend = ParallelGTTS(upstream_url=url, workers=pool)
+            start = time.perf_counter()
+            backend.synthesize(text, language)
+            results[f"{label}_s"] = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    print(f"⏱️ {characters} chars / {results['pieces']} pieces @ {delay * 1000:.0f} ms each: "
+          f"sequential {results['sequential_s']:.2f}s, parallel {results['parallel_s']:.2f}s")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_parallel_fetch()
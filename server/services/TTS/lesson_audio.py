@@ -0,0 +1,156 @@
+"""
+Lesson Audio Sprites - One Audio File per Lesson with Word Timings
+
+Instead of one TTS request per clicked word, every Arabic segment of a
+lesson is synthesized once with Edge TTS while its WordBoundary events are
+recorded. The segments are joined into a single MP3 ("sprite") stored in
+the audio cache, together with a compact timing index. With it the client
+can play any single word (seek + stop) or highlight words during playback
+without asking the server again.
+
+Timing index format (all times in milliseconds from the start of the sprite):
+    {
+        "url": "/audio/<hash>.mp3",
+        "hash": "<hash>",
+        "duration": 5230,
+        "segments": [[start, end], ...],                  # one per Arabic segment
+        "words": [[text, start, duration, segment], ...]  # one per spoken word
+    }
+
+A lesson with nothing to speak gets an index with "url" and "hash" set to
+None and no segments or words.
+
+Example usage:
+    from services.TTS.lesson_audio import synthesize_lesson_audio
+
+    index = await synthesize_lesson_audio(["مرحبا بك", "كيف حالك؟"])
+"""
+
+import asyncio
+from typing import List, Optional
+
+from services.TTS.cache import audio_cache
+from services.TTS.edge_tts_service import DEFAULT_RATE, VOICE_ARABIC_FEMALE, synthesize_with_boundaries
+
+# MPEG audio (Layer III) header tables for duration calculation
+_BITRATES_KBPS = {
+    "mpeg1": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    "mpeg2": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG 1
+    2: [22050, 24000, 16000],  # MPEG 2
+    0: [11025, 12000, 8000],   # MPEG 2.5
+}
+
+
+def _empty_index() -> dict:
+    # Nothing to speak: no sprite is stored, so there is no url to fetch
+    return {"url": None, "hash": None, "duration": 0, "segments": [], "words": []}
+
+
+def _cached_index(key: str) -> Optional[dict]:
+    index = audio_cache.get_metadata(key)
+    return index if index is not None and audio_cache.contains(key) else None
+
+
+def _store(key: str, sprite: bytes, index: dict) -> None:
+    audio_cache.put(key, sprite)
+    audio_cache.put_metadata(key, index)
+
+
+def mp3_duration_ms(data: bytes) -> float:
+    """
+    Exact duration of MP3 (Layer III) audio, by walking its frame headers.
+
+    Args:
+        data (bytes): MP3 audio, optionally with an ID3v2 tag
+
+    Returns:
+        float: Duration in milliseconds
+    """
+    position = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        # Synchsafe tag size
+        position = 10 + ((data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9])
+
+    duration = 0.0
+    length = len(data)
+    while position + 4 <= length:
+        b1, b2 = data[position + 1], data[position + 2]
+        version = (b1 >> 3) & 0x3
+        layer = (b1 >> 1) & 0x3
+        bitrate_index = b2 >> 4
+        sample_rate_index = (b2 >> 2) & 0x3
+        if (data[position] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or layer != 1
+                or bitrate_index in (0, 15) or sample_rate_index == 3):
+            position += 1  # not a frame header, resync
+            continue
+
+        mpeg1 = version == 3
+        bitrate = _BITRATES_KBPS["mpeg1" if mpeg1 else "mpeg2"][bitrate_index] * 1000
+        sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+        samples = 1152 if mpeg1 else 576
+        frame_length = (144 if mpeg1 else 72) * bitrate // sample_rate + ((b2 >> 1) & 0x1)
+
+        duration += samples * 1000 / sample_rate
+        position += frame_length
+    return duration
+
+
+async def synthesize_lesson_audio(segments: List[str], voice: str = VOICE_ARABIC_FEMALE,
+                                  rate: str = DEFAULT_RATE, max_parallel: Optional[int] = None) -> dict:
+    """
+    Build (or fetch from the cache) the audio sprite and timing index for a lesson.
+
+    Args:
+        segments (List[str]): The lesson's Arabic segments, in order
+        voice (str): Edge voice name
+        rate (str): Speaking rate adjustment
+        max_parallel (int, optional): Segments synthesized at once (default: all,
+            still bounded by the shared Edge TTS pool)
+
+    Returns:
+        dict: The timing index described in the module docstring
+    """
+    segments = [segment for segment in segments if segment and segment.strip()]
+    if not segments:
+        return _empty_index()
+    key = audio_cache.key("edge-sprite", "\n".join(segments), voice=voice, rate=rate)
+
+    # Cache files are read and written off the event loop
+    index = await asyncio.to_thread(_cached_index, key)
+    if index is not None:
+        return index
+
+    limit = asyncio.Semaphore(max_parallel or max(1, len(segments)))
+
+    async def synthesize(segment: str):
+        async with limit:
+            return await synthesize_with_boundaries(segment, voice, rate)
+
+    results = await asyncio.gather(*(synthesize(segment) for segment in segments))
+
+    sprite = bytearray()
+    segment_times = []
+    words = []
+    start = 0.0
+    for segment_index, (audio, boundaries) in enumerate(results):
+        duration = mp3_duration_ms(audio)
+        segment_times.append([round(start), round(start + duration)])
+        for word in boundaries:
+            words.append([word["text"], round(start + word["offset_ms"]), round(word["duration_ms"]), segment_index])
+        sprite += audio
+        start += duration
+
+    if not sprite:
+        return _empty_index()
+    index = {
+        "url": f"/audio/{key}.mp3",
+        "hash": key,
+        "duration": round(start),
+        "segments": segment_times,
+        "words": words,
+    }
+    await asyncio.to_thread(_store, key, bytes(sprite), index)
+    return index
@@ -0,0 +1,340 @@
+"""
+Offline TTS Worker Pool - Local Speech Synthesis with Persistent pyttsx3 Engines
+
+pyttsx3.init() (espeak / SAPI5 / NSSpeech start-up) costs far more than
+synthesizing a sentence, and runAndWait() blocks. This module keeps a pool
+of worker processes, each holding one long-lived engine, fed by a job queue.
+Every job is rendered to a temporary file with save_to_file and returned as
+bytes (MP3 through ffmpeg by default, so it can be mixed with the online
+backends' output).
+
+It needs no network, which makes it the fallback when the online backends are
+slow or down (see services.TTS.pipeline.with_fallback).
+
+Cancelling a job's future (e.g. the client disconnected) tells every worker
+to skip the job if it has not started yet. A worker whose engine failed to
+start (no pyttsx3, no espeak) stays up and fails every job it takes with the
+start-up error, so callers get an error instead of waiting for JOB_TIMEOUT.
+A worker that dies (e.g. the speech engine crashed) fails the job it was on
+and is replaced.
+
+Example usage:
+    from services.TTS.offline_engine import offline_pool
+
+    mp3_bytes = offline_pool.synthesize("مرحبا بك", language="ar")
+    mp3_bytes = await offline_pool.synthesize_async("مرحبا بك", language="ar")
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty
+from typing import Callable, Dict, List, Optional, Set
+
+from services.metrics import metrics
+
+OFFLINE_TTS_WORKERS = int(os.environ.get("OFFLINE_TTS_WORKERS", "2"))
+JOB_TIMEOUT = 30
+
+# How often the pool checks for dead workers
+WORKER_CHECK_S = 1.0
+
+# Job id of an idle worker
+_IDLE = -1
+
+FORMAT_MP3 = "mp3"
+FORMAT_WAV = "wav"
+
+
+def _pick_voice(engine, language: Optional[str], cache: Dict[Optional[str], Optional[str]]) -> Optional[str]:
+    """Find (once per language) an installed voice that speaks the language"""
+    if language not in cache:
+        cache[language] = None
+        if language:
+            for voice in engine.getProperty("voices"):
+                languages = [l.decode(errors="ignore") if isinstance(l, bytes) else str(l)
+                             for l in (getattr(voice, "languages", None) or [])]
+                names = languages + [voice.id or "", voice.name or ""]
+                if any(language.lower() in name.lower().lstrip("\x05") for name in names):
+                    cache[language] = voice.id
+                    break
+    return cache[language]
+
+
+def _to_mp3(path: str) -> bytes:
+    # 24 kHz mono like the edge-tts output, so offline and online clips can be concatenated
+    process = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path,
+         "-f", "mp3", "-codec:a", "libmp3lame", "-b:a", "48k", "-ac", "1", "-ar", "24000", "pipe:1"],
+        capture_output=True, check=True, timeout=JOB_TIMEOUT,
+    )
+    return process.stdout
+
+
+def _start_engine():
+    import pyttsx3
+
+    return pyttsx3.init()
+
+
+def _worker_main(jobs, results, cancels, current, slot: int, engine_factory: Callable) -> None:
+    """Worker process: one persistent engine, jobs until a None sentinel arrives"""
+    try:
+        engine = engine_factory()
+        default_voice = engine.getProperty("voice")
+        init_error = None
+    except Exception as e:
+        init_error = f"engine start-up failed: {type(e).__name__}: {e}"
+        # Job id None: reported once per worker by the pool
+        results.put((None, None, init_error))
+    voices: Dict[Optional[str], Optional[str]] = {}
+    cancelled: Set[int] = set()
+
+    while True:
+        current[slot] = _IDLE
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, text, language, rate, output_format = job
+        # Read by the pool if this process dies during the job
+        current[slot] = job_id
+        if init_error:
+            results.put((job_id, None, init_error))
+            continue
+
+        try:
+            while True:
+                cancelled.add(cancels.get_nowait())
+        except Empty:
+            pass
+        skip = job_id in cancelled
+        # Jobs are queued in id order: ids up to this one will not reach this worker again
+        cancelled = {cancelled_id for cancelled_id in cancelled if cancelled_id > job_id}
+        if skip:
+            results.put((job_id, None, "cancelled"))
+            continue
+
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            engine.setProperty("voice", _pick_voice(engine, language, voices) or default_voice)
+            if rate:
+                engine.setProperty("rate", rate)
+            engine.save_to_file(text, path)
+            engine.runAndWait()
+
+            if output_format == FORMAT_MP3:
+                data = _to_mp3(path)
+            else:
+                with open(path, "rb") as f:
+                    data = f.read()
+            results.put((job_id, data, None))
+        except Exception as e:
+            results.put((job_id, None, f"{type(e).__name__}: {e}"))
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+class OfflineTTSPool:
+    """
+    Pool of worker processes with persistent pyttsx3 engines. Started lazily
+    on the first job; safe to call from any thread.
+    """
+
+    def __init__(self, workers: int = OFFLINE_TTS_WORKERS, engine_factory: Callable = _start_engine):
+        self.workers = workers
+        # Module-level function returning a pyttsx3-like engine, called in each worker process
+        self.engine_factory = engine_factory
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending: Dict[int, Future] = {}
+        self._processes: List = []
+        self._jobs = None
+        self._results = None
+        self._cancels: List = []
+        self._current = None
+
+    def start(self) -> None:
+        """Start the worker processes (idempotent)"""
+        with self._lock:
+            if self._processes:
+                return
+            self._jobs = self._context.Queue()
+            self._results = self._context.Queue()
+            # The job each worker is on, _IDLE between jobs
+            self._current = self._context.Array("q", [_IDLE] * self.workers, lock=False)
+            self._cancels = [None] * self.workers
+            self._processes = [self._spawn(slot) for slot in range(self.workers)]
+            threading.Thread(target=self._dispatch_results, args=(self._results,), daemon=True).start()
+            print(f"✅ Offline TTS pool started with {self.workers} engines")
+
+    def _spawn(self, slot: int):
+        # One cancel queue per worker: every worker must hear about every cancelled job
+        self._cancels[slot] = self._context.Queue()
+        self._current[slot] = _IDLE
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self._jobs, self._results, self._cancels[slot], self._current, slot, self.engine_factory),
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _replace_dead_workers(self) -> None:
+        with self._lock:
+            for slot, process in enumerate(self._processes):
+                if process.exitcode is None:
+                    continue
+                job_id = self._current[slot]
+                future = self._pending.pop(job_id, None) if job_id != _IDLE else None
+                if future is not None and not future.done():
+                    future.set_exception(RuntimeError(f"Offline TTS failed: worker exited with code {process.exitcode}"))
+                metrics.increment("offline_tts_worker_restarts")
+                print(f"⚠️ Offline TTS worker exited with code {process.exitcode}, starting a new one")
+                self._processes[slot] = self._spawn(slot)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        with self._lock:
+            for _ in self._processes:
+                self._jobs.put(None)
+            for process in self._processes:
+                process.join(timeout=5)
+            self._processes = []
+            self._results = None
+
+    def _dispatch_results(self, results) -> None:
+        checked = time.monotonic()
+        # Ends once the pool is shut down or restarted with new queues
+        while self._results is results:
+            if time.monotonic() - checked >= WORKER_CHECK_S:
+                self._replace_dead_workers()
+                checked = time.monotonic()
+            try:
+                job_id, data, error = results.get(timeout=WORKER_CHECK_S)
+            except Empty:
+                continue
+            if job_id is None:
+                metrics.increment("offline_tts_worker_errors")
+                print(f"⚠️ Offline TTS worker: {error}")
+                continue
+            future = self._pending.pop(job_id, None)
+            if future is None or future.cancelled():
+                continue
+            if error:
+                future.set_exception(RuntimeError(f"Offline TTS failed: {error}"))
+            else:
+                future.set_result(data)
+
+    def submit(self, text: str, language: Optional[str] = None, rate: Optional[int] = None,
+               output_format: str = FORMAT_MP3) -> Future:
+        """
+        Queue a synthesis job.
+
+        Args:
+            text (str): Text to speak
+            language (str, optional): Language code used to pick a voice, e.g. "ar"
+            rate (int, optional): Words per minute
+            output_format (str): "mp3" (needs ffmpeg) or "wav"
+
+        Returns:
+            Future: Resolves to the audio bytes; cancelling it skips the job if no worker started it yet
+        """
+        self.start()
+        future: Future = Future()
+        # Ids reach the queue in order, which lets the workers forget older cancellations
+        with self._submit_lock:
+            job_id = next(self._ids)
+            self._pending[job_id] = future
+            self._jobs.put((job_id, text, language, rate, output_format))
+        future.add_done_callback(lambda done: self._cancel(job_id) if done.cancelled() else None)
+        return future
+
+    def _cancel(self, job_id: int) -> None:
+        # Also reached on timeouts: the job is forgotten even if no worker ever answers it
+        self._pending.pop(job_id, None)
+        metrics.increment("offline_tts_cancelled")
+        for cancels in self._cancels:
+            cancels.put(job_id)
+
+    def synthesize(self, text: str, language: Optional[str] = None, rate: Optional[int] = None,
+                   output_format: str = FORMAT_MP3) -> bytes:
+        """Blocking synthesis; see submit for the arguments"""
+        future = self.submit(text, language, rate, output_format)
+        try:
+            return future.result(timeout=JOB_TIMEOUT)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    async def synthesize_async(self, text: str, language: Optional[str] = None, rate: Optional[int] = None,
+                               output_format: str = FORMAT_MP3) -> bytes:
+        """Non-blocking synthesis for request handlers; see submit for the arguments"""
+        future = self.submit(text, language, rate, output_format)
+        return await asyncio.wait_for(asyncio.wrap_future(future), JOB_TIMEOUT)
+
+
+# Shared pool instance
+offline_pool = OfflineTTSPool()
+
+
+def benchmark_offline_vs_gtts(sentence_count: int = 20, concurrency: int = 4, language: str = "ar") -> dict:
+    """
+    Compare latency and throughput of the offline pool and the (online) gTTS backend.
+
+    Args:
+        sentence_count (int): Number of distinct sentences to synthesize per backend
+        concurrency (int): Parallel requests
+        language (str): Language code
+
+    Returns:
+        dict: {backend: {"mean_latency_s", "throughput_per_s"}}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from services.TTS.gtts_backend import gtts_backend
+
+    sentences = [f"هذه الجملة رقم {i} في الاختبار" for i in range(sentence_count)]
+    backends = {
+        "offline": lambda text: offline_pool.synthesize(text, language=language),
+        "gtts": lambda text: gtts_backend.synthesize(text, language=language),
+    }
+
+    offline_pool.start()
+    offline_pool.synthesize("warm up", language=language)
+
+    results = {}
+    for name, synthesize in backends.items():
+        latencies = []
+
+        def timed(text):
+            start = time.perf_counter()
+            synthesize(text)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, sentences))
+        elapsed = time.perf_counter() - start
+
+        results[name] = {
+            "mean_latency_s": sum(latencies) / len(latencies),
+            "throughput_per_s": len(sentences) / elapsed,
+        }
+        print(f"⏱️ {name:<8} mean latency {results[name]['mean_latency_s']:.2f}s, "
+              f"throughput {results[name]['throughput_per_s']:.1f} sentences/s")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_offline_vs_gtts()
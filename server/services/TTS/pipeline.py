@@ -0,0 +1,175 @@
+"""
+Sentence-Pipelined Text-to-Speech
+
+Long lesson texts are split into sentences which are synthesized
+concurrently (bounded by max_parallel) and streamed back in order. The
+first sentence streams chunk by chunk as soon as it is synthesized, while
+later sentences are already being prepared, so playback starts after one
+sentence instead of after the whole text.
+
+Every sentence is synthesized (and cached) on its own, so a sentence that
+appears in several lessons is only synthesized once.
+
+MP3 frames are self-contained, so the concatenated stream plays as one file.
+
+Example usage:
+    from services.TTS.pipeline import stream_pipelined_speech, edge_synthesizer
+
+    return StreamingResponse(stream_pipelined_speech(text, edge_synthesizer(VOICE_ARABIC_FEMALE)),
+                             media_type="audio/mpeg")
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from services.metrics import metrics
+from services.NLP.segmenter import split_sentences
+
+# A synthesizer turns one sentence into a stream of MP3 chunks
+Synthesizer = Callable[[str], AsyncIterator[bytes]]
+
+# Sentences synthesized ahead of the one currently being streamed
+DEFAULT_MAX_PARALLEL = 3
+
+# An online backend that hasn't produced audio by then is considered slow or down
+FALLBACK_FIRST_CHUNK_TIMEOUT = 4.0
+
+_END = object()
+
+
+def edge_synthesizer(voice: str, rate: Optional[str] = None) -> Synthesizer:
+    """
+    Per-sentence synthesizer backed by the Edge TTS service (cached per sentence).
+
+    Args:
+        voice (str): Edge voice name
+        rate (str, optional): Speaking rate, defaults to the service default
+    """
+    from services.TTS.edge_tts_service import DEFAULT_RATE, stream_text_to_speech_online
+
+    def synthesize(sentence: str) -> AsyncIterator[bytes]:
+        return stream_text_to_speech_online(sentence, voice, rate or DEFAULT_RATE)
+    return synthesize
+
+
+def gtts_synthesizer(language: str, slow: bool = False) -> Synthesizer:
+    """
+    Per-sentence synthesizer backed by gTTS (cached per sentence), run in a thread.
+
+    Args:
+        language (str): Language code, e.g. "ar"
+        slow (bool): If True, speaks more slowly
+    """
+    from services.TTS.text_to_speak import TextToSpeechConverter
+    converter = TextToSpeechConverter()
+
+    async def synthesize(sentence: str) -> AsyncIterator[bytes]:
+        yield await asyncio.to_thread(converter.convert_text_to_speech_bytes, sentence, language, slow)
+    return synthesize
+
+
+def offline_synthesizer(language: Optional[str] = None) -> Synthesizer:
+    """
+    Per-sentence synthesizer backed by the local pyttsx3 worker pool (no network).
+
+    Args:
+        language (str, optional): Language code used to pick a voice, e.g. "ar"
+    """
+    from services.TTS.offline_engine import offline_pool
+
+    async def synthesize(sentence: str) -> AsyncIterator[bytes]:
+        yield await offline_pool.synthesize_async(sentence, language=language)
+    return synthesize
+
+
+def with_fallback(primary: Synthesizer, fallback: Synthesizer,
+                  first_chunk_timeout: float = FALLBACK_FIRST_CHUNK_TIMEOUT) -> Synthesizer:
+    """
+    Use the fallback synthesizer for a sentence when the primary one fails or
+    produces no audio within first_chunk_timeout seconds.
+
+    Args:
+        primary (Synthesizer): Preferred (usually online) synthesizer
+        fallback (Synthesizer): Synthesizer used when the primary is slow or down
+        first_chunk_timeout (float): Seconds to wait for the primary's first chunk
+    """
+    async def synthesize(sentence: str) -> AsyncIterator[bytes]:
+        stream = primary(sentence)
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), first_chunk_timeout)
+        except StopAsyncIteration:
+            return
+        except (asyncio.TimeoutError, Exception) as e:
+            await stream.aclose()
+            print(f"⚠️ TTS backend failed or too slow ({type(e).__name__}), using fallback")
+            metrics.increment("tts_fallbacks")
+            async for chunk in fallback(sentence):
+                yield chunk
+            return
+
+        yield first
+        async for chunk in stream:
+            yield chunk
+    return synthesize
+
+
+async def stream_pipelined_speech(text: str, synthesize: Synthesizer,
+                                  max_parallel: int = DEFAULT_MAX_PARALLEL) -> AsyncIterator[bytes]:
+    """
+    Synthesize text sentence by sentence with bounded look-ahead and stream the audio in order.
+
+    Args:
+        text (str): Text to convert to speech (any length)
+        synthesize (Synthesizer): Per-sentence synthesizer (edge_synthesizer, gtts_synthesizer...)
+        max_parallel (int): Maximum number of sentences synthesized at once
+
+    Yields:
+        bytes: MP3 chunks, sentence order preserved
+
+    Raises:
+        Exception: The first synthesis error, when its sentence is reached
+    """
+    sentences: List[str] = split_sentences(text)
+    if not sentences:
+        return
+
+    queues = [asyncio.Queue() for _ in sentences]
+    tasks: Dict[int, asyncio.Task] = {}
+
+    async def produce(index: int) -> None:
+        try:
+            async for chunk in synthesize(sentences[index]):
+                queues[index].put_nowait(chunk)
+        except Exception as e:
+            queues[index].put_nowait(e)
+        queues[index].put_nowait(_END)
+
+    start = time.perf_counter()
+    first_chunk = True
+    next_start = 0
+    try:
+        for index in range(len(sentences)):
+            # Keep up to max_parallel sentences in flight, starting from the current one
+            while next_start < len(sentences) and next_start < index + max_parallel:
+                tasks[next_start] = asyncio.create_task(produce(next_start))
+                next_start += 1
+
+            while True:
+                item = await queues[index].get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if first_chunk:
+                    metrics.observe("tts_pipeline_first_byte_ms", (time.perf_counter() - start) * 1000)
+                    first_chunk = False
+                yield item
+            tasks.pop(index, None)
+    finally:
+        # Client went away or a sentence failed: stop synthesizing the rest
+        for task in tasks.values():
+            task.cancel()
+
+    metrics.observe("tts_pipeline_total_ms", (time.perf_counter() - start) * 1000)
+    metrics.increment("tts_pipeline_sentences", len(sentences))
@@ -0,0 +1,231 @@
+"""
+Batch Pre-Synthesis - Warm the TTS Cache Before a Course Launches
+
+Reads vocabulary and sentence lists and synthesizes every distinct item
+into the shared audio cache ahead of time, so the first student's click
+is already a cache hit.
+
+Supported inputs:
+    - .txt: one item per line
+    - .csv: a "text" column (or the first column), optional "language" column
+    - .json: lesson output of extract_tagged_text ([[text, "Arabic"], ...]),
+             a list of such lessons, or {"data": [...]} as returned by /api
+
+Items are de-duplicated by their cache key (i.e. after normalization).
+Synthesis runs with bounded concurrency and retries. Completed keys are
+appended to a checkpoint file, so an interrupted run resumes where it
+stopped.
+
+Usage (from the server folder):
+    python -m services.TTS.presynth vocabulary.txt lessons/*.json --concurrency 8
+    python -m services.TTS.presynth words.csv --backend gtts --checkpoint warmup.ckpt
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.NLP.segmenter import split_sentences
+from services.TTS.cache import audio_cache
+from services.TTS.edge_tts_service import (DEFAULT_RATE, VOICE_ARABIC_FEMALE, VOICE_HEBREW_FEMALE,
+                                           synthesize_to_cache)
+
+BACKEND_EDGE = "edge"
+BACKEND_GTTS = "gtts"
+
+# extract_tagged_text language names -> (Edge voice, gTTS language code)
+LANGUAGES = {
+    "Arabic": (VOICE_ARABIC_FEMALE, "ar"),
+    "Hebrew": (VOICE_HEBREW_FEMALE, "he"),
+}
+
+# (text, language name)
+Item = Tuple[str, str]
+
+
+def _read_lesson(data, languages: Set[str]) -> Iterable[Item]:
+    if isinstance(data, dict):
+        data = data.get("data", [])
+    for entry in data:
+        if (isinstance(entry, (list, tuple)) and len(entry) == 2
+                and isinstance(entry[0], str) and isinstance(entry[1], str)):
+            if entry[1] in languages:
+                yield entry[0], entry[1]
+        elif isinstance(entry, (list, dict)):
+            # A list of lessons
+            yield from _read_lesson(entry, languages)
+
+
+def read_items(paths: List[str], languages: Set[str], default_language: str = "Arabic") -> List[Item]:
+    """
+    Read items from text, CSV and lesson JSON files.
+
+    Args:
+        paths (List[str]): Input files
+        languages (Set[str]): Languages to keep from lesson JSON ("Arabic", "Hebrew")
+        default_language (str): Language of items in text/CSV files without a language column
+
+    Returns:
+        List[Item]: (text, language) items in input order, duplicates included
+    """
+    items: List[Item] = []
+    for path in paths:
+        suffix = Path(path).suffix.lower()
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            if suffix == ".json":
+                items.extend(_read_lesson(json.load(f), languages))
+            elif suffix == ".csv":
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header is None:
+                    continue
+                lowered = [column.strip().lower() for column in header]
+                if "text" in lowered:
+                    text_column = lowered.index("text")
+                    language_column = lowered.index("language") if "language" in lowered else None
+                else:
+                    # No header row: the first line is data
+                    text_column, language_column = 0, None
+                    items.append((header[0].strip(), default_language))
+                for row in reader:
+                    if len(row) <= text_column or not row[text_column].strip():
+                        continue
+                    language = default_language
+                    if language_column is not None and len(row) > language_column:
+                        language = row[language_column].strip() or default_language
+                    items.append((row[text_column].strip(), language))
+            else:
+                items.extend((line.strip(), default_language) for line in f if line.strip())
+    return [(text, language) for text, language in items if text]
+
+
+def plan_jobs(items: List[Item], backend: str, split: bool = False) -> Dict[str, Item]:
+    """
+    De-duplicate items by audio cache key.
+
+    Args:
+        items (List[Item]): Items to synthesize
+        backend (str): "edge" or "gtts"
+        split (bool): Also split items into sentences, as the pipelined /tts/stream caches them
+
+    Returns:
+        Dict[str, Item]: cache key -> item, in first-seen order
+    """
+    jobs: Dict[str, Item] = {}
+    for text, language in items:
+        if language not in LANGUAGES:
+            continue
+        voice, code = LANGUAGES[language]
+        texts = [text] + (split_sentences(text) if split else [])
+        for piece in texts:
+            if backend == BACKEND_EDGE:
+                key = audio_cache.key("edge", piece, voice=voice, rate=DEFAULT_RATE)
+            else:
+                key = audio_cache.key("gtts", piece, lang=code, slow=False)
+            jobs.setdefault(key, (piece, language))
+    return jobs
+
+
+def _read_checkpoint(path: str) -> Set[str]:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+async def presynthesize(jobs: Dict[str, Item], backend: str = BACKEND_EDGE, concurrency: int = 4,
+                        retries: int = 3, checkpoint: Optional[str] = None) -> dict:
+    """
+    Synthesize every job not already cached or checkpointed.
+
+    Args:
+        jobs (Dict[str, Item]): Output of plan_jobs
+        backend (str): "edge" or "gtts"
+        concurrency (int): Parallel synthesis jobs
+        retries (int): Attempts per item before it is reported as failed
+        checkpoint (str, optional): File that completed keys are appended to
+
+    Returns:
+        dict: {"done", "skipped", "failed", "bytes", "seconds", "items_per_second"}
+    """
+    from services.TTS.text_to_speak import TextToSpeechConverter
+    converter = TextToSpeechConverter()
+
+    done_keys = _read_checkpoint(checkpoint)
+    pending = {key: item for key, item in jobs.items() if key not in done_keys and not audio_cache.contains(key)}
+    stats = {"done": 0, "skipped": len(jobs) - len(pending), "failed": [], "bytes": 0}
+
+    limit = asyncio.Semaphore(concurrency)
+    checkpoint_file = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+
+    async def run(key: str, item: Item) -> None:
+        text, language = item
+        voice, code = LANGUAGES[language]
+        async with limit:
+            for attempt in range(retries):
+                try:
+                    if backend == BACKEND_EDGE:
+                        await synthesize_to_cache(text, voice)
+                    else:
+                        await asyncio.to_thread(converter.convert_text_to_speech_bytes, text, code)
+                    break
+                except Exception as e:
+                    if attempt == retries - 1:
+                        print(f"❌ Failed after {retries} attempts: {text[:40]!r}: {e}")
+                        stats["failed"].append(text)
+                        return
+                    await asyncio.sleep(2 ** attempt)
+
+        stats["done"] += 1
+        stats["bytes"] += audio_cache.path(key).stat().st_size if audio_cache.contains(key) else 0
+        if checkpoint_file:
+            checkpoint_file.write(key + "\n")
+            checkpoint_file.flush()
+        if stats["done"] % 50 == 0:
+            print(f"… {stats['done']}/{len(pending)} synthesized")
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(run(key, item) for key, item in pending.items()))
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["items_per_second"] = stats["done"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Pre-synthesize vocabulary and lesson audio into the TTS cache")
+    parser.add_argument("inputs", nargs="+", help="Text, CSV or lesson JSON files")
+    parser.add_argument("--backend", choices=[BACKEND_EDGE, BACKEND_GTTS], default=BACKEND_EDGE)
+    parser.add_argument("--languages", default="Arabic", help="Comma separated languages to keep (Arabic,Hebrew)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--checkpoint", help="Checkpoint file for resuming interrupted runs")
+    parser.add_argument("--split-sentences", action="store_true",
+                        help="Also cache each sentence separately (used by the pipelined /tts/stream)")
+    args = parser.parse_args(argv)
+
+    languages = {language.strip() for language in args.languages.split(",") if language.strip()}
+    items = read_items(args.inputs, languages)
+    jobs = plan_jobs(items, args.backend, split=args.split_sentences)
+    print(f"📋 {len(items)} items, {len(jobs)} distinct after normalization")
+
+    stats = asyncio.run(presynthesize(jobs, args.backend, args.concurrency, args.retries, args.checkpoint))
+
+    print(f"✅ Synthesized {stats['done']} items ({stats['skipped']} already cached) "
+          f"in {stats['seconds']:.1f}s: {stats['items_per_second']:.2f} items/s, "
+          f"{stats['bytes'] / 1024 / 1024:.2f} MB")
+    if stats["failed"]:
+        print(f"⚠️ {len(stats['failed'])} items failed; run again to retry them")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Speech-to-Text Engine - Local Whisper Transcription
+
+This module provides the speech-to-text engine behind transcribe_audio_to_text.
+It runs OpenAI Whisper models locally through Hugging Face transformers.
+
+Each model tier is loaded once and kept resident; the least recently used
+tier is unloaded when more than MAX_LOADED_MODELS tiers are in memory.
+Long recordings are split into overlapping chunks that are transcribed in
+batches and stitched back together. Pipelines are not thread safe, so calls
+to one tier are serialized; different tiers run concurrently.
+
+Model tiers:
+    - "fast": openai/whisper-tiny
+    - "base": openai/whisper-base
+    - "small": openai/whisper-small
+    - "medium": openai/whisper-medium
+
+Example usage:
+    from services.TTS.speech_to_text import convert_speech_to_text
+
+    # From a file path
+    text = convert_speech_to_text("recording.mp3", model_type="base")
+
+    # From an in-memory buffer
+    text = convert_speech_to_text(uploaded_bytes, model_type="fast", language="ar")
+"""
+
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, List, Optional, Union
+
+from services.STT.recognizer import AudioClip, Recognizer, TARGET_SAMPLE_RATE, decode_audio
+
+MODEL_TIERS = {
+    "fast": "openai/whisper-tiny",
+    "base": "openai/whisper-base",
+    "small": "openai/whisper-small",
+    "medium": "openai/whisper-medium",
+}
+
+# How many tiers may stay loaded at once
+MAX_LOADED_MODELS = int(os.environ.get("STT_MAX_LOADED_MODELS", "2"))
+
+# Whisper sees 30 second windows; chunks overlap so words on the boundary aren't cut
+CHUNK_SECONDS = 25.0
+OVERLAP_SECONDS = 3.0
+
+# Chunks of a long recording transcribed per model forward pass
+CHUNK_BATCH_SIZE = int(os.environ.get("STT_CHUNK_BATCH_SIZE", "4"))
+
+# Whisper expects language names
+LANGUAGE_NAMES = {
+    "ar": "arabic",
+    "he": "hebrew",
+    "en": "english",
+}
+
+AudioSource = Union[str, bytes, bytearray, BinaryIO, AudioClip]
+
+
+class ModelCache:
+    """
+    LRU cache of loaded Whisper pipelines, keyed by model tier.
+    """
+
+    def __init__(self, max_models: int = MAX_LOADED_MODELS):
+        self.max_models = max_models
+        self._models: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._calls = {}
+
+    def get(self, model_type: str):
+        """
+        Get the pipeline for a tier, loading it on first use.
+
+        Args:
+            model_type (str): One of MODEL_TIERS
+
+        Returns:
+            The transformers automatic-speech-recognition pipeline
+
+        Raises:
+            ValueError: If the tier is unknown
+        """
+        if model_type not in MODEL_TIERS:
+            raise ValueError(f"Invalid model type. Available: {list(MODEL_TIERS.keys())}")
+
+        with self._lock:
+            model = self._models.get(model_type)
+            if model is not None:
+                self._models.move_to_end(model_type)
+                return model
+            # One loader per tier; concurrent callers wait for the same load
+            load_lock = self._loading.setdefault(model_type, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                model = self._models.get(model_type)
+                if model is not None:
+                    self._models.move_to_end(model_type)
+                    return model
+
+            model = self._load(model_type)
+
+            with self._lock:
+                self._models[model_type] = model
+                while len(self._models) > self.max_models:
+                    evicted, _ = self._models.popitem(last=False)
+                    print(f"♻️ Unloaded STT model tier: {evicted}")
+        return model
+
+    def call_lock(self, model_type: str) -> threading.Lock:
+        """Lock to hold while calling a tier's pipeline, which is not thread safe"""
+        with self._lock:
+            return self._calls.setdefault(model_type, threading.Lock())
+
+    def loaded(self) -> List[str]:
+        """Tiers currently in memory, least recently used first"""
+        with self._lock:
+            return list(self._models)
+
+    @staticmethod
+    def _load(model_type: str):
+        from transformers import pipeline
+
+        print(f"🚀 Loading STT model: {MODEL_TIERS[model_type]}...")
+        model = pipeline("automatic-speech-recognition", model=MODEL_TIERS[model_type], device=-1)
+        print(f"✅ STT model {MODEL_TIERS[model_type]} is ready!")
+        return model
+
+
+_models = ModelCache()
+
+
+def _load_clip(audio: AudioSource) -> AudioClip:
+    """Turn any supported audio source into decoded PCM"""
+    if isinstance(audio, AudioClip):
+        return audio
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            return decode_audio(f.read())
+    if isinstance(audio, (bytes, bytearray)):
+        return decode_audio(bytes(audio))
+    if isinstance(audio, io.IOBase) or hasattr(audio, "read"):
+        return decode_audio(audio.read())
+    raise TypeError(f"Unsupported audio source: {type(audio).__name__}")
+
+
+def _to_samples(clip: AudioClip):
+    """16-bit PCM to float32 samples at the Whisper sample rate"""
+    import numpy as np
+
+    samples = np.frombuffer(clip.pcm, dtype=np.int16).astype(np.float32) / 32768.0
+    if clip.sample_rate != TARGET_SAMPLE_RATE and len(samples):
+        duration = len(samples) / clip.sample_rate
+        target_length = int(duration * TARGET_SAMPLE_RATE)
+        samples = np.interp(np.linspace(0, len(samples) - 1, target_length),
+                            np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+
+def _split_chunks(samples) -> list:
+    """Split samples into overlapping chunks"""
+    chunk = int(CHUNK_SECONDS * TARGET_SAMPLE_RATE)
+    step = chunk - int(OVERLAP_SECONDS * TARGET_SAMPLE_RATE)
+    if len(samples) <= chunk:
+        return [samples]
+    return [samples[start:start + chunk] for start in range(0, len(samples) - int(OVERLAP_SECONDS * TARGET_SAMPLE_RATE), step)]
+
+
+def _merge_overlap(left: str, right: str, max_words: int = 12) -> str:
+    """
+    Join two chunk transcripts, dropping the words repeated in the overlap
+    (the longest suffix of the left transcript that is a prefix of the right one).
+    """
+    left_words, right_words = left.split(), right.split()
+    for size in range(min(max_words, len(left_words), len(right_words)), 0, -1):
+        if left_words[-size:] == right_words[:size]:
+            right_words = right_words[size:]
+            break
+    return " ".join(left_words + right_words)
+
+
+def convert_speech_to_text(audio: AudioSource, model_type: str = "base", language: Optional[str] = None) -> str:
+    """
+    Transcribe speech with a locally cached Whisper model.
+
+    Args:
+        audio: File path, raw bytes, a binary file object or a decoded AudioClip
+        model_type (str): "fast", "base" (default), "small" or "medium"
+        language (str, optional): Language code ("ar", "he", "en"...). Auto-detected if None.
+
+    Returns:
+        str: The transcribed text
+
+    Raises:
+        ValueError: If the model type is unknown or the audio cannot be decoded
+    """
+    model = _models.get(model_type)
+    samples = _to_samples(_load_clip(audio))
+    if not len(samples):
+        return ""
+
+    generate_kwargs = {"task": "transcribe"}
+    if language:
+        generate_kwargs["language"] = LANGUAGE_NAMES.get(language, language)
+
+    inputs = [{"raw": chunk, "sampling_rate": TARGET_SAMPLE_RATE} for chunk in _split_chunks(samples)]
+    with _models.call_lock(model_type):
+        results = model(inputs, batch_size=CHUNK_BATCH_SIZE, generate_kwargs=generate_kwargs)
+
+    texts = [result["text"].strip() for result in results]
+    transcript = texts[0]
+    for text in texts[1:]:
+        transcript = _merge_overlap(transcript, text)
+    return transcript
+
+
+class WhisperRecognizer(Recognizer):
+    """
+    Recognizer backed by the local Whisper engine, for /stt and /stt/stream.
+    """
+
+    name = "whisper"
+
+    def __init__(self, model_type: Optional[str] = None):
+        self.model_type = model_type or os.environ.get("STT_WHISPER_MODEL", "base")
+
+    def recognize(self, clip: AudioClip, language: str = "ar") -> str:
+        return convert_speech_to_text(clip, model_type=self.model_type, language=language)
+
+
+def benchmark_real_time_factor(audio_path: Optional[str] = None, tiers: Optional[List[str]] = None,
+                               seconds: float = 60.0) -> dict:
+    """
+    Measure the real-time factor (processing time / audio duration) of each tier on CPU.
+    The first call per tier loads the model and is reported separately.
+
+    Args:
+        audio_path (str, optional): Recording to transcribe. A synthetic tone is used if None.
+        tiers (List[str], optional): Tiers to benchmark (default: all)
+        seconds (float): Length of the synthetic recording
+
+    Returns:
+        dict: {tier: real-time factor}
+    """
+    if audio_path:
+        clip = _load_clip(audio_path)
+    else:
+        import numpy as np
+        t = np.arange(int(seconds * TARGET_SAMPLE_RATE)) / TARGET_SAMPLE_RATE
+        tone = (0.2 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+        clip = AudioClip(tone.tobytes(), TARGET_SAMPLE_RATE)
+
+    results = {}
+    for tier in tiers or list(MODEL_TIERS):
+        start = time.perf_counter()
+        _models.get(tier)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        convert_speech_to_text(clip, model_type=tier)
+        elapsed = time.perf_counter() - start
+
+        results[tier] = elapsed / clip.duration
+        print(f"⏱️ {tier:<7} load {load_time:6.1f}s  RTF {results[tier]:.3f}  ({clip.duration:.0f}s audio)")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_real_time_factor()
@@ -21,9 +21,10 @@ Example usage:
     )
 """
 
-from gtts import gTTS
 from typing import Optional
-from playsound3 import playsound
+
+from services.TTS.cache import audio_cache
+from services.TTS.gtts_backend import gtts_backend
 
 
 # Configure minimal logging
@@ -83,10 +84,11 @@ class TextToSpeechConverter:
             print("[1/3] Starting offline text-to-speech conversion...")
             print(f"[2/3] Converting text to speech (language: {language})...")
             
-            tts = gTTS(text=text, lang=language, slow=slow)
+            audio = self.convert_text_to_speech_bytes(text, language=language, slow=slow)
             
             print(f"[3/3] Saving audio file to {output_file}...")
-            tts.save(output_file)
+            with open(output_file, "wb") as f:
+                f.write(audio)
             
             print(f"✓ Offline TTS completed successfully! File saved to {output_file}")
             return output_file
@@ -96,7 +98,31 @@ class TextToSpeechConverter:
             raise
 
 
+    def convert_text_to_speech_bytes(self, text: str, language: str = DEFAULT_LANGUAGE,
+                                     slow: bool = False) -> bytes:
+        """
+        Convert text to MP3 bytes in memory, going through the shared audio cache.
+        Text pieces are fetched in parallel over pooled connections.
+
+        Args:
+            text (str): The text to convert to speech
+            language (str): The language code (default: "en" for English)
+            slow (bool): If True, speaks more slowly (default: False)
+
+        Returns:
+            bytes: The MP3 audio
+        """
+        key = audio_cache.key("gtts", text, lang=language, slow=slow)
+        data = audio_cache.get(key)
+        if data is None:
+            data = gtts_backend.synthesize(text, language=language, slow=slow)
+            audio_cache.put(key, data)
+        return data
+
+
     def exelarate(self, sample_text_arabic):
+        from playsound3 import playsound  # local playback only, not needed by the server
+
         output_file_arabic = "arabic_output.mp3"
         print(f"Converting Arabic sample text to speech...")
         result_path = self.convert_text_to_speech_offline(
@@ -15,22 +15,26 @@ Example usage:
     print(text)
 """
 
-from speech_to_text import convert_speech_to_text
+from services.TTS.speech_to_text import convert_speech_to_text, AudioSource
 from typing import Optional
 
 
-def transcribe_audio_to_text(audio_file_path: str, model_type: str = "base") -> str:
+def transcribe_audio_to_text(audio_file_path: AudioSource, model_type: str = "base",
+                             language: Optional[str] = None) -> str:
     """
     Convert an audio file to text using speech recognition.
     A convenient wrapper around the speech_to_text conversion function.
+    Models are loaded once per tier and stay resident between calls.
 
     Args:
-        audio_file_path (str): Path to your audio file (supports mp3, wav, m4a, etc.)
+        audio_file_path: Path to your audio file (supports mp3, wav, m4a, etc.),
+            or the audio itself as bytes or a binary file object
         model_type (str): Which model to use for transcription:
             - "fast": Quick transcription, good for most cases
             - "base" (default): Better accuracy, but slower
             - "small": High accuracy, even slower
             - "medium": Best accuracy, slowest
+        language (str, optional): Language code such as "ar". Auto-detected if None.
 
     Returns:
         str: The transcribed text from your audio file
@@ -44,8 +48,11 @@ def transcribe_audio_to_text(audio_file_path: str, model_type: str = "base") ->
         
         # Using the most accurate model
         text = transcribe_audio_to_text("important_interview.mp3", "medium")
+
+        # From an in-memory upload
+        text = transcribe_audio_to_text(uploaded_bytes, "fast", language="ar")
     """
-    return convert_speech_to_text(audio_file_path, model_type=model_type.lower())
+    return convert_speech_to_text(audio_file_path, model_type=model_type.lower(), language=language)
 
 
 # def text_to_audio(text, output_file="output.mp3", slow=False):
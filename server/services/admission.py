@@ -0,0 +1,98 @@
+"""
+Admission Control - Per-Endpoint In-Flight Caps and Deadlines
+
+When Gemini slows down, requests to the LLM endpoints would otherwise pile
+up without bound. Each endpoint gets:
+    - a cap on requests in flight; further requests are shed at once
+    - a deadline; LLM calls that cannot start in time are shed by the
+      scheduler (services.LLM.scheduler.LLMOverloaded)
+
+Clients can shorten (never extend) the deadline with an X-Deadline-Ms header.
+Shed requests get 503 with Retry-After. Counters: shed.<path>, admitted.<path>;
+gauges: in_flight.<path>.
+
+Example usage:
+    from services.admission import admission
+
+    if not admission.try_enter(path):
+        return overloaded_response(...)
+    try:
+        ...
+    finally:
+        admission.leave(path)
+"""
+
+import threading
+from typing import Dict, Optional
+
+from services.metrics import metrics
+
+# Path -> (max requests in flight, deadline in seconds)
+ENDPOINT_LIMITS = {
+    "/api": (16, 45.0),
+    "/explain-word": (64, 10.0),
+    "/arabic-speech-continue-conversation": (32, 15.0),
+    "/arabic-speech-explanation": (32, 30.0),
+    "/translate": (32, 30.0),
+}
+
+# Retry-After for requests shed by the in-flight cap
+CAP_RETRY_AFTER_S = 2
+
+
+class EndpointAdmission:
+    """
+    In-flight counters per endpoint. Thread safe.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None):
+        self.limits = limits or ENDPOINT_LIMITS
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {}
+
+    def controls(self, path: str) -> bool:
+        """True for endpoints under admission control"""
+        return path in self.limits
+
+    def deadline_s(self, path: str, requested_ms: Optional[str] = None) -> Optional[float]:
+        """
+        Deadline of a request in seconds.
+
+        Args:
+            path (str): Endpoint path
+            requested_ms (str, optional): X-Deadline-Ms header value
+
+        Returns:
+            float: The endpoint deadline, or the client's if shorter; None if not controlled
+        """
+        if path not in self.limits:
+            return None
+        deadline = self.limits[path][1]
+        try:
+            if requested_ms:
+                deadline = min(deadline, max(0.0, float(requested_ms) / 1000))
+        except ValueError:
+            pass
+        return deadline
+
+    def try_enter(self, path: str) -> bool:
+        """Count a request in, or refuse it (and count it as shed) when the endpoint is at its cap"""
+        with self._lock:
+            in_flight = self._in_flight.get(path, 0)
+            admitted = in_flight < self.limits[path][0]
+            if admitted:
+                self._in_flight[path] = in_flight = in_flight + 1
+        metrics.increment(f"{'admitted' if admitted else 'shed'}.{path}")
+        metrics.set_gauge(f"in_flight.{path}", in_flight)
+        return admitted
+
+    def leave(self, path: str) -> None:
+        """Count a finished request out"""
+        with self._lock:
+            self._in_flight[path] -= 1
+            in_flight = self._in_flight[path]
+        metrics.set_gauge(f"in_flight.{path}", in_flight)
+
+
+# Shared admission control
+admission = EndpointAdmission()
@@ -0,0 +1,198 @@
+"""
+Lesson Annotations - Word Explanations Resolved in Bulk Before the Learner Clicks
+
+A generated lesson is mostly words the learner will click. Instead of one
+/explain-word round trip per click, the lesson's Arabic segments are split
+into words right after generation and every distinct word is resolved at once:
+
+    1. the shared lexicon (services.NLP.lexicon), a memory lookup
+    2. the local morphology engine (services.NLP.morphology), microseconds
+    3. whatever is left goes to Gemini in combined calls of ANNOTATION_BATCH_WORDS
+       words, in the background, after the lesson has been answered
+
+The result is a compact index sent along with the lesson:
+
+    {
+        "id": "3f2a...",                 # fetch the finished index with GET /annotations/<id>
+        "tokens": [["كتاب", "جميل"], None, ...],   # per segment, the word key of each
+                                         # whitespace-separated token (None: not a word / not Arabic)
+        "words": {"كتاب": {"meaning", "root", "stem", "singular", "plural"}, ...},
+        "pending": ["جميل"],             # keys still being asked from Gemini
+    }
+
+Indexes live in the shared state backend (services.state), so the follow-up
+fetch works on any worker. The id is derived from the lesson's words, so a
+lesson served again (e.g. from the LLM cache) reuses its index.
+
+Example usage:
+    from services.annotations import annotations
+
+    index = await annotations.annotate(extract_tagged_text(output), dialog.explain_words)
+    ...
+    index = annotations.get(index["id"])
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from services.LLM.scheduler import BACKGROUND, scheduling, set_deadline
+from services.metrics import metrics
+from services.NLP.lexicon import lexicon
+from services.NLP.morphology import morphology
+from services.NLP.normalize import normalize_word, strip_diacritics
+from services.state import StateBackend, state
+
+ANNOTATION_NAMESPACE = "annotations"
+ANNOTATION_TTL_S = float(os.environ.get("ANNOTATION_TTL_S", str(24 * 60 * 60)))
+# Words per combined Gemini call
+ANNOTATION_BATCH_WORDS = int(os.environ.get("ANNOTATION_BATCH_WORDS", "25"))
+
+# Receives surface words, returns {word as given: explain_word result} for the words it could explain
+ExplainWords = Callable[[List[str]], Awaitable[Dict[str, dict]]]
+
+
+def _tokens(segments: List[Tuple[str, str]]) -> Tuple[List[Optional[List[Optional[str]]]], Dict[str, str]]:
+    # Word keys of each Arabic segment, and the first spelling seen of each key
+    tokens = []
+    surfaces: Dict[str, str] = {}
+    for content, language in segments:
+        if language != "Arabic":
+            tokens.append(None)
+            continue
+        keys = []
+        for token in content.split():
+            key = normalize_word(token)
+            if key and not key.isascii():
+                # Letters as written, without harakat and attached punctuation
+                surfaces.setdefault(key, "".join(c for c in strip_diacritics(token) if c.isalpha()))
+                keys.append(key)
+            else:
+                keys.append(None)
+        tokens.append(keys)
+    return tokens, surfaces
+
+
+def _resolve(word: str) -> Tuple[Optional[dict], str]:
+    # Local answer for one word and where it came from
+    entry = lexicon.get(word)
+    if entry and entry.get("analysis"):
+        return entry["analysis"], "lexicon"
+    analysis = morphology.explain(word)
+    if analysis is not None:
+        return analysis, "morphology"
+    return None, "unresolved"
+
+
+class LessonAnnotator:
+    """
+    Builds word annotation indexes for lessons and finishes them in the background.
+    """
+
+    def __init__(self, backend: StateBackend = state, ttl_s: float = ANNOTATION_TTL_S,
+                 batch_words: int = ANNOTATION_BATCH_WORDS):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.batch_words = batch_words
+        # Background tasks, referenced so they are not garbage collected mid-run
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def annotate(self, segments: List[Tuple[str, str]], explain_words: Optional[ExplainWords] = None) -> dict:
+        """
+        Annotation index of a lesson. Words are resolved locally; unresolved
+        ones are listed as pending and, when explain_words is given, asked
+        from Gemini in the background. Store access and local resolution run
+        in a worker thread; only the background task is started on the event loop.
+
+        Args:
+            segments (list): extract_tagged_text result, (content, language) pairs
+            explain_words (callable, optional): Batch explainer for the unresolved words
+
+        Returns:
+            dict: {"id", "tokens", "words", "pending"}
+        """
+        start = time.perf_counter()
+        index, unresolved = await asyncio.to_thread(self._build, segments, explain_words is not None)
+        metrics.observe("annotation_ms", (time.perf_counter() - start) * 1000)
+
+        if unresolved and explain_words is not None:
+            task = asyncio.get_running_loop().create_task(self._complete(index["id"], unresolved, explain_words))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return index
+
+    def _build(self, segments: List[Tuple[str, str]], completing: bool) -> Tuple[dict, Dict[str, str]]:
+        # Blocking part of annotate(): the stored index if any, else a new one and its unresolved words
+        tokens, surfaces = _tokens(segments)
+        annotation_id = hashlib.sha256(json.dumps(sorted(surfaces), ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+        known = self.backend.get(ANNOTATION_NAMESPACE, annotation_id)
+        if known is not None:
+            # Finished, or still being completed by the task that built it
+            metrics.increment("annotation_reused")
+            return {**known, "tokens": tokens}, {}
+
+        words: Dict[str, dict] = {}
+        unresolved: Dict[str, str] = {}
+        for key, surface in surfaces.items():
+            result, source = _resolve(surface)
+            metrics.increment(f"annotation_words.{source}")
+            if result is not None:
+                words[key] = result
+            else:
+                unresolved[key] = surface
+
+        index = {"id": annotation_id, "tokens": tokens, "words": words,
+                 "pending": list(unresolved) if completing else []}
+        self.backend.set(ANNOTATION_NAMESPACE, annotation_id, index, ttl_s=self.ttl_s)
+        return index, unresolved
+
+    def get(self, annotation_id: str) -> Optional[dict]:
+        """
+        Current state of an annotation index.
+
+        Args:
+            annotation_id (str): The "id" of an annotate() result
+
+        Returns:
+            dict: The index ("pending" is empty once complete), or None if unknown or expired
+        """
+        return self.backend.get(ANNOTATION_NAMESPACE, annotation_id)
+
+    def _merge(self, annotation_id: str, batch: List[str], results: Dict[str, dict]) -> None:
+        # Add a finished batch; words Gemini did not explain leave "pending" as well
+        def merge(index: Optional[dict]) -> Optional[dict]:
+            if index is None:
+                return None
+            index["words"].update(results)
+            index["pending"] = [key for key in index["pending"] if key not in batch]
+            return index
+
+        self.backend.update(ANNOTATION_NAMESPACE, annotation_id, merge, default=None, ttl_s=self.ttl_s)
+
+    async def _complete(self, annotation_id: str, unresolved: Dict[str, str], explain_words: ExplainWords) -> None:
+        # Not bound to the request that started it: no deadline, background priority
+        set_deadline(None)
+        keys = list(unresolved)
+        with scheduling(priority=BACKGROUND, session="annotations"):
+            for i in range(0, len(keys), self.batch_words):
+                batch = keys[i:i + self.batch_words]
+                results: Dict[str, dict] = {}
+                try:
+                    explained = await explain_words([unresolved[key] for key in batch])
+                    for word, result in explained.items():
+                        key = normalize_word(word)
+                        if key in unresolved:
+                            results[key] = result
+                    metrics.increment("annotation_words.llm", len(results))
+                except Exception as e:
+                    metrics.increment("annotation_batch_failures")
+                    print(f"⚠️ Annotation batch failed: {e}")
+                await asyncio.to_thread(self._merge, annotation_id, batch, results)
+
+
+# Shared annotator
+annotations = LessonAnnotator()
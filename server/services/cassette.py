@@ -0,0 +1,275 @@
+"""
+Record/Replay Cassettes for Upstream Calls (Gemini, Edge TTS, gTTS)
+
+Profiling and regression-testing the server needs real model output, with
+real Hebrew/Arabic lengths, real formatting failures and real latencies,
+without depending on the network. Upstream calls go through this module:
+
+    - record: the call is made and its request, response (or error) and
+      latency are appended to the cassette right away, so several worker
+      processes can record to the same file. Recording adds to an existing
+      cassette; delete it to start over. Streaming calls record the arrival
+      time of every chunk.
+    - replay: the recorded response is served, after the recorded latency
+      multiplied by the latency scale (0 replays instantly). Nothing is
+      imported from the SDKs and no network is used. A request that
+      was recorded several times (e.g. generate_bilingual_content retries)
+      replays its responses in recorded order, then starts over.
+    - off (default): calls go straight upstream.
+
+Cassettes are gzip-compressed JSON lines, one record per call. Every record
+is its own gzip member, written with a single append, so records of
+concurrent writers never interleave. Binary data (audio) is stored base64
+encoded.
+
+Configuration (environment):
+    CASSETTE_MODE            off | record | replay
+    CASSETTE_PATH            cassette file (default: cassettes/session.jsonl.gz)
+    CASSETTE_LATENCY_SCALE   replay latency multiplier (default: 1.0)
+
+When replaying, point LLM_CACHE_PATH and TTS_CACHE_DIR at empty locations,
+otherwise cached answers and audio are served before the cassette is asked.
+
+Usage (from the server folder):
+    CASSETTE_MODE=record CASSETTE_PATH=class.jsonl.gz uvicorn server:app
+    CASSETTE_MODE=replay CASSETTE_PATH=class.jsonl.gz CASSETTE_LATENCY_SCALE=0.5 uvicorn server:app
+    python -m services.cassette class.jsonl.gz          # summary of a cassette
+"""
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+CASSETTE_MODE = os.environ.get("CASSETTE_MODE", MODE_OFF)
+CASSETTE_PATH = os.environ.get("CASSETTE_PATH", os.path.join("cassettes", "session.jsonl.gz"))
+CASSETTE_LATENCY_SCALE = float(os.environ.get("CASSETTE_LATENCY_SCALE", "1.0"))
+
+
+class CassetteMiss(KeyError):
+    """Replay mode got a request that is not on the cassette"""
+
+
+class ReplayedError(Exception):
+    """An upstream error that was recorded and is now replayed"""
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {"__b64__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {"__b64__"}:
+            return base64.b64decode(value["__b64__"])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+class Cassette:
+    """
+    One cassette file in one mode. Thread safe.
+    """
+
+    def __init__(self, path: str = CASSETTE_PATH, mode: str = CASSETTE_MODE,
+                 latency_scale: float = CASSETTE_LATENCY_SCALE):
+        if mode not in (MODE_OFF, MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Invalid cassette mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._replay: Dict[str, List[dict]] = {}
+        self._positions: Dict[str, int] = {}
+
+        if mode == MODE_REPLAY:
+            for record in read_cassette(path):
+                self._replay.setdefault(record["key"], []).append(record)
+            print(f"📼 Replaying {sum(map(len, self._replay.values()))} calls from {path}")
+        elif mode == MODE_RECORD:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == MODE_REPLAY
+
+    @staticmethod
+    def key(kind: str, request: dict) -> str:
+        """Hash identifying a request"""
+        payload = json.dumps({"kind": kind, "request": _encode(request)}, ensure_ascii=False,
+                             sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _append(self, kind: str, request: dict, latency_ms: float, **fields) -> None:
+        record = {"kind": kind, "key": self.key(kind, request), "request": _encode(request),
+                  "latency_ms": round(latency_ms, 1), **fields}
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        # One complete gzip member per O_APPEND write: other threads and processes cannot interleave with it
+        data = gzip.compress(line.encode("utf-8"))
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _next(self, kind: str, request: dict) -> dict:
+        key = self.key(kind, request)
+        with self._lock:
+            records = self._replay.get(key)
+            if not records:
+                raise CassetteMiss(f"No recorded {kind} call for {json.dumps(request, ensure_ascii=False)[:200]}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+        return records[position % len(records)]
+
+    def _result(self, record: dict):
+        if "error" in record:
+            raise ReplayedError(record["error"])
+        return _decode(record["response"])
+
+    async def call(self, kind: str, request: dict, upstream: Callable[[], Awaitable]):
+        """
+        Run (or replay) one upstream call.
+
+        Args:
+            kind (str): Call family, e.g. "llm", "gtts"
+            request (dict): JSON-serializable description of the request (bytes allowed)
+            upstream (Callable): Coroutine function making the real call
+
+        Returns:
+            The upstream result
+        """
+        if self.mode == MODE_REPLAY:
+            record = self._next(kind, request)
+            await asyncio.sleep(record["latency_ms"] * self.latency_scale / 1000)
+            return self._result(record)
+
+        start = time.perf_counter()
+        try:
+            result = await upstream()
+        except Exception as e:
+            if self.mode == MODE_RECORD:
+                self._append(kind, request, (time.perf_counter() - start) * 1000, error=f"{type(e).__name__}: {e}")
+            raise
+        if self.mode == MODE_RECORD:
+            self._append(kind, request, (time.perf_counter() - start) * 1000, response=_encode(result))
+        return result
+
+    def call_sync(self, kind: str, request: dict, upstream: Callable[[], object]):
+        """Blocking call(); see call for the arguments"""
+        if self.mode == MODE_REPLAY:
+            record = self._next(kind, request)
+            time.sleep(record["latency_ms"] * self.latency_scale / 1000)
+            return self._result(record)
+
+        start = time.perf_counter()
+        try:
+            result = upstream()
+        except Exception as e:
+            if self.mode == MODE_RECORD:
+                self._append(kind, request, (time.perf_counter() - start) * 1000, error=f"{type(e).__name__}: {e}")
+            raise
+        if self.mode == MODE_RECORD:
+            self._append(kind, request, (time.perf_counter() - start) * 1000, response=_encode(result))
+        return result
+
+    async def stream(self, kind: str, request: dict, upstream: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """
+        Run (or replay) a streaming upstream call, keeping the arrival time of every item.
+        Streams that are abandoned before the end are not recorded.
+
+        Args:
+            kind (str): Call family, e.g. "edge"
+            request (dict): JSON-serializable description of the request
+            upstream (Callable): Function returning the real async iterator
+
+        Yields:
+            The upstream items
+        """
+        if self.mode == MODE_REPLAY:
+            record = self._next(kind, request)
+            start = time.perf_counter()
+            for offset_ms, item in record.get("events", []):
+                delay = offset_ms * self.latency_scale / 1000 - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield _decode(item)
+            if "error" in record:
+                raise ReplayedError(record["error"])
+            return
+
+        start = time.perf_counter()
+        events = []
+        try:
+            async for item in upstream():
+                if self.mode == MODE_RECORD:
+                    events.append([round((time.perf_counter() - start) * 1000, 1), _encode(item)])
+                yield item
+        except Exception as e:
+            if self.mode == MODE_RECORD:
+                self._append(kind, request, (time.perf_counter() - start) * 1000, events=events,
+                             error=f"{type(e).__name__}: {e}")
+            raise
+        if self.mode == MODE_RECORD:
+            self._append(kind, request, (time.perf_counter() - start) * 1000, events=events)
+
+def read_cassette(path: str) -> List[dict]:
+    """All records of a cassette file, in recorded order"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(path: str) -> dict:
+    """
+    Per kind (and LLM task) call counts, errors and latency percentiles of a cassette.
+
+    Returns:
+        dict: {name: {"calls", "errors", "p50_ms", "p95_ms"}}
+    """
+    groups: Dict[str, List[dict]] = {}
+    for record in read_cassette(path):
+        name = record["kind"]
+        if name == "llm":
+            name += "." + str(record["request"].get("task"))
+        groups.setdefault(name, []).append(record)
+
+    summary = {}
+    for name, records in sorted(groups.items()):
+        latencies = sorted(record["latency_ms"] for record in records)
+        summary[name] = {
+            "calls": len(records),
+            "errors": sum("error" in record for record in records),
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        }
+        print(f"📼 {name:<40} {summary[name]['calls']:>5} calls, {summary[name]['errors']:>3} errors, "
+              f"p50 {summary[name]['p50_ms']:.0f} ms, p95 {summary[name]['p95_ms']:.0f} ms")
+    return summary
+
+
+# Shared cassette, configured from the environment
+cassette = Cassette()
+
+
+if __name__ == "__main__":
+    summarize(sys.argv[1] if len(sys.argv) > 1 else CASSETTE_PATH)
@@ -0,0 +1,74 @@
+"""
+Client Disconnect Detection - Stop Working for Clients That Have Left
+
+Learners often navigate away while a lesson or translation is still being
+generated. Without this, the server kept paying for the Gemini call (and
+its retries) and any synthesis for a response nobody would read.
+
+cancel_on_disconnect runs a handler's work as a task and watches the
+connection. If the client disconnects first, the task is cancelled. The
+cancellation then reaches everything the task is awaiting:
+    - queued LLM calls leave the scheduler queue without using quota
+    - in-flight Gemini calls are cancelled
+    - generate_bilingual_content retries stop
+    - Edge TTS streams abort without caching partial audio
+    - offline TTS jobs are skipped by the workers
+
+Counters: disconnects.<path>.
+
+Example usage:
+    output = await cancel_on_disconnect(request, teacher.generate_bilingual_content(prompt))
+"""
+
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import Request
+
+from services.metrics import metrics
+
+T = TypeVar("T")
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready"""
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # After the body has been read, the only message left is http.disconnect.
+    # Waiting for it (instead of polling is_disconnected) also works behind
+    # BaseHTTPMiddleware, whose receive never answers a non-blocking poll.
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Await work, cancelling it if the client disconnects first.
+    Call only after the request body has been read (FastAPI handlers with a body parameter).
+
+    Args:
+        request (Request): The current request
+        work (Awaitable): The handler's work, e.g. a coroutine
+
+    Returns:
+        The result of work
+
+    Raises:
+        ClientDisconnected: If the client disconnected and the work was cancelled
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        metrics.increment(f"disconnects.{request.url.path}")
+        raise ClientDisconnected(request.url.path)
+    finally:
+        # Also covers the handler itself being cancelled (e.g. server shutdown)
+        for pending in (task, watcher):
+            if not pending.done():
+                pending.cancel()
@@ -0,0 +1,322 @@
+"""
+Batch Jobs - Bulk Translation and Explanation Without Holding a Connection Open
+
+A teacher uploading a set of dialogues submits them as one job and gets a
+job id back at once. A background worker in every server process picks up
+queued jobs and works through their items: identical items are done once,
+and the rest go to the job kind's batch processor JOB_BATCH_ITEMS at a time
+(for translations and explanations, one combined Gemini call per batch
+after the LLM cache has answered what it can), at background priority.
+
+Jobs live in the shared state backend (services.state) as three kinds of
+records, so saving a batch or polling progress never rewrites or decodes the
+items and results of the whole job:
+
+    jobs           {"id", "kind", "items": [...]}            written once
+    jobs.progress  {"id", "kind", "status": "queued" | "running" | "done",
+                    "total", "completed", "failed",          # item counts
+                    "created", "updated",
+                    "owner", "lease_until", "failures": {index: attempts}}
+    jobs.results   one record per finished item, key "<job id>:<index>"
+
+A worker holds a job under a lease it renews after each batch; when the
+process stops, the lease runs out and any worker resumes the job from its
+last saved batch. A worker that lost its lease stops without writing
+progress. A batch that fails as a whole is split in halves until the failing
+items are alone, so one bad item does not fail the others. Items that fail
+JOB_ITEM_RETRIES times are reported as failed; the rest of the job still
+completes.
+
+Example usage:
+    from services.jobs import jobs
+
+    jobs.register("translate", lambda items: Dialog().translate_conversations(items))
+    jobs.start()
+    job = jobs.submit("translate", [["مرحبا", "أهلا"], ...])
+    ...
+    jobs.progress(job["id"])   # counts and status, without items and results
+"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from services.LLM.scheduler import BACKGROUND, scheduling
+from services.metrics import metrics
+from services.state import StateBackend, state
+
+JOB_NAMESPACE = "jobs"
+# Status, counts and lease of each job, updated after every batch
+JOB_PROGRESS_NAMESPACE = "jobs.progress"
+# One record per finished item
+JOB_RESULTS_NAMESPACE = "jobs.results"
+# Ids of unfinished jobs, so idle workers do not read every job record
+OPEN_JOBS_NAMESPACE = "jobs.open"
+# Finished or abandoned jobs are forgotten this long after their last update
+JOB_TTL_S = float(os.environ.get("JOB_TTL_S", str(7 * 24 * 60 * 60)))
+JOB_BATCH_ITEMS = int(os.environ.get("JOB_BATCH_ITEMS", "8"))
+JOB_MAX_ITEMS = int(os.environ.get("JOB_MAX_ITEMS", "1000"))
+JOB_ITEM_RETRIES = 3
+# A worker that has not renewed its lease for this long is presumed gone
+JOB_LEASE_S = 120.0
+# Idle workers look for new jobs this often
+JOB_POLL_S = 1.0
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+
+# Receives a batch of items, returns one result per item (None: not obtained, retried later)
+BatchProcessor = Callable[[List[Any]], Awaitable[List[Optional[Any]]]]
+
+
+def _progress(record: dict) -> dict:
+    return {key: value for key, value in record.items() if key not in ("failures", "owner", "lease_until")}
+
+
+def _result_key(job_id: str, index: int) -> str:
+    return f"{job_id}:{index}"
+
+
+class JobQueue:
+    """
+    Persistent batch job queue with one worker loop per process.
+    """
+
+    def __init__(self, backend: StateBackend = state, batch_items: int = JOB_BATCH_ITEMS,
+                 ttl_s: float = JOB_TTL_S, lease_s: float = JOB_LEASE_S):
+        self.backend = backend
+        self.batch_items = batch_items
+        self.ttl_s = ttl_s
+        self.lease_s = lease_s
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._processors: Dict[str, BatchProcessor] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, kind: str, processor: BatchProcessor) -> None:
+        """
+        Set the batch processor of a job kind.
+
+        Args:
+            kind (str): Job kind, e.g. "translate"
+            processor (BatchProcessor): Async function from a list of items to a list of results
+        """
+        self._processors[kind] = processor
+
+    def kinds(self) -> List[str]:
+        """Registered job kinds"""
+        return sorted(self._processors)
+
+    def submit(self, kind: str, items: List[Any]) -> dict:
+        """
+        Queue a job.
+
+        Args:
+            kind (str): A registered job kind
+            items (list): JSON-serializable items
+
+        Returns:
+            dict: The job's progress record
+
+        Raises:
+            ValueError: If the kind is unknown or there are no items or too many
+        """
+        if kind not in self._processors:
+            raise ValueError(f"Unknown job kind {kind!r}. Available: {self.kinds()}")
+        if not items or len(items) > JOB_MAX_ITEMS:
+            raise ValueError(f"A job needs between 1 and {JOB_MAX_ITEMS} items")
+
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        record = {
+            "id": job_id, "kind": kind, "status": STATUS_QUEUED,
+            "total": len(items), "completed": 0, "failed": 0,
+            "created": now, "updated": now, "owner": None, "lease_until": 0.0, "failures": {},
+        }
+        self.backend.set(JOB_NAMESPACE, job_id, {"id": job_id, "kind": kind, "items": list(items)}, ttl_s=self.ttl_s)
+        self.backend.set(JOB_PROGRESS_NAMESPACE, job_id, record, ttl_s=self.ttl_s)
+        self.backend.set(OPEN_JOBS_NAMESPACE, job_id, kind, ttl_s=self.ttl_s)
+        metrics.increment(f"jobs_submitted.{kind}")
+        return _progress(record)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """The full job (progress, items and results; results[i] is None until item i is done), or None if unknown or expired"""
+        record = self.backend.get(JOB_PROGRESS_NAMESPACE, job_id)
+        job = self.backend.get(JOB_NAMESPACE, job_id)
+        if record is None or job is None:
+            return None
+        return {**_progress(record), "items": job["items"], "results": self._results(job_id, len(job["items"]))}
+
+    def progress(self, job_id: str) -> Optional[dict]:
+        """Status and item counts of a job, or None if unknown or expired"""
+        record = self.backend.get(JOB_PROGRESS_NAMESPACE, job_id)
+        return _progress(record) if record is not None else None
+
+    def _results(self, job_id: str, total: int) -> List[Optional[Any]]:
+        return [self.backend.get(JOB_RESULTS_NAMESPACE, _result_key(job_id, i)) for i in range(total)]
+
+    def start(self) -> None:
+        """Start this process's worker loop (from the event loop, once)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._work())
+
+    async def stop(self) -> None:
+        """Stop the worker loop; its job is resumed from the last saved batch later"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _claim(self) -> Optional[str]:
+        # Take an unfinished job whose lease is free (or already ours); atomic across workers
+        now = time.time()
+        for job_id, kind in self.backend.items(OPEN_JOBS_NAMESPACE):
+            if kind not in self._processors:
+                continue
+            record = self.backend.get(JOB_PROGRESS_NAMESPACE, job_id)
+            if not record or record["status"] == STATUS_DONE:
+                # Expired, or finished by a worker that stopped before closing it
+                self.backend.delete(OPEN_JOBS_NAMESPACE, job_id)
+                continue
+            if record["owner"] not in (None, self.owner) and record["lease_until"] > now:
+                continue
+            claimed = []
+
+            def claim(current: Optional[dict]) -> Optional[dict]:
+                if (current and current["status"] != STATUS_DONE
+                        and (current["owner"] in (None, self.owner) or current["lease_until"] <= now)):
+                    current.update(status=STATUS_RUNNING, owner=self.owner, lease_until=now + self.lease_s)
+                    claimed.append(True)
+                return current
+
+            self.backend.update(JOB_PROGRESS_NAMESPACE, job_id, claim, default=None, ttl_s=self.ttl_s)
+            if claimed:
+                return job_id
+        return None
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                # Backend calls may wait on SQLite locks: off the event loop
+                job_id = await asyncio.to_thread(self._claim)
+                if job_id is None:
+                    await asyncio.sleep(JOB_POLL_S)
+                    continue
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Job worker error: {e}")
+                await asyncio.sleep(JOB_POLL_S)
+
+    async def _process(self, job_id: str, kind: str, items: List[Any]) -> List[Optional[Any]]:
+        # A failing batch is split in halves until the failing items are alone
+        try:
+            results = list(await self._processors[kind](items))
+        except Exception as e:
+            metrics.increment(f"jobs_batch_failures.{kind}")
+            if len(items) == 1:
+                print(f"⚠️ Job {job_id} item failed: {e}")
+                return [None]
+            print(f"⚠️ Job {job_id} batch of {len(items)} failed, splitting: {e}")
+            await asyncio.sleep(JOB_POLL_S)
+            middle = len(items) // 2
+            return (await self._process(job_id, kind, items[:middle])
+                    + await self._process(job_id, kind, items[middle:]))
+        return results[:len(items)] + [None] * (len(items) - len(results))
+
+    def _save(self, job_id: str, batch: List[List[int]], results: List[Optional[Any]], done: Set[int]) -> Optional[dict]:
+        # Store a batch's results and count it in the progress record; returns the new record
+        for indexes, result in zip(batch, results):
+            if result is not None:
+                for i in indexes:
+                    self.backend.set(JOB_RESULTS_NAMESPACE, _result_key(job_id, i), result, ttl_s=self.ttl_s)
+                    done.add(i)
+
+        def save(current: Optional[dict]) -> Optional[dict]:
+            # Only the lease holder writes progress; a worker that lost the lease leaves it alone
+            if current is None or current["owner"] != self.owner:
+                return current
+            for indexes, result in zip(batch, results):
+                if result is None:
+                    for i in indexes:
+                        current["failures"][str(i)] = current["failures"].get(str(i), 0) + 1
+            current["completed"] = len(done)
+            current["failed"] = sum(int(i) not in done and attempts >= JOB_ITEM_RETRIES
+                                    for i, attempts in current["failures"].items())
+            current.update(updated=time.time(), lease_until=time.time() + self.lease_s)
+            return current
+
+        return self.backend.update(JOB_PROGRESS_NAMESPACE, job_id, save, default=None, ttl_s=self.ttl_s)
+
+    def _finish(self, job_id: str) -> bool:
+        # Mark the job done if this worker still holds it
+        finished = []
+
+        def finish(current: Optional[dict]) -> Optional[dict]:
+            if current is not None and current["owner"] == self.owner:
+                current.update(status=STATUS_DONE, owner=None, updated=time.time())
+                finished.append(True)
+            return current
+
+        self.backend.update(JOB_PROGRESS_NAMESPACE, job_id, finish, default=None, ttl_s=self.ttl_s)
+        if finished:
+            self.backend.delete(OPEN_JOBS_NAMESPACE, job_id)
+        return bool(finished)
+
+    async def _run(self, job_id: str) -> None:
+        job = await asyncio.to_thread(self.backend.get, JOB_NAMESPACE, job_id)
+        record = await asyncio.to_thread(self.backend.get, JOB_PROGRESS_NAMESPACE, job_id)
+        if job is None or record is None:
+            # Expired meanwhile
+            await asyncio.to_thread(self.backend.delete, OPEN_JOBS_NAMESPACE, job_id)
+            return
+        kind, items = job["kind"], job["items"]
+        start = time.perf_counter()
+        # Items finished by this or an earlier worker
+        results = await asyncio.to_thread(self._results, job_id, len(items))
+        done = {i for i, result in enumerate(results) if result is not None}
+
+        # Identical items are processed once; results go to every index holding the item
+        def pending(failures: Dict[str, int]) -> Dict[str, List[int]]:
+            groups: Dict[str, List[int]] = {}
+            for i, item in enumerate(items):
+                if i not in done and failures.get(str(i), 0) < JOB_ITEM_RETRIES:
+                    groups.setdefault(repr(item), []).append(i)
+            return groups
+
+        lost = False
+        with scheduling(priority=BACKGROUND, session=f"job-{job_id}"):
+            groups = pending(record["failures"])
+            while groups:
+                batch = list(groups.values())[:self.batch_items]
+                results = await self._process(job_id, kind, [items[indexes[0]] for indexes in batch])
+                record = await asyncio.to_thread(self._save, job_id, batch, results, done)
+                if record is None:
+                    # Expired or deleted meanwhile
+                    await asyncio.to_thread(self.backend.delete, OPEN_JOBS_NAMESPACE, job_id)
+                    return
+                if record["owner"] != self.owner:
+                    lost = True
+                    break
+                groups = pending(record["failures"])
+
+        if lost:
+            print(f"⚠️ Job {job_id} lease lost to {record['owner']}")
+            metrics.increment(f"jobs_lease_lost.{kind}")
+            return
+
+        if not await asyncio.to_thread(self._finish, job_id):
+            return
+        metrics.increment(f"jobs_done.{kind}")
+        metrics.observe(f"job_ms.{kind}", (time.perf_counter() - start) * 1000)
+
+
+# Shared job queue
+jobs = JobQueue()
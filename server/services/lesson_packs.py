@@ -0,0 +1,313 @@
+"""
+Lesson Packs - Curriculum Lessons Generated Offline and Served from a Content Store
+
+Generating a lesson costs the learner several seconds of Gemini time. For
+the topics of the curriculum the lessons are generated ahead of time
+instead: this command reads a list of topics and levels, generates each
+pack with BilingualContentGenerator (concurrently, at background priority
+under the shared LLM rate limiter), validates it with extract_tagged_text,
+optionally pre-synthesizes its audio sprite (services.TTS.lesson_audio), and
+writes it to the lesson store.
+
+The store is a SQLite database indexed by (topic key, level), where the
+topic key is the topic in normalize_key form. /api looks the learner's input
+up there first and answers a stored topic without calling Gemini.
+
+Topics files:
+    - .txt: one topic per line, generated for every --levels level
+    - .csv: a "topic" column (or the first column), optional "level" column
+
+Packs already in the store are skipped, so an interrupted run resumes where
+it stopped.
+
+Usage (from the server folder):
+    python -m services.lesson_packs topics.txt --levels beginner,intermediate --variants 2
+    python -m services.lesson_packs curriculum.csv --concurrency 8 --audio
+
+Example usage:
+    from services.lesson_packs import lesson_store
+
+    pack = lesson_store.find("ברכות ונימוסים", level="beginner")   # or None
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from services.LLM.scheduler import BACKGROUND, scheduling
+from services.metrics import metrics
+from services.NLP.normalize import normalize_key
+from Yoel.model import BilingualContentGenerator
+from Yoel.parser import extract_tagged_text
+
+DEFAULT_STORE_PATH = os.environ.get("LESSON_STORE_PATH", str(Path(__file__).parent / "lesson_store" / "lessons.sqlite3"))
+
+DEFAULT_LEVEL = "beginner"
+
+# Prompt of one pack; the learner's own /api input is the topic alone
+PACK_PROMPT = "{topic}\n\nרמת הלומד: {level}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packs (
+    topic_key TEXT NOT NULL,
+    level TEXT NOT NULL,
+    variant INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    output TEXT NOT NULL,
+    segments TEXT NOT NULL,
+    audio TEXT,
+    created REAL NOT NULL,
+    PRIMARY KEY (topic_key, level, variant)
+);
+"""
+
+# (topic, level)
+Topic = Tuple[str, str]
+
+
+class LessonStore:
+    """
+    SQLite-backed store of generated lesson packs. Thread safe; share one instance per process.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def _decode(row) -> dict:
+        topic, level, variant, output, segments, audio = row
+        return {"topic": topic, "level": level, "variant": variant, "output": output,
+                "segments": json.loads(segments), "audio": json.loads(audio) if audio else None}
+
+    def find(self, topic: str, level: Optional[str] = None) -> Optional[dict]:
+        """
+        A stored pack for a topic (a random one of its variants).
+
+        Args:
+            topic (str): Topic as the learner wrote it (normalized here)
+            level (str, optional): Wanted level (default: any)
+
+        Returns:
+            dict: {"topic", "level", "variant", "output", "segments", "audio"}, or None if not stored
+        """
+        key = normalize_key(topic)
+        if not key:
+            return None
+        query = "SELECT topic, level, variant, output, segments, audio FROM packs WHERE topic_key = ?"
+        parameters: tuple = (key,)
+        if level:
+            query += " AND level = ?"
+            parameters += (level,)
+        with self._lock:
+            row = self._db.execute(query + " ORDER BY RANDOM() LIMIT 1", parameters).fetchone()
+        metrics.increment("lesson_store_hits" if row is not None else "lesson_store_misses")
+        return self._decode(row) if row is not None else None
+
+    def contains(self, topic: str, level: str, variant: int = 0) -> bool:
+        """Whether a pack is stored"""
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM packs WHERE topic_key = ? AND level = ? AND variant = ?",
+                                   (normalize_key(topic), level, variant)).fetchone()
+        return row is not None
+
+    def put(self, topic: str, level: str, variant: int, output: str, segments: list,
+            audio: Optional[dict] = None) -> None:
+        """
+        Store (or replace) a pack.
+
+        Args:
+            topic (str): Topic
+            level (str): Level
+            variant (int): Variant number, for several lessons on one topic
+            output (str): Tagged generator output
+            segments (list): extract_tagged_text(output)
+            audio (dict, optional): Lesson audio timing index
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO packs (topic_key, level, variant, topic, output, segments, audio, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (normalize_key(topic), level, variant, topic, output, json.dumps(segments, ensure_ascii=False),
+                 json.dumps(audio, ensure_ascii=False) if audio is not None else None, time.time()),
+            )
+
+    def stats(self) -> dict:
+        """Pack and topic counts"""
+        with self._lock:
+            packs, topics = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT topic_key) FROM packs").fetchone()
+        return {"packs": packs, "topics": topics}
+
+
+# Shared lesson store
+lesson_store = LessonStore()
+
+
+def read_topics(paths: List[str], levels: List[str]) -> List[Topic]:
+    """
+    Read (topic, level) pairs from text and CSV files.
+
+    Args:
+        paths (List[str]): Topics files
+        levels (List[str]): Levels of topics without a level column
+
+    Returns:
+        List[Topic]: Distinct (topic, level) pairs in input order
+    """
+    topics: List[Topic] = []
+    for path in paths:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            if Path(path).suffix.lower() == ".csv":
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header is None:
+                    continue
+                lowered = [column.strip().lower() for column in header]
+                if "topic" in lowered:
+                    topic_column = lowered.index("topic")
+                    level_column = lowered.index("level") if "level" in lowered else None
+                    rows = list(reader)
+                else:
+                    # No header row: the first line is data
+                    topic_column, level_column = 0, None
+                    rows = [header] + list(reader)
+                for row in rows:
+                    if len(row) <= topic_column or not row[topic_column].strip():
+                        continue
+                    row_level = row[level_column].strip() if level_column is not None and len(row) > level_column else ""
+                    topics.extend((row[topic_column].strip(), level) for level in ([row_level] if row_level else levels))
+            else:
+                topics.extend((line.strip(), level) for line in f if line.strip() for level in levels)
+    return list(dict.fromkeys(topics))
+
+
+def _valid_segments(output: str) -> Optional[list]:
+    # A pack needs both languages, with text in every segment
+    segments = extract_tagged_text(output)
+    languages = {language for _, language in segments}
+    if {"Hebrew", "Arabic"} <= languages and all(content.strip() for content, _ in segments):
+        return [list(segment) for segment in segments]
+    return None
+
+
+async def generate_packs(topics: List[Topic], variants: int = 1, concurrency: int = 4, retries: int = 3,
+                         audio: bool = False, store: LessonStore = lesson_store, generator=None) -> dict:
+    """
+    Generate and store every pack not already in the store.
+
+    Args:
+        topics (List[Topic]): (topic, level) pairs
+        variants (int): Lessons per topic and level
+        concurrency (int): Packs generated at once (the LLM scheduler still applies the quota)
+        retries (int): Attempts per pack before it is reported as failed
+        audio (bool): Also pre-synthesize each pack's Arabic audio sprite
+        store (LessonStore): Where packs are written
+        generator (BilingualContentGenerator, optional): Defaults to a new, initialized one
+
+    Returns:
+        dict: {"done", "skipped", "failed", "attempts", "retries", "audio_failed", "seconds",
+               "packs_per_minute", "failure_rate", "retry_rate"}
+    """
+    if generator is None:
+        generator = BilingualContentGenerator()
+        generator.initialize()
+
+    jobs = [(topic, level, variant) for topic, level in topics for variant in range(variants)]
+    pending = [job for job in jobs if not store.contains(*job)]
+    stats = {"done": 0, "skipped": len(jobs) - len(pending), "failed": [], "attempts": 0, "retries": 0,
+             "audio_failed": 0}
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def run(topic: str, level: str, variant: int) -> None:
+        prompt = PACK_PROMPT.format(topic=topic, level=level)
+        async with limit:
+            segments = None
+            for attempt in range(retries):
+                stats["attempts"] += 1
+                stats["retries"] += attempt > 0
+                try:
+                    # Variants and retries need new content, not the cached answer of the same prompt
+                    output = await generator.generate_bilingual_content(
+                        prompt, max_retries=1, use_cache=variant == 0 and attempt == 0, remember=False)
+                    segments = _valid_segments(output)
+                    if segments is not None:
+                        break
+                    print(f"⚠️ Attempt {attempt + 1} for {topic!r} ({level}): missing Hebrew or Arabic segments")
+                except Exception as e:
+                    print(f"⚠️ Attempt {attempt + 1} for {topic!r} ({level}) failed: {e}")
+                if attempt < retries - 1:
+                    await asyncio.sleep(2 ** attempt)
+            if segments is None:
+                print(f"❌ Failed after {retries} attempts: {topic!r} ({level}, variant {variant})")
+                stats["failed"].append((topic, level, variant))
+                return
+
+            index = None
+            if audio:
+                from services.TTS.lesson_audio import synthesize_lesson_audio
+                try:
+                    index = await synthesize_lesson_audio([text for text, language in segments if language == "Arabic"])
+                except Exception as e:
+                    stats["audio_failed"] += 1
+                    print(f"⚠️ Audio for {topic!r} ({level}) failed: {e}")
+
+        store.put(topic, level, variant, output, segments, index)
+        stats["done"] += 1
+        if stats["done"] % 10 == 0:
+            print(f"… {stats['done']}/{len(pending)} packs")
+
+    start = time.perf_counter()
+    # Curriculum work must not hold up learners' requests
+    with scheduling(priority=BACKGROUND, session="lesson-packs"):
+        await asyncio.gather(*(run(*job) for job in pending))
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["packs_per_minute"] = stats["done"] / stats["seconds"] * 60 if stats["seconds"] else 0.0
+    stats["failure_rate"] = len(stats["failed"]) / len(pending) if pending else 0.0
+    stats["retry_rate"] = stats["retries"] / stats["attempts"] if stats["attempts"] else 0.0
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate curriculum lesson packs into the lesson store")
+    parser.add_argument("inputs", nargs="+", help="Topics files (.txt or .csv)")
+    parser.add_argument("--levels", default=DEFAULT_LEVEL, help="Comma separated levels of topics without a level")
+    parser.add_argument("--variants", type=int, default=1, help="Lessons per topic and level")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--audio", action="store_true", help="Also pre-synthesize the Arabic audio of each pack")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Lesson store database")
+    args = parser.parse_args(argv)
+
+    levels = [level.strip() for level in args.levels.split(",") if level.strip()]
+    topics = read_topics(args.inputs, levels)
+    store = lesson_store if args.store == DEFAULT_STORE_PATH else LessonStore(args.store)
+    print(f"📋 {len(topics)} topics x levels, {args.variants} variant(s) each")
+
+    stats = asyncio.run(generate_packs(topics, args.variants, args.concurrency, args.retries, args.audio, store))
+
+    print(f"✅ Generated {stats['done']} packs ({stats['skipped']} already stored) in {stats['seconds']:.1f}s: "
+          f"{stats['packs_per_minute']:.1f} packs/min, failure rate {stats['failure_rate']:.1%}, "
+          f"retry rate {stats['retry_rate']:.1%} ({stats['retries']} retries in {stats['attempts']} attempts)")
+    if stats["audio_failed"]:
+        print(f"⚠️ Audio failed for {stats['audio_failed']} packs")
+    if stats["failed"]:
+        print(f"⚠️ {len(stats['failed'])} packs failed; run again to retry them")
+    print(f"📦 Store: {store.stats()['packs']} packs, {store.stats()['topics']} topics")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+In-process metrics registry.
+
+Counters and latency samples recorded by the services, exposed as a JSON
+snapshot on the /metrics endpoint. Latency series keep a bounded window of
+recent samples so percentiles reflect current behaviour.
+
+Example usage:
+    from services.metrics import metrics
+
+    metrics.increment("tts_requests")
+    metrics.observe("tts_first_byte_ms", 182.5)
+    metrics.percentile("tts_first_byte_ms", 95)
+    metrics.snapshot()
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+
+# Number of recent samples kept per latency series
+DEFAULT_WINDOW = 2048
+
+
+class Metrics:
+    """
+    Thread-safe counters and latency series.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._series: Dict[str, Deque[float]] = {}
+        self._totals: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add value to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample (usually a latency in milliseconds)"""
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = deque(maxlen=self.window)
+            series.append(value)
+            self._totals[name] = self._totals.get(name, 0) + 1
+
+    @contextmanager
+    def timer(self, name: str):
+        """Context manager that observes the elapsed time of its block in milliseconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def counter(self, name: str) -> float:
+        """Current value of a counter (0 if never incremented)"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """
+        Percentile of the recent samples of a series.
+
+        Args:
+            name (str): Series name
+            q (float): Percentile between 0 and 100
+
+        Returns:
+            float: The percentile, or None if the series has no samples
+        """
+        with self._lock:
+            samples = sorted(self._series.get(name, ()))
+        return _percentile(samples, q)
+
+    def snapshot(self) -> dict:
+        """
+        All counters, gauges and series summaries as a JSON-ready dict.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            series = {name: sorted(samples) for name, samples in self._series.items()}
+            totals = dict(self._totals)
+
+        summaries = {}
+        for name, samples in series.items():
+            summaries[name] = {
+                "count": totals[name],
+                "mean": round(sum(samples) / len(samples), 3) if samples else None,
+                "p50": _round(_percentile(samples, 50)),
+                "p95": _round(_percentile(samples, 95)),
+                "p99": _round(_percentile(samples, 99)),
+                "max": _round(samples[-1] if samples else None),
+            }
+        return {"counters": counters, "gauges": gauges, "series": summaries}
+
+    def reset(self) -> None:
+        """Drop every recorded value"""
+        with self._lock:
+            self._counters.clear()
+            self._series.clear()
+            self._totals.clear()
+            self._gauges.clear()
+
+
+def _percentile(sorted_samples, q: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, int(round(q / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+# Shared registry used by the whole server
+metrics = Metrics()
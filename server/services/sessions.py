@@ -0,0 +1,82 @@
+"""
+Learner Sessions - Per-Session History in the Shared State Backend
+
+A session is one learner, identified by the X-Session-Id header (or the
+client address). Each session keeps named histories, e.g. the lesson inputs
+and answers the next lesson builds on, or the Gemini conversation turns of
+the dialog endpoints. Histories live in the state backend (services.state),
+so every worker sees the same session.
+
+Histories keep their last SESSION_HISTORY_LIMIT items and expire
+SESSION_TTL_S after the session's last write.
+
+Example usage:
+    from services.sessions import sessions
+
+    history = sessions.history("learner-1", "lesson")
+    ...
+    sessions.extend("learner-1", "lesson", [learner_input, answer])
+"""
+
+import os
+from typing import Any, List, Optional
+
+from services.state import StateBackend, state
+
+SESSION_NAMESPACE = "sessions"
+SESSION_TTL_S = float(os.environ.get("SESSION_TTL_S", str(24 * 60 * 60)))
+SESSION_HISTORY_LIMIT = int(os.environ.get("SESSION_HISTORY_LIMIT", "40"))
+
+
+class SessionStore:
+    """
+    Named, bounded histories per session on top of a state backend.
+    """
+
+    def __init__(self, backend: StateBackend = state, ttl_s: float = SESSION_TTL_S,
+                 history_limit: int = SESSION_HISTORY_LIMIT):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.history_limit = history_limit
+
+    @staticmethod
+    def _key(session: str, name: str) -> str:
+        return f"{session}/{name}"
+
+    def history(self, session: str, name: str) -> List[Any]:
+        """
+        Items of a session history, oldest first.
+
+        Args:
+            session (str): Session id
+            name (str): History name, e.g. "lesson"
+
+        Returns:
+            list: The items (empty for a new session)
+        """
+        return self.backend.get(SESSION_NAMESPACE, self._key(session, name), [])
+
+    def extend(self, session: str, name: str, items: List[Any], limit: Optional[int] = None) -> None:
+        """
+        Append items to a session history. Atomic across workers, so
+        concurrent requests of one session do not drop each other's items.
+
+        Args:
+            session (str): Session id
+            name (str): History name
+            items (list): JSON-serializable items
+            limit (int, optional): Items to keep (default: SESSION_HISTORY_LIMIT)
+        """
+        if not items:
+            return
+        limit = limit or self.history_limit
+        self.backend.update(SESSION_NAMESPACE, self._key(session, name),
+                            lambda history: (history + list(items))[-limit:], default=[], ttl_s=self.ttl_s)
+
+    def clear(self, session: str, name: str) -> None:
+        """Forget a session history"""
+        self.backend.delete(SESSION_NAMESPACE, self._key(session, name))
+
+
+# Shared session store
+sessions = SessionStore()
@@ -0,0 +1,450 @@
+"""
+Shared State - Pluggable Storage for State That Outlives a Request
+
+Request handlers keep no state of their own: per-learner state (lesson
+history, conversation turns) lives in a state backend, so any worker process
+can serve any request and `uvicorn --workers N` scales with the number of
+cores.
+
+Backends:
+    - memory: a dict in this process. Only for a single worker (and scripts).
+    - sqlite (default): a local SQLite database in WAL mode, shared by every
+      worker on the machine. Readers never block; writes are short
+      transactions.
+
+Values are anything JSON can encode. Keys live in namespaces (e.g.
+"sessions") and may expire. update() is an atomic read-modify-write across
+all workers, for appending to histories without losing concurrent writes.
+
+The LLM response cache (services.LLM.cache, SQLite in WAL mode) and the audio
+cache (services.TTS.cache, content-addressed files written atomically) are
+already shared by all workers and do not go through this module.
+
+Configuration (environment):
+    STATE_BACKEND   memory | sqlite
+    STATE_DB_PATH   database of the sqlite backend (default: services/state_db/state.sqlite3)
+    STATE_PURGE_INTERVAL_S  seconds between removals of expired values (default: 600)
+
+Example usage:
+    from services.state import state
+
+    state.set("sessions", "learner-1/level", "beginner", ttl_s=3600)
+    state.get("sessions", "learner-1/level")
+    state.update("sessions", "learner-1/lesson", lambda items: items + ["..."], default=[])
+
+    python -m services.state    # worker scaling benchmark (from the server folder)
+"""
+
+import abc
+import asyncio
+import copy
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BACKEND_MEMORY = "memory"
+BACKEND_SQLITE = "sqlite"
+
+STATE_BACKEND = os.environ.get("STATE_BACKEND", BACKEND_SQLITE)
+DEFAULT_STATE_PATH = os.environ.get("STATE_DB_PATH", str(Path(__file__).parent / "state_db" / "state.sqlite3"))
+
+# Wait this long for another worker's write transaction before failing
+SQLITE_BUSY_TIMEOUT_S = 5.0
+
+# Expired values are skipped on read, and removed every so often so the database does not grow forever
+STATE_PURGE_INTERVAL_S = float(os.environ.get("STATE_PURGE_INTERVAL_S", "600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires REAL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS state_expires ON state (expires);
+"""
+
+
+def _expiry(ttl_s: Optional[float]) -> Optional[float]:
+    return time.time() + ttl_s if ttl_s else None
+
+
+class StateBackend(abc.ABC):
+    """
+    Interface of the state backends. Implementations are thread safe.
+    """
+
+    name = ""
+
+    @abc.abstractmethod
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """Stored value, or default if missing or expired"""
+
+    @abc.abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        """
+        Store a value.
+
+        Args:
+            namespace (str): Namespace, e.g. "sessions"
+            key (str): Key within the namespace
+            value: JSON-serializable value
+            ttl_s (float, optional): Seconds until the value expires (None: never)
+        """
+
+    def set_many(self, namespace: str, values: Dict[str, Any], ttl_s: Optional[float] = None) -> None:
+        """Store several values of a namespace at once (one transaction where the backend has them)"""
+        for key, value in values.items():
+            self.set(namespace, key, value, ttl_s=ttl_s)
+
+    @abc.abstractmethod
+    def update(self, namespace: str, key: str, function: Callable[[Any], Any], default: Any = None,
+               ttl_s: Optional[float] = None) -> Any:
+        """
+        Atomically replace a value with function(value), across all workers.
+
+        Args:
+            namespace (str): Namespace
+            key (str): Key within the namespace
+            function (Callable): Gets the current value (or default) and returns the new one
+            default: Value passed to function when the key is missing or expired
+            ttl_s (float, optional): Time to live of the new value (None: never expires)
+
+        Returns:
+            The new value
+        """
+
+    @abc.abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        """Remove a value; returns whether it existed"""
+
+    @abc.abstractmethod
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        """All (key, value) pairs of a namespace that have not expired"""
+
+    @abc.abstractmethod
+    def purge_expired(self) -> int:
+        """Remove expired values; returns how many were removed"""
+
+
+class MemoryBackend(StateBackend):
+    """
+    State in a dict of this process. Values are copied in and out, so callers
+    cannot change stored state by mutating what they got.
+    """
+
+    name = BACKEND_MEMORY
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, str], Tuple[str, Optional[float]]] = {}
+
+    def _load(self, namespace: str, key: str, default: Any) -> Any:
+        entry = self._values.get((namespace, key))
+        if entry is None or (entry[1] is not None and entry[1] < time.time()):
+            return copy.deepcopy(default)
+        return json.loads(entry[0])
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._load(namespace, key, default)
+
+    def set(self, namespace: str, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._values[(namespace, key)] = (encoded, _expiry(ttl_s))
+
+    def set_many(self, namespace: str, values: Dict[str, Any], ttl_s: Optional[float] = None) -> None:
+        encoded = {key: json.dumps(value, ensure_ascii=False) for key, value in values.items()}
+        expires = _expiry(ttl_s)
+        with self._lock:
+            for key, value in encoded.items():
+                self._values[(namespace, key)] = (value, expires)
+
+    def update(self, namespace: str, key: str, function: Callable[[Any], Any], default: Any = None,
+               ttl_s: Optional[float] = None) -> Any:
+        with self._lock:
+            value = function(self._load(namespace, key, default))
+            self._values[(namespace, key)] = (json.dumps(value, ensure_ascii=False), _expiry(ttl_s))
+        return value
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            return self._values.pop((namespace, key), None) is not None
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [(key, json.loads(value)) for (entry_namespace, key), (value, expires) in self._values.items()
+                    if entry_namespace == namespace and (expires is None or expires >= now)]
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [item for item, (_, expires) in self._values.items() if expires is not None and expires < now]
+            for item in expired:
+                del self._values[item]
+        return len(expired)
+
+
+class SQLiteBackend(StateBackend):
+    """
+    State in a local SQLite database (WAL mode), shared by all processes
+    that open the same file. One connection per thread.
+    """
+
+    name = BACKEND_SQLITE
+
+    def __init__(self, path: str = DEFAULT_STATE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        db = self._db()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(_SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.path), timeout=SQLITE_BUSY_TIMEOUT_S, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _decode(row, default: Any) -> Any:
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return copy.deepcopy(default)
+        return json.loads(row[0])
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        row = self._db().execute("SELECT value, expires FROM state WHERE namespace = ? AND key = ?",
+                                 (namespace, key)).fetchone()
+        return self._decode(row, default)
+
+    def set(self, namespace: str, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        self._db().execute("INSERT OR REPLACE INTO state (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                           (namespace, key, json.dumps(value, ensure_ascii=False), _expiry(ttl_s)))
+
+    def set_many(self, namespace: str, values: Dict[str, Any], ttl_s: Optional[float] = None) -> None:
+        expires = _expiry(ttl_s)
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("INSERT OR REPLACE INTO state (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                           [(namespace, key, json.dumps(value, ensure_ascii=False), expires)
+                            for key, value in values.items()])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def update(self, namespace: str, key: str, function: Callable[[Any], Any], default: Any = None,
+               ttl_s: Optional[float] = None) -> Any:
+        db = self._db()
+        # IMMEDIATE takes the write lock up front, so two workers cannot both read the old value
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT value, expires FROM state WHERE namespace = ? AND key = ?",
+                             (namespace, key)).fetchone()
+            value = function(self._decode(row, default))
+            db.execute("INSERT OR REPLACE INTO state (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                       (namespace, key, json.dumps(value, ensure_ascii=False), _expiry(ttl_s)))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return value
+
+    def delete(self, namespace: str, key: str) -> bool:
+        cursor = self._db().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+        return cursor.rowcount > 0
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        rows = self._db().execute("SELECT key, value FROM state WHERE namespace = ? AND (expires IS NULL OR expires >= ?)",
+                                  (namespace, time.time())).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def purge_expired(self) -> int:
+        cursor = self._db().execute("DELETE FROM state WHERE expires < ?", (time.time(),))
+        return cursor.rowcount
+
+
+def create_backend(name: str = STATE_BACKEND, path: str = DEFAULT_STATE_PATH) -> StateBackend:
+    """
+    Build a state backend by name.
+
+    Args:
+        name (str): "memory" or "sqlite"
+        path (str): Database file of the sqlite backend
+
+    Returns:
+        StateBackend: The backend
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    if name == BACKEND_MEMORY:
+        return MemoryBackend()
+    if name == BACKEND_SQLITE:
+        return SQLiteBackend(path)
+    raise ValueError(f"Unknown state backend {name!r}, expected {BACKEND_MEMORY!r} or {BACKEND_SQLITE!r}")
+
+
+# Shared state backend, configured from the environment
+state = create_backend()
+
+
+async def purge_periodically(backend: StateBackend = state, interval_s: float = STATE_PURGE_INTERVAL_S) -> None:
+    """
+    Remove expired values every interval_s seconds, off the event loop. Runs
+    until cancelled; every worker may run it, purging is idempotent.
+
+    Args:
+        backend (StateBackend): Backend to purge
+        interval_s (float): Seconds between purges
+    """
+    while True:
+        try:
+            removed = await asyncio.to_thread(backend.purge_expired)
+            if removed:
+                print(f"🧹 Removed {removed} expired state value(s)")
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not purge expired state: {e}")
+        await asyncio.sleep(interval_s)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _record_conversations(cassette_path: str, conversations: list, upstream_ms: float) -> None:
+    # Record one continue_conversation call per conversation, answered by a stand-in upstream,
+    # so the servers can replay them without Gemini
+    from controllers.languageHelper import Dialog
+    from services.LLM.client import _cassette_request, user_turn
+    from services.cassette import MODE_RECORD, Cassette
+
+    class _PromptOnly:
+        async def ask_async(self, question, **kwargs):
+            return question
+
+    async def record() -> None:
+        recorder = Cassette(cassette_path, MODE_RECORD)
+        dialog = Dialog()
+        dialog.gemini = _PromptOnly()
+        for i, conversation in enumerate(conversations):
+            prompt = await dialog.continue_conversation(conversation)
+
+            async def upstream(reply=f"جملة رقم {i}"):
+                await asyncio.sleep(upstream_ms / 1000)
+                return reply
+
+            await recorder.call("llm", _cassette_request("continue_conversation", [user_turn(prompt)], False),
+                                upstream)
+
+    asyncio.run(record())
+
+
+async def _load(port: int, conversations: list, concurrency: int) -> float:
+    import httpx
+
+    queue = asyncio.Queue()
+    for i, conversation in enumerate(conversations):
+        queue.put_nowait((i, conversation))
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        async def worker() -> None:
+            while not queue.empty():
+                i, conversation = queue.get_nowait()
+                response = await client.post("/arabic-speech-continue-conversation", json={"input": conversation},
+                                             headers={"x-session-id": f"learner-{i}"})
+                if response.status_code != 200:
+                    raise RuntimeError(f"Request {i} failed: {response.status_code} {response.text[:200]}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+def benchmark_workers(worker_counts=(1, 2, 4), requests: int = 400, concurrency: int = 32,
+                      upstream_ms: float = 50) -> dict:
+    """
+    Serve the same stateful load (one conversation reply per learner session)
+    with 1, 2, 4... uvicorn workers sharing a SQLite state backend, and check
+    that every session's history was stored whichever worker served it.
+    Gemini is replayed from a cassette with a fixed latency. Run from the
+    server folder.
+
+    Args:
+        worker_counts (tuple): Worker counts to compare
+        requests (int): Requests per run, one per session
+        concurrency (int): Requests in flight
+        upstream_ms (float): Simulated Gemini latency
+
+    Returns:
+        dict: {workers: {"requests_per_s", "sessions_ok"}}
+    """
+    import httpx
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        conversations = [[f"مرحبا، أنا رقم {i}", f"أهلا وسهلا {i}"] for i in range(requests)]
+        cassette_path = os.path.join(directory, "conversations.jsonl.gz")
+        _record_conversations(cassette_path, conversations, upstream_ms)
+
+        for workers in worker_counts:
+            run_directory = os.path.join(directory, f"workers-{workers}")
+            state_path = os.path.join(run_directory, "state.sqlite3")
+            port = _free_port()
+            env = {
+                **os.environ,
+                "CASSETTE_MODE": "replay", "CASSETTE_PATH": cassette_path,
+                "LLM_CACHE_PATH": os.path.join(run_directory, "llm.sqlite3"),
+                "STATE_BACKEND": BACKEND_SQLITE, "STATE_DB_PATH": state_path,
+                "WEB_CONCURRENCY": str(workers),
+                # The quota is not what is measured here
+                "LLM_REQUESTS_PER_MINUTE": "1000000", "LLM_BURST": "1000", "LLM_MAX_IN_FLIGHT": "1000",
+            }
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--workers", str(workers),
+                 "--log-level", "warning", "--no-access-log"],
+                cwd=Path(__file__).resolve().parents[1], env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                for _ in range(300):
+                    try:
+                        if httpx.get(f"http://127.0.0.1:{port}/metrics").status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        time.sleep(0.1)
+                elapsed = asyncio.run(_load(port, conversations, concurrency))
+            finally:
+                server.terminate()
+                server.wait()
+
+            shared = SQLiteBackend(state_path)
+            sessions_ok = sum(len(shared.get("sessions", f"learner-{i}/dialog.history", [])) == 2
+                              for i in range(requests))
+            results[workers] = {"requests_per_s": requests / elapsed, "sessions_ok": sessions_ok}
+            print(f"⏱️ {workers} worker(s): {results[workers]['requests_per_s']:.0f} requests/s, "
+                  f"{sessions_ok}/{requests} session histories stored")
+
+    print(f"ℹ️ {os.cpu_count()} CPU core(s) available")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_workers()
@@ -0,0 +1,19 @@
+"""
+Test setup: import the server packages from the server folder, and keep
+every store the imported modules open (state, LLM cache, lesson store,
+lexicon) out of the working tree.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_TMP = tempfile.mkdtemp(prefix="server-tests-")
+os.environ.setdefault("STATE_BACKEND", "memory")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_TMP, "llm_cache.sqlite3"))
+os.environ.setdefault("LESSON_STORE_PATH", os.path.join(_TMP, "lessons.sqlite3"))
+os.environ.setdefault("LEXICON_PATH", os.path.join(_TMP, "lexicon.idx"))
+os.environ.setdefault("TTS_CACHE_DIR", os.path.join(_TMP, "audio_cache"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
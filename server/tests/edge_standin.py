@@ -0,0 +1,98 @@
+"""
+Local stand-in for the Edge TTS WebSocket, for tests and offline benchmarks.
+
+Point the client at it with edge_tts_service.EDGE_TTS_WSS_URL (or the
+EDGE_TTS_WSS_URL environment variable) set to StandInServer.url. Needs aiohttp,
+which edge-tts already depends on.
+"""
+
+import asyncio
+import html
+import json
+import re
+import threading
+from typing import List
+
+
+def _standin_text_message(path: str, body: str) -> str:
+    return f"X-RequestId:standin\r\nContent-Type:application/json; charset=utf-8\r\nPath:{path}\r\n\r\n{body}"
+
+
+def _standin_audio_frame(data: bytes) -> bytes:
+    # Binary frames: 2-byte big-endian header length, headers, audio
+    headers = b"X-RequestId:standin\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n"
+    return len(headers).to_bytes(2, "big") + headers + data
+
+
+class StandInServer:
+    """
+    Local stand-in for the Edge TTS WebSocket (for tests and offline benchmarks),
+    speaking the same protocol as the real service. Every SSML request is
+    answered after `delay` seconds with `audio` in `chunks` binary frames, plus
+    one WordBoundary per word when the client asked for word boundaries.
+
+    Set EDGE_TTS_WSS_URL to `url` to use it; call shutdown() to stop it.
+    """
+
+    def __init__(self, port: int = 0, delay: float = 0.05, audio: bytes = b"\xff\xf3\x64\xc4" * 256,
+                 chunks: int = 4):
+        self.delay = delay
+        self.audio = audio
+        self.chunks = chunks
+        self.requests: List[str] = []
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        started = threading.Event()
+        threading.Thread(target=self._serve, args=(port, started), daemon=True).start()
+        started.wait()
+        self.url = f"ws://127.0.0.1:{self.port}/edge?TrustedClientToken=standin"
+
+    def _serve(self, port: int, started: threading.Event) -> None:
+        from aiohttp import web
+
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_get("/edge", self._handle)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        self._loop.run_until_complete(site.start())
+        self.port = self._runner.addresses[0][1]
+        started.set()
+        self._loop.run_forever()
+
+    async def _handle(self, request):
+        from aiohttp import WSMsgType, web
+
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        word_boundaries = False
+        async for message in websocket:
+            if message.type != WSMsgType.TEXT:
+                continue
+            headers, _, body = message.data.partition("\r\n\r\n")
+            if "Path:speech.config" in headers:
+                word_boundaries = '"wordBoundaryEnabled":"true"' in body
+            elif "Path:ssml" in headers:
+                text = html.unescape(re.sub(r"<[^>]*>", " ", body)).strip()
+                self.requests.append(text)
+                await asyncio.sleep(self.delay)
+                await websocket.send_str(_standin_text_message("turn.start", "{}"))
+                if word_boundaries:
+                    for i, word in enumerate(text.split()):
+                        # Offsets and durations in 100 ns ticks, 300 ms per word
+                        metadata = {"Type": "WordBoundary", "Data": {"Offset": i * 3_000_000, "Duration": 2_500_000,
+                                                                      "text": {"Text": word}}}
+                        await websocket.send_str(_standin_text_message("audio.metadata",
+                                                                       json.dumps({"Metadata": [metadata]})))
+                size = -(-len(self.audio) // self.chunks)
+                for start in range(0, len(self.audio), size):
+                    await websocket.send_bytes(_standin_audio_frame(self.audio[start:start + size]))
+                await websocket.send_str(_standin_text_message("turn.end", "{}"))
+        return websocket
+
+    def shutdown(self) -> None:
+        """Stop the server"""
+        if self._runner is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
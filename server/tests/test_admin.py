@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+import server
+
+
+def test_admin_endpoints_refuse_remote_clients(monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", None)
+    remote = TestClient(server.app, client=("203.0.113.7", 50000))
+    assert remote.get("/admin/llm-cache").status_code == 403
+    assert remote.delete("/admin/llm-cache").status_code == 403
+    local = TestClient(server.app, client=("127.0.0.1", 50000))
+    assert local.get("/admin/llm-cache").json()["success"]
+
+
+def test_admin_token(monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    client = TestClient(server.app, client=("127.0.0.1", 50000))
+    assert client.get("/admin/llm-cache").status_code == 403
+    assert client.get("/admin/llm-cache", headers={"X-Admin-Token": "secret"}).status_code == 200
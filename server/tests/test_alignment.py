@@ -0,0 +1,29 @@
+from services.NLP.alignment import OP_EXTRA, OP_MATCH, OP_MISSING, align_words, missed_words
+
+
+def test_alignment_reports_skipped_and_extra_words():
+    result = align_words("مرحبا اسمي محمد وانا طالب", "مرحبا محمد وانا طالب جديد")
+    assert [entry["op"] for entry in result["words"]] == [OP_MATCH, OP_MISSING] + [OP_MATCH] * 3 + [OP_EXTRA]
+    assert missed_words(result) == ["اسمي"]
+    assert result["extra"][0]["recognized"] == "جديد"
+    assert 0 < result["score"] < 1
+
+
+def test_alignment_ignores_harakat_and_punctuation():
+    result = align_words("مَرْحَبًا، اسمي مُحَمَّد.", "مرحبا اسمي محمد")
+    assert result["score"] == 1.0
+    assert not any(entry["op"] == OP_MISSING for entry in result["words"])
+
+
+def test_near_misses_match_with_a_partial_score():
+    result = align_words("مرحبا اسمي محمد وانا طالب", "مرحبا اسمي محمود وانا طالب")
+    near_miss = result["words"][2]
+    assert (near_miss["expected"], near_miss["recognized"]) == ("محمد", "محمود")
+    assert 0 < near_miss["score"] < 1
+    assert missed_words(result) == []
+
+
+def test_nothing_recognized_misses_every_word():
+    result = align_words("مرحبا محمد", "")
+    assert missed_words(result) == ["مرحبا", "محمد"]
+    assert result["score"] == 0.0
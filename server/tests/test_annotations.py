@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from services.annotations import LessonAnnotator
+from services.state import MemoryBackend, create_backend
+
+# Made-up words: neither the lexicon nor the morphology engine knows them
+LESSON = [("زقنطم فشلوق", "Arabic"), ("שלום", "Hebrew")]
+
+
+def test_a_lesson_served_again_while_pending_is_not_asked_twice():
+    calls = []
+    release = None
+
+    async def explain_words(words):
+        calls.append(list(words))
+        await release.wait()
+        return {word: {"meaning": "מילה"} for word in words}
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        annotator = LessonAnnotator(create_backend("memory"))
+        first = await annotator.annotate(LESSON, explain_words)
+        await asyncio.sleep(0)
+        second = await annotator.annotate(LESSON, explain_words)
+        assert second["id"] == first["id"]
+        assert sorted(second["pending"]) == sorted(first["pending"])
+        release.set()
+        await asyncio.gather(*annotator._tasks)
+        return annotator.get(first["id"])
+
+    finished = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert finished["pending"] == []
+    assert len(finished["words"]) == 2
+
+
+class SlowBackend(MemoryBackend):
+    # Stands in for a SQLite backend waiting on another worker's write lock
+    def get(self, namespace, key, default=None):
+        time.sleep(0.3)
+        return super().get(namespace, key, default)
+
+
+def test_a_slow_store_does_not_stall_other_requests():
+    async def scenario():
+        annotator = LessonAnnotator(SlowBackend())
+        gaps = []
+
+        async def other_requests():
+            last = time.perf_counter()
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        index, _ = await asyncio.gather(annotator.annotate(LESSON), other_requests())
+        return index, gaps
+
+    index, gaps = asyncio.run(scenario())
+    assert index["pending"] == []
+    assert max(gaps) < 0.2
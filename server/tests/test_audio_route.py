@@ -0,0 +1,60 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from services.TTS.cache import AudioCache
+
+AUDIO = bytes(range(256)) * 8
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "audio_cache", AudioCache(str(tmp_path)))
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def key(client):
+    key = server.audio_cache.key("edge", "مرحبا", voice="ar-SA-ZariyahNeural")
+    server.audio_cache.put(key, AUDIO)
+    return key
+
+
+def test_audio_is_served_with_immutable_caching(client, key):
+    response = client.get(f"/audio/{key}.mp3")
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["etag"] == f'"{key}"'
+
+
+@pytest.mark.parametrize("audio_hash", ["a" * 63, "A" * 64, "g" * 64, "../" + "a" * 61])
+def test_anything_but_a_lowercase_sha256_is_not_found(client, key, audio_hash):
+    assert client.get(f"/audio/{audio_hash}.mp3").status_code == 404
+
+
+def test_missing_audio_is_not_found(client, key):
+    assert client.get(f"/audio/{'0' * 64}.mp3").status_code == 404
+
+
+@pytest.mark.parametrize("if_none_match", ['"{key}"', 'W/"{key}"', '"other", "{key}"', "*"])
+def test_matching_etag_is_not_modified(client, key, if_none_match):
+    response = client.get(f"/audio/{key}.mp3", headers={"If-None-Match": if_none_match.format(key=key)})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+
+def test_other_etag_gets_the_audio(client, key):
+    response = client.get(f"/audio/{key}.mp3", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+    assert response.content == AUDIO
+
+
+def test_range_requests_get_partial_content(client, key):
+    response = client.get(f"/audio/{key}.mp3", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == AUDIO[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
@@ -0,0 +1,93 @@
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from services.cassette import MODE_RECORD, MODE_REPLAY, Cassette, CassetteMiss, ReplayedError, read_cassette
+
+SERVER = Path(__file__).resolve().parent.parent
+
+
+def _record(path):
+    recorder = Cassette(path, MODE_RECORD)
+
+    async def record():
+        async def answer(text="مرحبا"):
+            await asyncio.sleep(0.1)
+            return text
+
+        async def chunks():
+            yield b"\x01\x02"
+            await asyncio.sleep(0.05)
+            yield {"type": "WordBoundary", "text": "مرحبا"}
+
+        async def down():
+            raise ConnectionError("service down")
+
+        await recorder.call("llm", {"task": "translate", "text": "hello"}, answer)
+        await recorder.call("llm", {"task": "retry"}, lambda: answer("first"))
+        await recorder.call("llm", {"task": "retry"}, lambda: answer("second"))
+        with pytest.raises(ConnectionError):
+            await recorder.call("llm", {"task": "down"}, down)
+        return [item async for item in recorder.stream("edge", {"text": "مرحبا"}, chunks)]
+
+    streamed = asyncio.run(record())
+    recorder.call_sync("gtts", {"text": "مرحبا"}, lambda: b"audio")
+    return streamed
+
+
+def test_recorded_calls_are_replayed(tmp_path):
+    path = str(tmp_path / "cassettes" / "session.jsonl.gz")
+    streamed = _record(path)
+    # Written as they happen, no save or exit needed
+    assert [record["kind"] for record in read_cassette(path)] == ["llm"] * 4 + ["edge", "gtts"]
+
+    player = Cassette(path, MODE_REPLAY, latency_scale=0)
+
+    async def replay():
+        assert await player.call("llm", {"task": "translate", "text": "hello"}, None) == "مرحبا"
+        # Repeated requests replay in recorded order, then start over
+        assert [await player.call("llm", {"task": "retry"}, None) for _ in range(3)] == ["first", "second", "first"]
+        with pytest.raises(ReplayedError, match="service down"):
+            await player.call("llm", {"task": "down"}, None)
+        with pytest.raises(CassetteMiss):
+            await player.call("llm", {"task": "never recorded"}, None)
+        return [item async for item in player.stream("edge", {"text": "مرحبا"}, None)]
+
+    assert asyncio.run(replay()) == streamed
+    assert player.call_sync("gtts", {"text": "مرحبا"}, None) == b"audio"
+
+
+@pytest.mark.parametrize("scale, low, high", [(0, 0, 0.05), (0.5, 0.04, 0.09), (1, 0.09, 0.2)])
+def test_replay_latency_is_scaled(tmp_path, scale, low, high):
+    path = str(tmp_path / "session.jsonl.gz")
+    _record(path)
+    player = Cassette(path, MODE_REPLAY, latency_scale=scale)
+
+    start = time.perf_counter()
+    asyncio.run(player.call("llm", {"task": "translate", "text": "hello"}, None))
+    assert low <= time.perf_counter() - start < high
+
+
+_RECORD_MANY = """
+import sys
+from services.cassette import MODE_RECORD, Cassette
+
+recorder = Cassette(sys.argv[1], MODE_RECORD)
+for i in range(int(sys.argv[3])):
+    recorder.call_sync("llm", {"worker": sys.argv[2], "call": i}, lambda: "نص " * 200)
+"""
+
+
+def test_workers_recording_to_one_cassette_keep_every_call(tmp_path):
+    path = str(tmp_path / "session.jsonl.gz")
+    processes, calls = 4, 50
+    workers = [subprocess.Popen([sys.executable, "-c", _RECORD_MANY, path, str(worker), str(calls)], cwd=SERVER)
+               for worker in range(processes)]
+    assert all(worker.wait(timeout=60) == 0 for worker in workers)
+
+    requests = [(record["request"]["worker"], record["request"]["call"]) for record in read_cassette(path)]
+    assert sorted(requests) == sorted((str(worker), i) for worker in range(processes) for i in range(calls))
@@ -0,0 +1,57 @@
+import asyncio
+
+import edge_tts.communicate
+import pytest
+
+from edge_standin import StandInServer
+from services.TTS import edge_tts_service
+from services.TTS.cache import AudioCache
+from services.TTS.edge_tts_service import (VOICE_ARABIC_FEMALE, stream_text_to_speech_online,
+                                           synthesize_with_boundaries)
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    server = StandInServer(delay=0)
+    monkeypatch.setattr(edge_tts_service, "EDGE_TTS_WSS_URL", server.url)
+    monkeypatch.setattr(edge_tts.communicate, "WSS_URL", edge_tts.communicate.WSS_URL)
+    monkeypatch.setattr(edge_tts_service, "audio_cache", AudioCache(str(tmp_path)))
+    yield server
+    server.shutdown()
+
+
+async def _collect(text, use_cache=True):
+    return b"".join([chunk async for chunk in stream_text_to_speech_online(text, VOICE_ARABIC_FEMALE,
+                                                                           use_cache=use_cache)])
+
+
+def test_stream_is_served_from_the_cache_the_second_time(standin):
+    assert asyncio.run(_collect("مرحبا بك")) == standin.audio
+    assert asyncio.run(_collect("مرحبا بك")) == standin.audio
+    assert standin.requests == ["مرحبا بك"]
+
+
+def test_word_boundaries(standin):
+    audio, words = asyncio.run(synthesize_with_boundaries("مرحبا بك", VOICE_ARABIC_FEMALE))
+    assert audio == standin.audio
+    assert [word["text"] for word in words] == ["مرحبا", "بك"]
+    assert words[1]["offset_ms"] == 300
+
+
+def test_word_boundaries_are_cached(standin):
+    first = asyncio.run(synthesize_with_boundaries("مرحبا بك", VOICE_ARABIC_FEMALE))
+    second = asyncio.run(synthesize_with_boundaries("مرحبا بك", VOICE_ARABIC_FEMALE))
+    assert second == first
+    assert standin.requests == ["مرحبا بك"]
+
+
+def test_each_event_loop_gets_its_own_connection_limit(standin, monkeypatch):
+    monkeypatch.setattr(edge_tts_service, "EDGE_TTS_CONCURRENCY", 1)
+
+    async def two_at_once():
+        return await asyncio.gather(_collect("مرحبا", use_cache=False), _collect("بك", use_cache=False))
+
+    # Every asyncio.run is a new loop; a semaphore bound to the first one fails to wait on the second
+    for _ in range(2):
+        assert asyncio.run(two_at_once()) == [standin.audio, standin.audio]
+    assert len(standin.requests) == 4
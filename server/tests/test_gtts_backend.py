@@ -0,0 +1,45 @@
+import time
+
+import pytest
+from gtts import gTTS
+
+from services.TTS.gtts_backend import GTTS_MAX_CHARS, ParallelGTTS, run_standin_server
+
+SENTENCE = "مرحبا بك في عالم البرمجة، نتعلم اليوم اللغة العربية معا. "
+TEXTS = [
+    "مرحبا بك",
+    "  ،.  ",
+    SENTENCE * 8,
+    "كلمة" * 60,
+    "Dr. Smith said: hello, world! " * 6 + "How are you? Fine…",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_pieces_match_gtts(text):
+    pieces = ParallelGTTS.tokenize(text, "ar")
+    # The request gTTS itself would make; a guard in case its splitting rules change
+    assert pieces == gTTS(text=text, lang="ar")._tokenize(text)
+    assert all(0 < len(piece) <= GTTS_MAX_CHARS for piece in pieces)
+
+
+@pytest.fixture
+def standin():
+    server = run_standin_server(delay=0.05, audio=b"\xff\xfb\x90\x00piece")
+    yield f"http://127.0.0.1:{server.server_port}/batchexecute"
+    server.shutdown()
+
+
+def test_pieces_are_fetched_concurrently_and_joined_in_order(standin):
+    text = SENTENCE * 8
+    pieces = ParallelGTTS.tokenize(text, "ar")
+    assert len(pieces) > 4
+
+    backend = ParallelGTTS(upstream_url=standin, workers=len(pieces))
+    start = time.perf_counter()
+    audio = backend.synthesize(text, "ar")
+    elapsed = time.perf_counter() - start
+
+    assert audio == b"\xff\xfb\x90\x00piece" * len(pieces)
+    # 50 ms per piece: in parallel, well under the sequential total
+    assert elapsed < 0.05 * len(pieces) * 0.6
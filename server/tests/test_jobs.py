@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from services import jobs as jobs_module
+from services.jobs import JOB_ITEM_RETRIES, JOB_PROGRESS_NAMESPACE, JobQueue
+from services.state import create_backend
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(jobs_module, "JOB_POLL_S", 0)
+
+
+def _queue(processor, batch_items=4):
+    queue = JobQueue(create_backend("memory"), batch_items=batch_items)
+    queue.register("upper", processor)
+    return queue
+
+
+def _run(queue, job_id):
+    assert queue._claim() == job_id
+    asyncio.run(queue._run(job_id))
+
+
+def test_a_poison_item_does_not_fail_its_batch():
+    calls = []
+
+    async def upper(items):
+        calls.append(list(items))
+        if "poison" in items:
+            raise RuntimeError("bad item")
+        return [item.upper() for item in items]
+
+    queue = _queue(upper)
+    job = queue.submit("upper", ["a", "b", "poison", "c", "a"])
+    _run(queue, job["id"])
+
+    finished = queue.get(job["id"])
+    assert finished["status"] == "done"
+    assert finished["results"] == ["A", "B", None, "C", "A"]
+    assert (finished["completed"], finished["failed"]) == (4, 1)
+    # Only the poison item is retried on its own
+    assert sum(call == ["poison"] for call in calls) == JOB_ITEM_RETRIES
+    assert "items" not in queue.progress(job["id"])
+
+
+def test_a_worker_that_lost_its_lease_stops_writing():
+    queue = None
+
+    async def upper(items):
+        # Another worker takes the job over while this batch is running
+        def steal(current):
+            current["owner"] = "other"
+            return current
+        queue.backend.update(JOB_PROGRESS_NAMESPACE, job["id"], steal)
+        return [item.upper() for item in items]
+
+    queue = _queue(upper, batch_items=1)
+    job = queue.submit("upper", ["a", "b"])
+    _run(queue, job["id"])
+
+    progress = queue.progress(job["id"])
+    assert progress["status"] == "running"
+    assert progress["completed"] == 0
+    assert queue.get(job["id"])["results"] == ["A", None]
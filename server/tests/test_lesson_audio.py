@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from services.TTS import lesson_audio
+from services.TTS.cache import AudioCache
+from services.TTS.lesson_audio import mp3_duration_ms, synthesize_lesson_audio
+
+# MPEG 1 Layer III, 128 kbit/s, 44.1 kHz: 417 bytes and 1152 samples per frame
+FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+FRAME_MS = 1152 * 1000 / 44100
+
+
+@pytest.fixture
+def synthesized(monkeypatch, tmp_path):
+    # Two frames per word, one boundary per word
+    calls = []
+
+    async def synthesize_with_boundaries(text, voice, rate):
+        calls.append(text)
+        words = text.split()
+        boundaries = [{"text": word, "offset_ms": i * 2 * FRAME_MS, "duration_ms": FRAME_MS}
+                      for i, word in enumerate(words)]
+        return FRAME * 2 * len(words), boundaries
+
+    monkeypatch.setattr(lesson_audio, "synthesize_with_boundaries", synthesize_with_boundaries)
+    monkeypatch.setattr(lesson_audio, "audio_cache", AudioCache(str(tmp_path)))
+    return calls
+
+
+def test_mp3_duration_walks_frame_headers():
+    tag = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"\xff" * 5
+    assert mp3_duration_ms(FRAME * 3) == pytest.approx(3 * FRAME_MS)
+    assert mp3_duration_ms(tag + b"junk" + FRAME) == pytest.approx(FRAME_MS)
+    assert mp3_duration_ms(b"") == 0
+
+
+def test_segments_are_joined_with_word_timings(synthesized):
+    index = asyncio.run(synthesize_lesson_audio(["مرحبا بك", "  ", "كيف حالك اليوم"]))
+
+    assert synthesized == ["مرحبا بك", "كيف حالك اليوم"]
+    assert index["url"] == f"/audio/{index['hash']}.mp3"
+    assert index["segments"] == [[0, round(4 * FRAME_MS)], [round(4 * FRAME_MS), round(10 * FRAME_MS)]]
+    assert index["duration"] == round(10 * FRAME_MS)
+    assert [word[0] for word in index["words"]] == ["مرحبا", "بك", "كيف", "حالك", "اليوم"]
+    # Words of the second segment start after the first segment
+    assert index["words"][2] == ["كيف", round(4 * FRAME_MS), round(FRAME_MS), 1]
+    assert lesson_audio.audio_cache.get(index["hash"]) == FRAME * 10
+
+
+def test_a_cached_sprite_is_not_synthesized_again(synthesized):
+    first = asyncio.run(synthesize_lesson_audio(["مرحبا بك"]))
+    second = asyncio.run(synthesize_lesson_audio(["مرحبا بك"]))
+    assert second == first
+    assert synthesized == ["مرحبا بك"]
+
+
+def test_nothing_to_speak_has_no_url(synthesized):
+    index = asyncio.run(synthesize_lesson_audio(["", " \n"]))
+    assert index == {"url": None, "hash": None, "duration": 0, "segments": [], "words": []}
+    assert synthesized == []
+    assert not list(lesson_audio.audio_cache.directory.iterdir())
+
+
+def test_lesson_audio_endpoint(synthesized):
+    body = TestClient(server.app).post("/lesson-audio", json={"input": ["مرحبا بك"]}).json()
+    assert body["success"]
+    assert [word[0] for word in body["data"]["words"]] == ["مرحبا", "بك"]
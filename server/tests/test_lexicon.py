@@ -0,0 +1,35 @@
+from services.NLP.lexicon import SharedLexicon, build_lexicon, spelling
+
+
+def _lexicon(tmp_path, entries):
+    path = tmp_path / "lexicon.idx"
+    build_lexicon({word: {"word": word, "analysis": {"meaning": meaning}} for word, meaning in entries.items()}, str(path))
+    return SharedLexicon(str(path))
+
+
+def test_words_that_normalize_alike_keep_their_own_analysis(tmp_path):
+    lexicon = _lexicon(tmp_path, {"على": "על", "علي": "עלי", "عِلْم": "מדע", "عَلَّمَ": "לימד"})
+    assert lexicon.get("على")["analysis"]["meaning"] == "על"
+    assert lexicon.get("علي")["analysis"]["meaning"] == "עלי"
+    assert lexicon.get("عِلْم")["analysis"]["meaning"] == "מדע"
+    assert lexicon.get("عَلَّمَ")["analysis"]["meaning"] == "לימד"
+    # An unvocalized spelling that was never recorded is not answered by a vocalized one
+    assert lexicon.get("علم") is None
+    assert {entry["word"] for entry in lexicon.forms("علم")} == {spelling("عِلْم"), spelling("عَلَّمَ")}
+
+
+def test_spelling_ignores_mark_order_and_punctuation():
+    # Shadda and fatha typed in either order
+    assert spelling("عل\u0651\u064eم") == spelling("عل\u064e\u0651م")
+    assert spelling("«كتاب»") == "كتاب"
+    assert spelling("كتـاب") == "كتاب"
+
+
+def test_recorded_analyses_are_kept_per_spelling(monkeypatch):
+    from services import state as state_module
+
+    backend = state_module.create_backend("memory")
+    monkeypatch.setattr(state_module, "state", backend)
+    SharedLexicon().record({"على": {"meaning": "על"}, "علي": {"meaning": "עלי"}, "«»": {"meaning": "-"}})
+    recorded = dict(backend.items("lexicon"))
+    assert {word: entry["analysis"]["meaning"] for word, entry in recorded.items()} == {"على": "על", "علي": "עלי"}
@@ -0,0 +1,14 @@
+from services.LLM.cache import ResponseCache
+
+
+def test_word_keys_keep_harakat_and_letter_forms():
+    key = ResponseCache.key
+    assert key("explain_word", "auto", "عِلْم") != key("explain_word", "auto", "عَلَّمَ")
+    assert key("explain_word", "auto", "على") != key("explain_word", "auto", "علي")
+    # Whitespace and tatweel still do not matter
+    assert key("explain_word", "auto", " كتـاب ") == key("explain_word", "auto", "كتاب")
+
+
+def test_sentence_keys_ignore_harakat():
+    key = ResponseCache.key
+    assert key("translate_conversation", "auto", "مَرْحَبًا بِكَ") == key("translate_conversation", "auto", "مرحبا بك")
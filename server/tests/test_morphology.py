@@ -0,0 +1,25 @@
+from services.NLP.morphology import MIN_CONFIDENCE, morphology
+
+
+def test_unvocalized_homograph_is_left_to_gemini():
+    # كِتَاب "book" and كُتَّاب "writers" are both written كتاب
+    assert morphology.explain("كتاب") is None
+    assert morphology.analyze("كتاب")["confidence"] < MIN_CONFIDENCE
+
+
+def test_harakat_pick_the_reading():
+    assert morphology.explain("كِتاب")["meaning"] == "ספר"
+    writers = morphology.explain("كُتّاب")
+    assert writers["meaning"] == "סופר"
+    assert writers["singular"] == "كَاتِب"
+
+
+def test_broken_plural_with_clitics():
+    result = morphology.explain("والمكتبات")
+    assert result["root"] == "ك-ت-ب"
+    assert result["singular"] == "مكتبة"
+
+
+def test_non_arabic_input_has_no_analysis():
+    assert morphology.analyses("hello") == []
+    assert morphology.explain("،") is None
@@ -0,0 +1,32 @@
+from services.NLP.normalize import (normalize_arabic, normalize_key, normalize_speech_key, normalize_word,
+                                    strip_diacritics, tokenize_normalized)
+
+
+def test_canonical_form():
+    assert normalize_arabic("مَرْحَبًا،  اسمي مُحَمَّد") == "مرحبا, اسمي محمد"
+    assert normalize_key("مَرْحَبًا، اسمي مُحَمَّد") == "مرحبا اسمي محمد"
+    assert normalize_word("المدرسةُ") == "المدرسه"
+    assert normalize_word("أَإِآ") == "ااا"
+    assert normalize_word("«،»") == ""
+
+
+def test_speech_key_keeps_what_is_pronounced():
+    assert normalize_speech_key("عِلْم") != normalize_speech_key("عَلَّمَ")
+    assert normalize_speech_key("على") != normalize_speech_key("علي")
+
+
+def test_strip_diacritics_keeps_letters_as_written():
+    assert strip_diacritics("مَدْرَسَةٌ") == "مدرسة"
+    assert len(strip_diacritics("سُؤَال")) == len(normalize_word("سُؤَال"))
+
+
+
+def test_digits_tatweel_and_invisible_marks():
+    assert normalize_arabic("٣ كتب‏  و ۴") == "3 كتب و 4"
+    assert normalize_arabic("كتـــاب") == "كتاب"
+
+
+def test_tokenize_normalized():
+    assert tokenize_normalized("  مَرْحَبًا،\nيا  صديقي. ") == ["مرحبا", "يا", "صديقي"]
+    assert tokenize_normalized("،.") == []
+    assert tokenize_normalized("") == []
@@ -0,0 +1,85 @@
+import os
+import time
+
+import pytest
+
+from services.TTS.offline_engine import FORMAT_WAV, OfflineTTSPool
+
+
+class FakeEngine:
+    """pyttsx3 stand-in: "sleep <s>" takes that long, "crash" kills the process, and spoken texts are logged"""
+
+    def getProperty(self, name):
+        return [] if name == "voices" else None
+
+    def setProperty(self, name, value):
+        pass
+
+    def save_to_file(self, text, path):
+        self.job = (text, path)
+
+    def runAndWait(self):
+        text, path = self.job
+        if text == "crash":
+            os._exit(3)
+        if text.startswith("sleep "):
+            time.sleep(float(text.split()[1]))
+        with open(os.environ["FAKE_TTS_LOG"], "a", encoding="utf-8") as log:
+            log.write(text + "\n")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def fake_engine():
+    return FakeEngine()
+
+
+def failing_engine():
+    raise OSError("no espeak")
+
+
+@pytest.fixture
+def spoken(tmp_path, monkeypatch):
+    log = tmp_path / "spoken.txt"
+    log.touch()
+    monkeypatch.setenv("FAKE_TTS_LOG", str(log))
+    return lambda: log.read_text(encoding="utf-8").splitlines()
+
+
+def test_engine_start_up_failure_fails_jobs_instead_of_hanging():
+    pool = OfflineTTSPool(workers=1, engine_factory=failing_engine)
+    try:
+        start = time.perf_counter()
+        with pytest.raises(RuntimeError, match="start-up failed: OSError: no espeak"):
+            pool.synthesize("مرحبا", language="ar", output_format=FORMAT_WAV)
+        assert time.perf_counter() - start < 20
+        assert not pool._pending
+    finally:
+        pool.shutdown()
+
+
+def test_cancelled_jobs_are_skipped(spoken):
+    pool = OfflineTTSPool(workers=1, engine_factory=fake_engine)
+    try:
+        first = pool.submit("sleep 0.2", output_format=FORMAT_WAV)
+        skipped = pool.submit("skipped", output_format=FORMAT_WAV)
+        assert skipped.cancel()
+        last = pool.submit("مرحبا", output_format=FORMAT_WAV)
+
+        assert first.result(timeout=20) == b"sleep 0.2"
+        assert last.result(timeout=20) == "مرحبا".encode()
+        assert spoken() == ["sleep 0.2", "مرحبا"]
+        assert not pool._pending
+    finally:
+        pool.shutdown()
+
+
+def test_a_crashed_worker_fails_its_job_and_is_replaced(spoken):
+    pool = OfflineTTSPool(workers=1, engine_factory=fake_engine)
+    try:
+        with pytest.raises(RuntimeError, match="exited with code 3"):
+            pool.synthesize("crash", output_format=FORMAT_WAV)
+        assert pool.synthesize("بعد", output_format=FORMAT_WAV) == "بعد".encode()
+        assert spoken() == ["بعد"]
+    finally:
+        pool.shutdown()
@@ -0,0 +1,24 @@
+from services.LLM.router import MIN_SAMPLES, ModelRouter
+
+
+def test_slow_batch_calls_do_not_slow_down_word_lookups():
+    router = ModelRouter()
+    for _ in range(MIN_SAMPLES):
+        router.record("translate_conversations", "gemini-2.0-flash", 20000)
+        router.record("explain_word", "gemini-2.0-flash", 900)
+    assert router.choose("explain_word") == "gemini-2.0-flash"
+    assert router.tail_latency("explain_word", "gemini-2.0-flash") == 900
+
+
+def test_model_over_budget_is_skipped():
+    router = ModelRouter()
+    for _ in range(MIN_SAMPLES):
+        router.record("explain_word", "gemini-2.0-flash", 6000)
+    assert router.choose("explain_word") == "gemini-1.5-flash"
+
+
+def test_fast_failures_count_against_the_model():
+    router = ModelRouter()
+    for _ in range(MIN_SAMPLES):
+        router.record("explain_word", "gemini-2.0-flash", 40, failed=True)
+    assert router.choose("explain_word") == "gemini-1.5-flash"
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+from services.LLM.scheduler import BACKGROUND, INTERACTIVE, LLMOverloaded, LLMScheduler, set_deadline
+
+
+def test_interactive_calls_overtake_queued_background_work():
+    order = []
+
+    async def call(scheduler, priority, name):
+        async with scheduler.slot("explain_word", priority=priority, session=name):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        scheduler = LLMScheduler(requests_per_minute=60_000, burst=100, max_in_flight=1)
+        background = [asyncio.create_task(call(scheduler, BACKGROUND, f"background-{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(call(scheduler, INTERACTIVE, "click"))
+        await asyncio.gather(*background, interactive)
+
+    asyncio.run(scenario())
+    # The first background call already held the only slot; the click goes next
+    assert order[:2] == ["background-0", "click"]
+
+
+def test_sessions_take_turns_within_a_class():
+    order = []
+
+    async def call(scheduler, session):
+        async with scheduler.slot("translate_conversation", session=session):
+            order.append(session)
+            await asyncio.sleep(0.001)
+
+    async def scenario():
+        scheduler = LLMScheduler(requests_per_minute=60_000, burst=100, max_in_flight=1)
+        tasks = [asyncio.create_task(call(scheduler, "a")) for _ in range(3)]
+        tasks.append(asyncio.create_task(call(scheduler, "b")))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # The first call of "a" was granted on arrival; "b" is served before a's third call
+    assert order == ["a", "a", "b", "a"]
+
+
+def test_calls_that_cannot_meet_the_deadline_are_shed():
+    async def scenario():
+        scheduler = LLMScheduler(requests_per_minute=60, burst=1, max_in_flight=4)
+        async with scheduler.slot("explain_word"):
+            pass
+        # The bucket is empty and refills one token per second
+        set_deadline(0.2)
+        with pytest.raises(LLMOverloaded):
+            async with scheduler.slot("explain_word"):
+                pass
+
+    asyncio.run(scenario())
+
+
+def test_the_token_bucket_spaces_calls_after_the_burst():
+    granted = []
+
+    async def call(scheduler):
+        async with scheduler.slot("translate_conversation"):
+            granted.append(time.monotonic())
+
+    async def scenario():
+        # 20 calls per second after a burst of 2
+        scheduler = LLMScheduler(requests_per_minute=1200, burst=2, max_in_flight=10)
+        start = time.monotonic()
+        await asyncio.gather(*(call(scheduler) for _ in range(4)))
+        return start, scheduler
+
+    start, scheduler = asyncio.run(scenario())
+    assert granted[1] - start < 0.03
+    assert granted[3] - start >= 0.09
+    assert scheduler.queue_depth() == 0 and scheduler.in_flight == 0
+
+
+def test_a_call_abandoned_in_the_queue_spends_no_quota():
+    async def scenario():
+        scheduler = LLMScheduler(requests_per_minute=60_000, burst=100, max_in_flight=1)
+        async with scheduler.slot("explain_word"):
+            queued = asyncio.create_task(call(scheduler))
+            await asyncio.sleep(0.01)
+            assert scheduler.queue_depth() == 1
+            queued.cancel()
+            await asyncio.sleep(0)
+            assert scheduler.queue_depth() == 0
+        assert scheduler.in_flight == 0
+
+    async def call(scheduler):
+        async with scheduler.slot("explain_word"):
+            pass
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from services.STT.recognizer import TARGET_SAMPLE_RATE, AudioClip
+from services.TTS import speech_to_text
+from services.TTS.speech_to_text import (CHUNK_SECONDS, OVERLAP_SECONDS, ModelCache, _merge_overlap, _split_chunks,
+                                         convert_speech_to_text)
+
+
+class FakePipeline:
+    """Answers each chunk with the words of its position, two words overlapping the next chunk"""
+
+    def __init__(self, model_type):
+        self.model_type = model_type
+        self.active = 0
+        self.overlapping_calls = 0
+
+    def __call__(self, inputs, batch_size=None, generate_kwargs=None):
+        self.active += 1
+        if self.active > 1:
+            self.overlapping_calls += 1
+        time.sleep(0.01)
+        self.active -= 1
+        return [{"text": f" w{i} w{i}b w{i + 1} w{i + 1}b "} for i in range(len(inputs))]
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    loaded = []
+
+    def load(model_type):
+        loaded.append(model_type)
+        return FakePipeline(model_type)
+
+    monkeypatch.setattr(ModelCache, "_load", staticmethod(load))
+    return loaded
+
+
+def test_least_recently_used_tier_is_unloaded(loads):
+    cache = ModelCache(max_models=2)
+    fast = cache.get("fast")
+    cache.get("base")
+    assert cache.get("fast") is fast
+    cache.get("small")
+
+    assert cache.loaded() == ["fast", "small"]
+    assert loads == ["fast", "base", "small"]
+    with pytest.raises(ValueError):
+        cache.get("huge")
+
+
+def test_concurrent_callers_share_one_load(loads):
+    cache = ModelCache()
+    threads = [threading.Thread(target=cache.get, args=("base",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["base"]
+
+
+def test_long_recordings_are_split_into_overlapping_chunks():
+    chunk = int(CHUNK_SECONDS * TARGET_SAMPLE_RATE)
+    overlap = int(OVERLAP_SECONDS * TARGET_SAMPLE_RATE)
+    assert _split_chunks(list(range(chunk))) == [list(range(chunk))]
+
+    samples = list(range(60 * TARGET_SAMPLE_RATE))
+    chunks = _split_chunks(samples)
+    assert len(chunks) == 3
+    assert all(len(piece) <= chunk for piece in chunks)
+    assert chunks[1][:overlap] == chunks[0][-overlap:]
+    assert chunks[-1][-1] == samples[-1]
+
+
+def test_repeated_overlap_words_are_merged():
+    assert _merge_overlap("مرحبا اسمي محمد", "اسمي محمد وانا طالب") == "مرحبا اسمي محمد وانا طالب"
+    assert _merge_overlap("مرحبا", "صديقي") == "مرحبا صديقي"
+    assert _merge_overlap("", "صديقي") == "صديقي"
+
+
+def test_chunk_transcripts_are_stitched_and_calls_to_a_tier_serialized(loads, monkeypatch):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(speech_to_text, "_models", ModelCache())
+    clip = AudioClip(b"\x00\x01" * (60 * TARGET_SAMPLE_RATE))
+
+    assert convert_speech_to_text(clip, model_type="fast") == "w0 w0b w1 w1b w2 w2b w3 w3b"
+    assert convert_speech_to_text(AudioClip(b""), model_type="fast") == ""
+
+    threads = [threading.Thread(target=convert_speech_to_text, args=(clip, "fast")) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert speech_to_text._models.get("fast").overlapping_calls == 0
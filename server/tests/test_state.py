@@ -0,0 +1,127 @@
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from services.sessions import SessionStore
+from services.state import BACKEND_MEMORY, BACKEND_SQLITE, StateBackend, create_backend, purge_periodically
+
+SERVER = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(params=[BACKEND_MEMORY, BACKEND_SQLITE])
+def backend(request, tmp_path):
+    return create_backend(request.param, str(tmp_path / "state.sqlite3"))
+
+
+def test_the_interface_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        StateBackend()
+
+
+def test_values_are_stored_per_namespace(backend):
+    backend.set("a", "key", {"items": [1, 2]})
+    backend.set_many("b", {"key": "other", "more": 3})
+
+    assert backend.get("a", "key") == {"items": [1, 2]}
+    assert backend.get("b", "key") == "other"
+    assert sorted(backend.items("b")) == [("key", "other"), ("more", 3)]
+    assert backend.get("a", "missing", "default") == "default"
+
+    assert backend.delete("a", "key")
+    assert not backend.delete("a", "key")
+    assert backend.get("a", "key") is None
+
+
+def test_stored_values_are_not_shared_with_callers(backend):
+    value = {"items": [1]}
+    backend.set("a", "key", value)
+    value["items"].append(2)
+    backend.get("a", "key")["items"].append(3)
+
+    assert backend.get("a", "key") == {"items": [1]}
+
+
+def test_expired_values_are_skipped_then_purged(backend):
+    backend.set("a", "old", 1, ttl_s=0.01)
+    backend.set("a", "kept", 2)
+    time.sleep(0.05)
+
+    assert backend.get("a", "old") is None
+    assert backend.items("a") == [("kept", 2)]
+    assert backend.purge_expired() == 1
+    assert backend.purge_expired() == 0
+
+
+def test_update_starts_from_the_default(backend):
+    assert backend.update("a", "count", lambda count: count + 1, default=0) == 1
+    assert backend.update("a", "count", lambda count: count + 1, default=0) == 2
+
+
+def test_a_failed_update_keeps_the_value(backend):
+    backend.set("a", "count", 1)
+
+    def fail(count):
+        raise ValueError("no")
+
+    with pytest.raises(ValueError):
+        backend.update("a", "count", fail)
+    assert backend.get("a", "count") == 1
+
+
+def test_session_histories_are_bounded(backend):
+    store = SessionStore(backend, ttl_s=60, history_limit=3)
+    store.extend("learner", "lesson", ["a", "b"])
+    store.extend("learner", "lesson", [])
+    store.extend("learner", "lesson", ["c", "d"])
+
+    assert store.history("learner", "lesson") == ["b", "c", "d"]
+    assert store.history("other", "lesson") == []
+
+    store.extend("learner", "lesson", ["e", "f", "g"], limit=5)
+    assert store.history("learner", "lesson") == ["c", "d", "e", "f", "g"]
+
+    store.clear("learner", "lesson")
+    assert store.history("learner", "lesson") == []
+
+
+_INCREMENT = """
+import sys
+from services.state import SQLiteBackend
+from services.sessions import SessionStore
+
+backend = SQLiteBackend(sys.argv[1])
+store = SessionStore(backend, ttl_s=60, history_limit=10_000)
+for i in range(int(sys.argv[3])):
+    backend.update("counters", "count", lambda count: count + 1, default=0)
+    store.extend("learner", "lesson", [f"{sys.argv[2]}-{i}"])
+"""
+
+
+def test_updates_are_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    processes, updates = 4, 50
+    workers = [subprocess.Popen([sys.executable, "-c", _INCREMENT, path, str(worker), str(updates)], cwd=SERVER)
+               for worker in range(processes)]
+    assert all(worker.wait(timeout=60) == 0 for worker in workers)
+
+    backend = create_backend(BACKEND_SQLITE, path)
+    assert backend.get("counters", "count") == processes * updates
+    history = SessionStore(backend).history("learner", "lesson")
+    assert sorted(history) == sorted(f"{worker}-{i}" for worker in range(processes) for i in range(updates))
+
+
+def test_purge_runs_periodically():
+    backend = create_backend(BACKEND_MEMORY)
+
+    async def run():
+        backend.set("a", "old", 1, ttl_s=0.01)
+        purge = asyncio.create_task(purge_periodically(backend, interval_s=0.01))
+        await asyncio.sleep(0.1)
+        purge.cancel()
+        return backend.items("a")
+
+    assert asyncio.run(run()) == []
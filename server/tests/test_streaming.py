@@ -0,0 +1,39 @@
+from services.STT.streaming import MAX_UTTERANCE_MS, EnergyVAD
+
+
+def _pcm(amplitude, seconds, sample_rate=16000):
+    return amplitude.to_bytes(2, "little", signed=True) * int(seconds * sample_rate)
+
+
+def test_silence_and_noise_are_not_speech():
+    vad = EnergyVAD()
+    assert vad.feed(_pcm(0, 1.0)) == []
+    assert vad.feed(_pcm(100, 1.0)) == []
+    assert not vad.speech_started
+    assert vad.flush() is None
+
+
+def test_speech_ends_after_the_hangover():
+    vad = EnergyVAD()
+    vad.feed(_pcm(0, 0.3))
+    utterances = vad.feed(_pcm(8000, 0.5))
+    assert utterances == [] and vad.speech_started
+
+    # Frames arrive in pieces that do not line up with the VAD frames
+    silence = _pcm(0, 1.0)
+    utterances = vad.feed(silence[:1001]) + vad.feed(silence[1001:])
+    assert len(utterances) == 1
+    duration = len(utterances[0].pcm) / 2 / 16000
+    # The speech, a little pre-roll before it and the hangover silence after it
+    assert 1.0 <= duration <= 1.4
+    assert vad.flush() is None
+
+
+def test_long_speech_is_cut_and_the_rest_flushed():
+    vad = EnergyVAD()
+    utterances = vad.feed(_pcm(8000, MAX_UTTERANCE_MS / 1000 + 1))
+    assert len(utterances) == 1
+    assert len(utterances[0].pcm) / 2 / 16000 >= MAX_UTTERANCE_MS / 1000 - 0.1
+
+    rest = vad.flush()
+    assert rest is not None and len(rest.pcm) / 2 / 16000 < 1.5
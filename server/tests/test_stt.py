@@ -0,0 +1,135 @@
+import io
+import wave
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from services.STT import recognizer
+from services.STT.recognizer import Recognizer, StubRecognizer
+
+
+def _wav(seconds=0.5, sample_rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+    return buffer.getvalue()
+
+
+class FailingRecognizer(Recognizer):
+    name = "failing"
+
+    def recognize(self, clip, language="ar"):
+        raise ConnectionError("service down")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(recognizer, "_recognizers", {})
+    monkeypatch.setitem(recognizer._RECOGNIZER_FACTORIES, "stub", lambda: StubRecognizer("مرحبا اسمي"))
+    monkeypatch.setitem(recognizer._RECOGNIZER_FACTORIES, "failing", FailingRecognizer)
+    return TestClient(server.app)
+
+
+def _pcm(amplitude, seconds, sample_rate=16000):
+    return amplitude.to_bytes(2, "little", signed=True) * int(seconds * sample_rate)
+
+
+# One utterance: half a second of speech, then enough silence for the VAD to end it
+UTTERANCE = _pcm(8000, 0.5) + _pcm(0, 1.0)
+
+
+def _post(client, audio, text="مرحبا اسمي محمد"):
+    return client.post("/stt", data={"text": text}, files={"audio": ("clip.wav", audio, "audio/wav")})
+
+
+def test_stub_recognizer_scores_the_reading(client, monkeypatch):
+    monkeypatch.setattr(recognizer, "DEFAULT_RECOGNIZER", "stub")
+    body = _post(client, _wav()).json()
+    assert body["success"]
+    assert body["data"]["transcript"] == "مرحبا اسمي"
+    assert body["data"]["missing_words"] == ["محمد"]
+
+
+def test_bad_audio_is_the_learners_error(client, monkeypatch):
+    monkeypatch.setattr(recognizer, "DEFAULT_RECOGNIZER", "stub")
+    response = _post(client, b"")
+    assert response.status_code == 200
+    assert response.json()["error"]["error"] == "Invalid audio"
+
+
+@pytest.mark.parametrize("name", ["failing", "no-such-recognizer"])
+def test_recognizer_errors_are_reported_separately(client, monkeypatch, name):
+    monkeypatch.setattr(recognizer, "DEFAULT_RECOGNIZER", name)
+    response = _post(client, _wav())
+    assert response.status_code == 502
+    assert response.json()["error"]["error"] == "Speech recognition unavailable"
+
+
+@pytest.mark.parametrize("setup", ['["not", "an", "object"]', '{"text": "مرحبا", "sample_rate": "fast"}',
+                                   '{"sample_rate": 0}', "not json"])
+def test_stream_rejects_malformed_setup(client, setup):
+    with client.websocket_connect("/stt/stream") as websocket:
+        websocket.send_text(setup)
+        message = websocket.receive_json()
+    assert message["type"] == "error"
+    assert message["error"] == "Invalid setup"
+
+
+def test_stream_rejects_malformed_control_message(client):
+    with client.websocket_connect("/stt/stream") as websocket:
+        websocket.send_json({"text": "مرحبا"})
+        websocket.send_text("{end")
+        assert websocket.receive_json()["error"] == "Invalid message"
+
+
+def test_stream_reports_recognizer_errors(client, monkeypatch):
+    monkeypatch.setattr(recognizer, "DEFAULT_RECOGNIZER", "failing")
+    loud = (8000).to_bytes(2, "little", signed=True) * 16000
+    with client.websocket_connect("/stt/stream") as websocket:
+        websocket.send_json({"text": "مرحبا", "sample_rate": 16000})
+        websocket.send_bytes(loud)
+        websocket.send_json({"type": "end"})
+        messages = [websocket.receive_json()]
+        while messages[-1]["type"] != "error":
+            messages.append(websocket.receive_json())
+    assert messages[-1]["error"] == "Speech recognition unavailable"
+
+
+def test_stream_reports_recognizer_errors_mid_stream(client, monkeypatch):
+    monkeypatch.setattr(recognizer, "DEFAULT_RECOGNIZER", "failing")
+    with client.websocket_connect("/stt/stream") as websocket:
+        websocket.send_json({"text": "مرحبا", "sample_rate": 16000})
+        # No "end": the error must not wait for the client to finish
+        websocket.send_bytes(UTTERANCE)
+        assert websocket.receive_json() == {"type": "speech_start"}
+        message = websocket.receive_json()
+        assert message["type"] == "error"
+        assert message["error"] == "Speech recognition unavailable"
+        assert "service down" in message["details"]
+        assert websocket.receive()["type"] == "websocket.close"
+
+
+def test_stream_sends_partial_feedback_per_utterance(client, monkeypatch):
+    monkeypatch.setattr(recognizer, "DEFAULT_RECOGNIZER", "stub")
+    with client.websocket_connect("/stt/stream") as websocket:
+        websocket.send_json({"text": "مرحبا اسمي محمد", "sample_rate": 16000})
+        for _ in range(2):
+            websocket.send_bytes(UTTERANCE)
+            assert websocket.receive_json() == {"type": "speech_start"}
+            partial = websocket.receive_json()
+            assert partial["type"] == "partial"
+            assert partial["missing_words"] == ["محمد"]
+            assert partial["latency_ms"] >= 0
+        # Trailing speech is flushed at the end
+        websocket.send_bytes(_pcm(8000, 0.3))
+        assert websocket.receive_json() == {"type": "speech_start"}
+        websocket.send_json({"type": "end"})
+        messages = [websocket.receive_json()]
+        while messages[-1]["type"] != "final":
+            messages.append(websocket.receive_json())
+    assert [message["type"] for message in messages] == ["partial", "final"]
+    assert messages[-1]["transcript"] == "مرحبا اسمي مرحبا اسمي مرحبا اسمي"